@@ -1,16 +1,110 @@
 """
 Database connection and session management using SQLModel and SQLite.
 """
+import logging
+
+from sqlalchemy import Integer, MetaData, event, inspect, text
+from sqlalchemy.schema import CreateTable
 from sqlmodel import SQLModel, create_engine, Session
 
+from database.labels import CONFIDENCE_SCALE, LABEL_KINDS, ensure_labels, seed_labels
+
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = "sqlite:///./database/db.sqlite"
 
 engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+# Tables the last create_db_and_tables() call created; indexes over existing records need a backfill
+created_tables: set[str] = set()
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, _):
+    """WAL lets readers run alongside the batched stream writer; NORMAL sync avoids an fsync per commit."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
 
 def create_db_and_tables():
     """Create all tables on startup."""
+    existing = set(inspect(engine).get_table_names())
     SQLModel.metadata.create_all(engine)
+    created_tables.clear()
+    created_tables.update(t.name for t in SQLModel.metadata.sorted_tables if t.name not in existing)
+    _add_missing_columns()
+    with engine.begin() as conn:
+        seed_labels(conn)
+    _migrate_label_columns()
+
+
+def _add_missing_columns():
+    """
+    create_all() never alters existing tables, so columns added to a model
+    later are appended here (and their indexes created). Only nullable columns (or ones with a scalar
+    default) can be added this way — anything else needs a real migration.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    ddl += f" DEFAULT {default!r}"
+                conn.execute(text(ddl))
+                logger.info(f"[DB] Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _migrate_label_columns():
+    """
+    Databases from before labels were stored as codes (database/labels.py)
+    have text sentiment / emotion and real confidence columns. SQLite can't
+    change a column's type, so the record table is copied into one of the
+    current schema (same ids, so the search index stays valid), swapped in
+    and the file vacuumed to hand the freed pages back. Triggers on record go
+    with the old table; the search index recreates its own at startup.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("record"):
+        return
+    existing = {c["name"]: c["type"] for c in inspector.get_columns("record")}
+    if isinstance(existing.get("sentiment"), Integer):
+        return
+    record = SQLModel.metadata.tables["record"]
+    logger.info("[DB] Migrating record labels to codes — this rewrites the table once.")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS record_new"))
+        for kind in LABEL_KINDS:
+            ensure_labels(conn, kind, conn.execute(text(f"SELECT DISTINCT {kind} FROM record")).scalars())
+        conn.execute(CreateTable(record.to_metadata(MetaData(), name="record_new")))
+        columns, values = [], []
+        for column in record.columns:
+            if column.name not in existing:
+                continue
+            columns.append(column.name)
+            if column.name in LABEL_KINDS:
+                values.append(f"(SELECT code FROM label WHERE kind = '{column.name}' AND name = record.{column.name})")
+            elif column.name == "confidence":
+                values.append(f"CAST(ROUND(confidence * {CONFIDENCE_SCALE}) AS INTEGER)")
+            else:
+                values.append(column.name)
+        conn.execute(text(f"INSERT INTO record_new ({', '.join(columns)}) SELECT {', '.join(values)} FROM record"))
+        conn.execute(text("DROP TABLE record"))
+        conn.execute(text("ALTER TABLE record_new RENAME TO record"))
+        for index in record.indexes:
+            index.create(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+    logger.info("[DB] Migrated record labels to codes.")
 
 
 def get_session():
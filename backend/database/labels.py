@@ -0,0 +1,141 @@
+"""
+Compact label columns.
+
+Record.sentiment and Record.emotion hold one of a handful of label names on
+every row, so they are stored as small integer codes: the `label` table maps
+(kind, code) to the name, and LabelCode translates on the way in and out, so
+models, filters and API responses keep working with the names. Record.
+confidence is stored as a FixedPoint integer (four decimals, which is all the
+pipeline produces) instead of an 8-byte float.
+
+The mapping is cached per process. A code or name the cache doesn't know is
+looked up in the table once more (another process may have added it); a
+filter on a name that still isn't known binds to a code that matches nothing.
+Writers register the labels they are about to store with ensure_labels() in
+their own transaction.
+"""
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Iterable
+
+from sqlalchemy import Integer, SmallInteger, TypeDecorator, func, insert, literal, select
+
+logger = logging.getLogger(__name__)
+
+LABEL_KINDS = ("sentiment", "emotion")
+# Codes of the labels the pipeline produces, in a fixed order so they agree across databases
+DEFAULT_LABELS = {
+    "sentiment": ("Neutral", "Positive", "Negative"),
+    "emotion": ("Neutral", "Happy", "Angry", "Sad", "Fear"),
+}
+CONFIDENCE_SCALE = 10_000
+_UNKNOWN = -1
+
+_lock = threading.Lock()
+_codes: dict[str, dict[str, int]] = {kind: {} for kind in LABEL_KINDS}
+_names: dict[str, dict[int, str]] = {kind: {} for kind in LABEL_KINDS}
+
+
+def _remember(kind: str, rows: Iterable[tuple[int, str]]):
+    """Replace the cached mapping of `kind` with (code, name) rows read from the label table."""
+    rows = list(rows)
+    with _lock:
+        _codes[kind] = {name: code for code, name in rows}
+        _names[kind] = {code: name for code, name in rows}
+
+
+def _read(conn, kind: str):
+    from models.data_models import Label
+    _remember(kind, conn.execute(select(Label.code, Label.name).where(Label.kind == kind)).all())
+
+
+def load_labels(kind: str):
+    """Refresh the cached mapping of `kind` from the database."""
+    from database.db import engine
+    with engine.connect() as conn:
+        _read(conn, kind)
+
+
+def label_code(kind: str, name: str) -> int:
+    """Code of label `name`; one that matches no row if it has never been stored."""
+    code = _codes[kind].get(name)
+    if code is None:
+        load_labels(kind)
+        code = _codes[kind].get(name, _UNKNOWN)
+    return code
+
+
+def label_name(kind: str, code: int):
+    """Name of label `code`, or None if there is no such label."""
+    name = _names[kind].get(code)
+    if name is None and code != _UNKNOWN:
+        load_labels(kind)
+        name = _names[kind].get(code)
+    return name
+
+
+def ensure_labels(conn, kind: str, names: Iterable):
+    """
+    Give every label in `names` a code, in the caller's transaction (`conn`
+    may be a Session or a Connection). Call it before flushing rows that
+    carry new labels.
+    """
+    from models.data_models import Label
+    missing = sorted({n for n in names if n is not None and n not in _codes[kind]})
+    if not missing:
+        return
+    # Autoflushing pending records here would bind their new labels before they have a code
+    with getattr(conn, "no_autoflush", nullcontext()):
+        for name in missing:
+            # MAX + 1 under the write lock this statement takes; a name another writer added first is kept
+            conn.execute(
+                insert(Label).prefix_with("OR IGNORE").from_select(
+                    ["kind", "code", "name"],
+                    select(literal(kind), func.coalesce(func.max(Label.code), -1) + 1, literal(name))
+                    .where(Label.kind == kind),
+                )
+            )
+        _read(conn, kind)
+    logger.info(f"[LABELS] Registered {kind} labels {missing}.")
+
+
+def seed_labels(conn):
+    """Give the labels in DEFAULT_LABELS their fixed codes (first start of a database)."""
+    from models.data_models import Label
+    for kind, names in DEFAULT_LABELS.items():
+        conn.execute(
+            insert(Label).prefix_with("OR IGNORE"),
+            [{"kind": kind, "code": code, "name": name} for code, name in enumerate(names)],
+        )
+        _read(conn, kind)
+
+
+class LabelCode(TypeDecorator):
+    """A label name stored as its SMALLINT code in the label table."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, kind: str):
+        super().__init__()
+        self.kind = kind
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else label_code(self.kind, value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else label_name(self.kind, value)
+
+
+class FixedPoint(TypeDecorator):
+    """A float stored as an INTEGER number of 1/CONFIDENCE_SCALE units."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(round(value * CONFIDENCE_SCALE))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else value / CONFIDENCE_SCALE
@@ -10,7 +10,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from database.db import create_db_and_tables
-from routes import upload, preprocess, sentiment, emotion, visualize, reports
+from responses import CompressionMiddleware
+from routes import upload, preprocess, sentiment, emotion, visualize, reports, jobs, datasets, search, keywords, entities
 from routes import stream  # Real-time WebSocket + stream control
 
 # Rate limiting (optional — graceful fallback if slowapi not installed)
@@ -37,12 +38,24 @@ async def lifespan(app: FastAPI):
     """Create DB & tables on startup."""
     logger.info("Starting up — initializing database...")
     create_db_and_tables()
+    from services.dataset_service import ensure_default_dataset
+    ensure_default_dataset()
+    from services.search_service import ensure_search_index
+    ensure_search_index()
+    from services.entity_service import ensure_entity_index
+    ensure_entity_index()
+    from services.analytics_cache import analytics_cache
+    analytics_cache.warm()
+    # Last: resumed jobs write records, which needs the search triggers and indexes in place
+    from services.job_service import scheduler
+    scheduler.start()
+    from services.stream_service import start_pubsub, stop_pubsub
+    await start_pubsub()
     logger.info("Database ready. Real-time stream ready (start via POST /api/stream/start).")
     yield
-    # Ensure stream is stopped on shutdown
-    from services.stream_service import stop_stream, is_running
-    if is_running():
-        await stop_stream()
+    # Ensure this worker's producer (if any) is stopped and flushed on shutdown
+    await stop_pubsub()
+    scheduler.shutdown()
     logger.info("Shutting down.")
 
 
@@ -62,6 +75,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Compression (brotli / gzip for large JSON responses) ─────────────────────
+app.add_middleware(CompressionMiddleware)
+
 # ── Routers (existing ones self-declare prefix="/api") ────────────────────────
 app.include_router(upload.router)
 app.include_router(preprocess.router)
@@ -69,6 +85,11 @@ app.include_router(sentiment.router)
 app.include_router(emotion.router)
 app.include_router(visualize.router)
 app.include_router(reports.router)
+app.include_router(jobs.router)
+app.include_router(datasets.router)
+app.include_router(search.router)
+app.include_router(keywords.router)
+app.include_router(entities.router)
 
 # ── Real-Time Stream Router ──────────────────────────────────────────────────
 # stream.py has NO prefix in its APIRouter, so we add /api here for REST routes.
@@ -79,16 +100,16 @@ app.include_router(stream.router, prefix="/api", tags=["Stream"])
 
 # ── Health Check ──────────────────────────────────────────────────────────────
 @app.get("/api/health", tags=["Health"])
-def health():
+async def health():
     """Simple liveness probe."""
     from services.stream_service import is_running, get_session_stats
     from ws_manager import manager
     return {
         "status": "ok",
         "version": "3.0.0",
-        "stream_running": is_running(),
+        "stream_running": await is_running(),
         "ws_clients": manager.client_count,
-        "session_stats": get_session_stats(),
+        "session_stats": await get_session_stats(),
     }
 
 
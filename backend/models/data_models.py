@@ -3,19 +3,174 @@ SQLModel database models for the sentiment analysis application.
 """
 from datetime import datetime
 from typing import Optional
+from sqlalchemy import UniqueConstraint
 from sqlmodel import SQLModel, Field
 
+from database.labels import FixedPoint, LabelCode
+
 
 class Record(SQLModel, table=True):
     """
     Represents one row of analyzed text data.
     Matches the blueprint schema: id, text, clean_text, sentiment, emotion,
-    confidence, created_at.
+    confidence, created_at. The labels and the confidence are stored compactly
+    (database/labels.py) but read and written as strings and floats.
     """
     id: Optional[int] = Field(default=None, primary_key=True)
     text: str = Field(index=False)
     clean_text: Optional[str] = None
-    sentiment: Optional[str] = None          # Positive / Neutral / Negative
-    emotion: Optional[str] = None            # Joy / Anger / Sadness / Fear / Surprise
-    confidence: Optional[float] = None       # 0.0 – 1.0
+    sentiment: Optional[str] = Field(default=None, sa_type=LabelCode("sentiment"))  # Positive / Neutral / Negative
+    emotion: Optional[str] = Field(default=None, sa_type=LabelCode("emotion"))      # Happy / Angry / Sad / Fear / Neutral
+    confidence: Optional[float] = Field(default=None, sa_type=FixedPoint)           # 0.0 – 1.0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    dataset_id: str = Field(default="default", index=True)   # Dataset partition the row belongs to
+    duplicate_of: Optional[int] = Field(default=None, index=True)  # representative of its near-duplicate cluster
+
+
+class Label(SQLModel, table=True):
+    """Code ↔ name of the sentiment and emotion labels Record stores as small integers (database/labels.py)."""
+    __table_args__ = (UniqueConstraint("kind", "name"),)
+    kind: str = Field(primary_key=True)      # sentiment / emotion
+    code: int = Field(primary_key=True)
+    name: str
+
+
+class Dataset(SQLModel, table=True):
+    """
+    One partition of a named dataset (services/dataset_service.py). Every upload
+    loads into a new partition; a dataset is the set of its active partitions,
+    so append / replace / drop only flip partition status and old rows are
+    purged in the background.
+    """
+    id: str = Field(primary_key=True)
+    name: str = Field(index=True)            # logical dataset, e.g. "default", "stream"
+    status: str = Field(default="loading", index=True)  # loading / active / deleting
+    filename: Optional[str] = None
+    row_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    activated_at: Optional[datetime] = None
+
+
+class DataVersion(SQLModel, table=True):
+    """
+    Monotonic write counter per dataset name, plus "*" for all data
+    (services/dataset_service.py). Every write that changes what reads see
+    bumps it in the same transaction; caches key on it.
+    """
+    __tablename__ = "data_version"
+    name: str = Field(primary_key=True)
+    version: int = 0
+
+
+class KeywordGroup(SQLModel, table=True):
+    """
+    A named set of keywords (a candidate, brand or topic) that records are
+    matched against (services/keyword_service.py). Matches are stored in
+    RecordGroup; `backfilled_through` is the record id up to which existing
+    records have been matched, so an interrupted backfill resumes.
+    """
+    __tablename__ = "keyword_group"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)
+    kind: str = "topic"                      # candidate / brand / topic
+    keywords: str                            # JSON list, lower-cased
+    revision: int = 1                        # bumped when the keywords change
+    backfilled_through: int = 0
+    status: str = "backfilling"              # backfilling / ready
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RecordGroup(SQLModel, table=True):
+    """Record ↔ keyword group index: one row per record that mentions one of the group's keywords."""
+    __tablename__ = "record_group"
+    group_id: int = Field(primary_key=True)
+    record_id: int = Field(primary_key=True, index=True)
+
+
+class Entity(SQLModel, table=True):
+    """A normalized hashtag, mention or URL domain seen in record text (services/entity_service.py)."""
+    __table_args__ = (UniqueConstraint("kind", "value"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str                                # hashtag / mention / domain
+    value: str                               # lower-cased, without the leading # / @ or "www."
+
+
+class RecordEntity(SQLModel, table=True):
+    """Record ↔ entity index, for label breakdowns that follow re-analysis."""
+    __tablename__ = "record_entity"
+    entity_id: int = Field(primary_key=True)
+    record_id: int = Field(primary_key=True, index=True)
+
+
+class EntityCount(SQLModel, table=True):
+    """Occurrences of an entity per dataset partition and time bucket, for top-k and timelines."""
+    __tablename__ = "entity_count"
+    entity_id: int = Field(primary_key=True)
+    dataset_id: str = Field(primary_key=True)
+    bucket: datetime = Field(primary_key=True, index=True)   # start of the ENTITY_BUCKET_SECONDS bucket
+    kind: str                                # copied from Entity so top-k needs no join
+    count: int = 0
+
+
+class Job(SQLModel, table=True):
+    """
+    A background job (file ingest, re-analysis, export) tracked by services/job_service.py.
+    Persisted so queued work survives a restart and finished results can be polled until evicted.
+    """
+    id: str = Field(primary_key=True)
+    kind: str                                # ingest / sentiment / emotion / preprocess / reanalyze / export
+    status: str = Field(default="queued", index=True)   # queued / processing / done / error / cancelled
+    priority: int = 1                        # 0 = high, 1 = normal, 2 = low
+    progress: int = 0                        # 0 – 100
+    stage: Optional[str] = None              # handler-defined, e.g. parsing / analyzing / finalizing
+    progress_detail: Optional[str] = None    # JSON: rows_done, rows_total, rows_per_sec, eta_seconds
+    params: Optional[str] = None             # JSON
+    result: Optional[str] = None             # JSON
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None    # heartbeat while processing
+    finished_at: Optional[datetime] = None
+    cancel_requested_at: Optional[datetime] = None   # set by cancel(); the running process polls it
+
+
+class IngestCheckpoint(SQLModel, table=True):
+    """
+    Durable progress of a file ingest (services/file_service.py). Rows are loaded
+    into a not-yet-visible Dataset partition; this row is updated in the same
+    transaction as each batch, so an interrupted ingest resumes after its last
+    committed batch. Once the partition is activated the row holds the job's
+    result until the job is evicted.
+    """
+    # Each row points at a loading partition; rows of the older "ingestcheckpoint" table can't be resumed
+    __tablename__ = "ingest_checkpoint"
+
+    job_id: str = Field(primary_key=True)
+    file_hash: str                           # sha256 of the uploaded file
+    partition_id: str                        # Dataset row being loaded
+    rows_done: int = 0                       # source rows consumed (analyzed or skipped)
+    batches: int = 0                         # batches committed to the partition
+    state: Optional[str] = None              # JSON: running counters and preview; {"result": …} once activated
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class UploadSession(SQLModel, table=True):
+    """
+    A chunked, resumable upload (services/upload_service.py). `received` is the
+    length of the contiguous prefix written to disk; the id doubles as the id
+    of the ingest job the upload feeds.
+    """
+    id: str = Field(primary_key=True)
+    filename: str
+    size: Optional[int] = None               # declared total bytes, if known up front
+    received: int = 0
+    status: str = Field(default="open", index=True)   # open / complete / aborted
+    dataset: str = "default"
+    mode: str = "replace"
+    priority: str = "normal"
+    analyze_early: bool = False              # ingest job starts on the prefix before completion
+    sheet: Optional[str] = None              # Excel worksheet to ingest
+    text_column: Optional[str] = None        # explicit text column (default: detected)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,420 @@
+"""
+pubsub.py — Event fan-out and shared stream control across worker processes.
+
+Under `uvicorn --workers N` every worker has its own WebSocket clients, but
+only one of them may run the stream producer. The broker gives them:
+  - publish / subscribe: the producer publishes each event once; every
+    worker's subscriber receives it (with a broker-wide `seq`) and fans it out
+    to its own WebSocket clients. Events also carry the broker's `epoch`,
+    which changes whenever seq numbering starts over (a restarted in-memory
+    broker, a new SQLite file), so clients know their last seq is void
+  - leases: a named, expiring lock used to elect the single stream producer
+  - shared state: small JSON blobs (stream status, stop requests)
+All broker calls are coroutines; none of them blocks the event loop.
+
+Backends (PUBSUB_BACKEND):
+  memory  – in-process, single worker (default)
+  sqlite  – a local SQLite file shared by all workers on the host; no
+            external services needed
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_SQLITE_PATH = os.getenv("PUBSUB_SQLITE_PATH", "./database/pubsub.sqlite")
+PUBSUB_POLL_MS = int(os.getenv("PUBSUB_POLL_MS", "20"))
+# How many events the SQLite broker keeps for late subscribers
+PUBSUB_RETENTION = int(os.getenv("PUBSUB_RETENTION", "10000"))
+
+# Identifies this worker process in leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+Handler = Callable[[int, str], Awaitable[None]]
+
+
+def stamp(seq: int, epoch: str, body: str) -> str:
+    """Prepend "seq" and "epoch" to a serialized JSON object without re-encoding it."""
+    head = f'{{"seq": {seq}, "epoch": "{epoch}"'
+    return f'{head}, {body[1:]}' if body != "{}" else f'{head}}}'
+
+
+def _new_epoch() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+class Broker(ABC):
+    """Base class — see MemoryBroker and SQLiteBroker."""
+
+    name = "base"
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        # Identifies the current seq numbering (see the module docstring)
+        self.epoch = _new_epoch()
+
+    def subscribe(self, handler: Handler):
+        """Register a coroutine called with (seq, serialized event) for every event."""
+        self._handlers.append(handler)
+
+    async def _deliver(self, seq: int, payload: str):
+        for handler in self._handlers:
+            try:
+                await handler(seq, payload)
+            except Exception as e:
+                logger.error(f"[PUBSUB] Subscriber failed on seq {seq}: {e}")
+
+    async def start(self, backlog: int = 0):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, event: dict) -> Optional[int]:
+        """Publish an event to every worker; returns its seq if it is known at once."""
+
+    @abstractmethod
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Take or renew lease `name` for this worker. False if another worker holds it."""
+
+    @abstractmethod
+    async def release_lease(self, name: str):
+        ...
+
+    @abstractmethod
+    async def lease_holder(self, name: str) -> Optional[str]:
+        """Worker id holding an unexpired lease, or None."""
+
+    @abstractmethod
+    async def set_state(self, key: str, value: Optional[dict]):
+        ...
+
+    @abstractmethod
+    async def get_state(self, key: str) -> Optional[dict]:
+        ...
+
+
+class MemoryBroker(Broker):
+    """Single-process broker: publish delivers straight to local subscribers."""
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._seq = 0
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._state: dict[str, dict] = {}
+
+    async def publish(self, event: dict) -> Optional[int]:
+        self._seq += 1
+        await self._deliver(self._seq, stamp(self._seq, self.epoch, json.dumps(event)))
+        return self._seq
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        holder = self._holder(name)
+        if holder not in (None, WORKER_ID):
+            return False
+        self._leases[name] = (WORKER_ID, time.time() + ttl)
+        return True
+
+    async def release_lease(self, name: str):
+        if self._holder(name) == WORKER_ID:
+            del self._leases[name]
+
+    async def lease_holder(self, name: str) -> Optional[str]:
+        return self._holder(name)
+
+    def _holder(self, name: str) -> Optional[str]:
+        lease = self._leases.get(name)
+        if lease and lease[1] > time.time():
+            return lease[0]
+        return None
+
+    async def set_state(self, key: str, value: Optional[dict]):
+        if value is None:
+            self._state.pop(key, None)
+        else:
+            self._state[key] = value
+
+    async def get_state(self, key: str) -> Optional[dict]:
+        return self._state.get(key)
+
+
+# State row holding the SQLite broker's epoch
+_EPOCH_KEY = "pubsub_epoch"
+
+
+class SQLiteBroker(Broker):
+    """
+    Host-local broker on a shared SQLite file.
+
+    Events are appended to an `events` table whose INTEGER PRIMARY KEY is the
+    broker-wide seq; each worker polls for rows past the last seq it saw.
+    Publishing only queues the event: a flusher task writes everything queued
+    in one transaction, and both the inserts and the polls run in a worker
+    thread on a connection of their own, so a busy database (up to the 5 s
+    busy timeout) never stalls the event loop. Leases and state are
+    single-row upserts guarded by SQLite's write lock, made about once a
+    second on a separate connection, also from worker threads. The epoch is
+    stored in the file, so it lasts as long as the seq numbering.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = PUBSUB_SQLITE_PATH, poll_ms: int = PUBSUB_POLL_MS):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_ms / 1000
+        self._conn: Optional[sqlite3.Connection] = None
+        # Events connection, used from worker threads under _io_lock
+        self._io: Optional[sqlite3.Connection] = None
+        self._io_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+        # Serialized events waiting for the flusher
+        self._pending: list[str] = []
+        self._last_seq = 0
+        self._published = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """The connection for leases and state; use it under _state_lock."""
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Events are transient; losing the tail on power loss is acceptable
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO state (key, value) VALUES (?, ?)", (_EPOCH_KEY, json.dumps(self.epoch))
+        )
+        self.epoch = json.loads(conn.execute("SELECT value FROM state WHERE key = ?", (_EPOCH_KEY,)).fetchone()[0])
+        return conn
+
+    async def start(self, backlog: int = 0):
+        """Begin polling. `backlog` recent events are re-delivered first (to warm replay buffers)."""
+        max_seq = await asyncio.to_thread(self._max_seq)
+        self._last_seq = max(0, max_seq - backlog)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._poll())
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f"[PUBSUB] SQLite broker at {self.path} (worker {WORKER_ID}).")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._flusher:
+            # Not cancelled: a write in flight would finish in its thread and be repeated below
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+        self._task = self._flusher = None
+        try:
+            await self._flush()
+        except sqlite3.Error as e:
+            logger.warning(f"[PUBSUB] Dropped {len(self._pending)} unpublished events: {e}")
+        with self._state_lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+        with self._io_lock:
+            if self._io:
+                self._io.close()
+                self._io = None
+
+    async def _poll(self):
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._fetch, self._last_seq)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"[PUBSUB] Poll failed: {e}")
+                rows = []
+            for seq, body in rows:
+                self._last_seq = seq
+                await self._deliver(seq, stamp(seq, self.epoch, body))
+            if len(rows) < 1000:
+                await asyncio.sleep(self.poll_interval)
+
+    async def publish(self, event: dict) -> Optional[int]:
+        """
+        Queue the event for the flusher; its seq is assigned when the batch is
+        written. Delivery (including to this worker) happens through the poller.
+        """
+        self._pending.append(json.dumps(event))
+        if self._flusher is None:
+            # Not started: nothing would flush it
+            await self._flush()
+        else:
+            self._wakeup.set()
+        return None
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closing:
+                return  # close() flushes what is left
+            try:
+                await self._flush()
+            except sqlite3.Error as e:
+                logger.warning(f"[PUBSUB] Publishing {len(self._pending)} events failed, retrying: {e}")
+                await asyncio.sleep(self.poll_interval)
+                self._wakeup.set()
+
+    async def _flush(self):
+        """Write every queued event in one transaction (events queued meanwhile wait for the next flush)."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._insert, batch)
+        except Exception:
+            # Ahead of anything queued meanwhile, so events keep their order
+            self._pending[:0] = batch
+            raise
+
+    # ── Worker-thread side ─────────────────────────────────────────────────────
+
+    def _io_conn(self) -> sqlite3.Connection:
+        if self._io is None:
+            self._io = self._open()
+        return self._io
+
+    def _max_seq(self) -> int:
+        with self._io_lock:
+            return self._io_conn().execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+
+    def _fetch(self, after: int) -> list[tuple[int, str]]:
+        with self._io_lock:
+            return self._io_conn().execute(
+                "SELECT seq, payload FROM events WHERE seq > ? ORDER BY seq LIMIT 1000", (after,)
+            ).fetchall()
+
+    def _insert(self, bodies: list[str]):
+        with self._io_lock:
+            conn = self._io_conn()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT INTO events (payload, created_at) VALUES (?, ?)", [(b, now) for b in bodies])
+                before, self._published = self._published, self._published + len(bodies)
+                if before // 1000 != self._published // 1000:
+                    conn.execute(
+                        "DELETE FROM events WHERE seq <= (SELECT MAX(seq) FROM events) - ?", (PUBSUB_RETENTION,)
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ── Leases and state (worker threads, on the state connection) ─────────────
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._on_state_conn, self._acquire_lease, name, ttl)
+
+    async def release_lease(self, name: str):
+        await asyncio.to_thread(self._on_state_conn, self._release_lease, name)
+
+    async def lease_holder(self, name: str) -> Optional[str]:
+        return await asyncio.to_thread(self._on_state_conn, self._lease_holder, name)
+
+    async def set_state(self, key: str, value: Optional[dict]):
+        # Serialized here: the caller may keep mutating `value` while the thread runs
+        body = None if value is None else json.dumps(value)
+        await asyncio.to_thread(self._on_state_conn, self._set_state, key, body)
+
+    async def get_state(self, key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._on_state_conn, self._get_state, key)
+
+    def _on_state_conn(self, fn: Callable, *args):
+        with self._state_lock:
+            return fn(self._connect(), *args)
+
+    @staticmethod
+    def _acquire_lease(conn: sqlite3.Connection, name: str, ttl: float) -> bool:
+        now = time.time()
+        cur = conn.execute(
+            """
+            INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            """,
+            (name, WORKER_ID, now + ttl, now),
+        )
+        return cur.rowcount == 1
+
+    @staticmethod
+    def _release_lease(conn: sqlite3.Connection, name: str):
+        conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, WORKER_ID))
+
+    @staticmethod
+    def _lease_holder(conn: sqlite3.Connection, name: str) -> Optional[str]:
+        row = conn.execute(
+            "SELECT owner FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, key: str, body: Optional[str]):
+        if body is None:
+            conn.execute("DELETE FROM state WHERE key = ?", (key,))
+        else:
+            conn.execute(
+                "INSERT INTO state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, body),
+            )
+
+    @staticmethod
+    def _get_state(conn: sqlite3.Connection, key: str) -> Optional[dict]:
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def _create_broker() -> Broker:
+    if PUBSUB_BACKEND == "sqlite":
+        return SQLiteBroker()
+    if PUBSUB_BACKEND != "memory":
+        logger.warning(f"[PUBSUB] Unknown backend '{PUBSUB_BACKEND}', using in-process broker.")
+    return MemoryBroker()
+
+
+# Singleton — imported everywhere
+broker = _create_broker()
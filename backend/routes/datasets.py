@@ -0,0 +1,29 @@
+"""
+Route: /api/datasets
+List and drop named datasets (see services/dataset_service.py).
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from database.db import get_session
+from services.dataset_service import drop_dataset, list_datasets
+
+router = APIRouter(prefix="/api", tags=["Datasets"])
+
+
+@router.get("/datasets")
+def datasets(session: Session = Depends(get_session)):
+    """Active datasets with partition and row counts. Pass ?dataset=<name> to read endpoints to filter."""
+    return {"datasets": list_datasets(session)}
+
+
+@router.delete("/datasets/{name}")
+def delete_dataset(name: str, session: Session = Depends(get_session)):
+    """
+    Drop a dataset. Its rows vanish from every read immediately; the physical
+    delete runs afterwards as a low-priority "purge" job.
+    """
+    dropped = drop_dataset(session, name)
+    if not dropped:
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    return {"dataset": name, "status": "dropped", "partitions": dropped}
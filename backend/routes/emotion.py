@@ -2,22 +2,25 @@
 Route: /api/emotion
 Runs emotion detection on all records.
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session
 
 from database.db import get_session
+from responses import FastJSONResponse
 from services.emotion_service import run_emotion_analysis
 
-router = APIRouter(prefix="/api", tags=["Emotion"])
+router = APIRouter(prefix="/api", tags=["Emotion"], default_response_class=FastJSONResponse)
 
 
 @router.post("/analyze/emotion")
-def run_emotion(session: Session = Depends(get_session)):
+def run_emotion(dataset: Optional[str] = None, session: Session = Depends(get_session)):
     """
-    Run emotion detection on all database records.
+    Run emotion detection on all database records (or one dataset).
     Returns emotion counts and a preview table.
     """
     try:
-        return run_emotion_analysis(session)
+        return FastJSONResponse(run_emotion_analysis(session, dataset=dataset))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Emotion detection failed: {e}")
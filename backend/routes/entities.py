@@ -0,0 +1,75 @@
+"""
+Route: /api/entities
+Trending hashtags, mentions and URL domains with their sentiment
+(see services/entity_service.py).
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlmodel import Session
+
+from database.db import get_session
+from responses import FastJSONResponse
+from services.entity_service import ENTITY_KINDS, entity_detail, top_entities
+from services.job_service import scheduler
+from services.response_cache import cached_response
+
+router = APIRouter(prefix="/api", tags=["Entities"], default_response_class=FastJSONResponse)
+
+
+@router.get("/entities/top")
+def top(
+    request: Request,
+    kind: str = Query(default="hashtag", enum=list(ENTITY_KINDS)),
+    dataset: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    sort: str = Query(default="count", enum=["count", "negative", "positive"]),
+    min_count: int = Query(default=1, ge=1),
+    limit: int = Query(default=20, ge=1, le=200),
+    session: Session = Depends(get_session),
+):
+    """
+    Most frequent (or most negative / positive) hashtags, mentions or domains
+    with their sentiment breakdown. Cached per data version.
+    """
+    try:
+        return cached_response(
+            request, "entities_top",
+            lambda: top_entities(session, kind, dataset, since, until, limit, sort, min_count),
+            dataset, kind=kind, since=since, until=until, sort=sort, min_count=min_count, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/entities/{kind}/{value}")
+def detail(
+    request: Request,
+    kind: str,
+    value: str,
+    dataset: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+):
+    """Sentiment / emotion breakdown and timeline of one hashtag, mention or domain. Cached per data version."""
+    if kind not in ENTITY_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {list(ENTITY_KINDS)}.")
+
+    def compute():
+        result = entity_detail(session, kind, value, dataset, since, until)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No {kind} '{value}' has been seen.")
+        return result
+
+    return cached_response(
+        request, "entity_detail", compute, dataset, kind=kind, value=value, since=since, until=until,
+    )
+
+
+@router.post("/entities/rebuild")
+def rebuild_index():
+    """Re-extract the entities of every record as a low-priority background job."""
+    return {"job_id": scheduler.submit("entity_reindex", priority="low")}
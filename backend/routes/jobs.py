@@ -0,0 +1,115 @@
+"""
+Route: /api/jobs
+Submit, inspect and cancel background jobs (analysis, re-analysis, exports).
+"""
+import json
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
+from services.job_service import FINISHED, PRIORITIES, scheduler
+from services.report_service import EXPORT_MEDIA_TYPES
+
+router = APIRouter(prefix="/api", tags=["Jobs"])
+
+# Kinds clients may submit directly (ingest goes through /api/upload)
+SUBMITTABLE = ["preprocess", "sentiment", "emotion", "reanalyze", "export", "reindex", "entity_reindex"]
+
+
+class JobRequest(BaseModel):
+    kind: str
+    priority: str = "normal"
+    params: dict = {}
+
+
+@router.post("/jobs")
+def submit_job(body: JobRequest):
+    """
+    Queue a background job.
+    - kind: preprocess | sentiment | emotion | reanalyze | export | reindex
+    - priority: high | normal | low
+    - params: e.g. {"format": "pdf"} for export, {"options": {...}} for preprocess
+    """
+    if body.kind not in SUBMITTABLE:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {SUBMITTABLE}.")
+    if body.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITIES)}.")
+    job_id = scheduler.submit(body.kind, body.params, priority=body.priority)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs")
+def list_jobs(limit: int = Query(default=50, ge=1, le=500), status: Optional[str] = None):
+    return {"jobs": scheduler.list_jobs(limit=limit, status=status)}
+
+
+@router.get("/jobs/metrics")
+def job_metrics():
+    """Queue depth per priority, running jobs, and job counts by status."""
+    return scheduler.metrics()
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """
+    Server-Sent Events stream of progress snapshots (status, progress, stage,
+    rows/s, ETA). Ends after the final done | error | cancelled snapshot.
+    """
+    return job_event_stream(job_id)
+
+
+def job_event_stream(job_id: str) -> StreamingResponse:
+    if not scheduler.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def stream():
+        # Tell EventSource to wait a little before reconnecting after a drop
+        yield "retry: 2000\n\n"
+        async for snapshot in scheduler.events(job_id):
+            if snapshot is None:
+                yield ": keepalive\n\n"
+                continue
+            event = "end" if snapshot["status"] in FINISHED else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot, default=str)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    status = scheduler.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {"job_id": job_id, "status": status}
+
+
+@router.get("/jobs/{job_id}/download")
+def download_job_artifact(job_id: str):
+    """Download the file produced by a finished export job."""
+    job = scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    result = job["result"] or {}
+    # Rendered PDFs live in the shared report cache ("report") rather than as an artifact
+    artifact = (result.get("artifact") or result.get("report")) if job["status"] == "done" else None
+    if not artifact or not os.path.exists(artifact):
+        raise HTTPException(status_code=409, detail="Job has no downloadable artifact (yet).")
+    fmt = job["result"].get("format", "csv")
+    if job["result"].get("gzip"):
+        return FileResponse(artifact, media_type="application/gzip", filename=f"sentiment_report.{fmt}.gz")
+    return FileResponse(artifact, media_type=EXPORT_MEDIA_TYPES[fmt], filename=f"sentiment_report.{fmt}")
@@ -0,0 +1,68 @@
+"""
+Route: /api/keywords
+Keyword groups (candidates, brands, topics) and their sentiment comparison
+(see services/keyword_service.py).
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel
+from sqlmodel import Session
+
+from database.db import get_session
+from responses import FastJSONResponse
+from services.keyword_service import GROUP_KINDS, compare_groups, delete_group, list_groups, save_group
+from services.response_cache import cached_response
+
+router = APIRouter(prefix="/api", tags=["Keywords"], default_response_class=FastJSONResponse)
+
+
+class KeywordGroupRequest(BaseModel):
+    keywords: List[str]
+    kind: str = "topic"
+
+
+@router.get("/keywords/groups")
+def groups(session: Session = Depends(get_session)):
+    """Keyword groups with their keywords, backfill status and number of matching records."""
+    return {"groups": list_groups(session)}
+
+
+@router.put("/keywords/groups/{name}")
+def put_group(name: str, body: KeywordGroupRequest, session: Session = Depends(get_session)):
+    """
+    Create or replace a keyword group. New records are matched as they are
+    ingested; existing ones by the returned background job.
+    """
+    try:
+        group, job_id = save_group(session, name, body.keywords, body.kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group": group, "job_id": job_id}
+
+
+@router.delete("/keywords/groups/{name}")
+def remove_group(name: str, session: Session = Depends(get_session)):
+    if not delete_group(session, name):
+        raise HTTPException(status_code=404, detail="Keyword group not found.")
+    return {"group": name, "status": "deleted"}
+
+
+@router.get("/keywords/comparison")
+def comparison(
+    request: Request,
+    dataset: Optional[str] = None,
+    groups: Optional[str] = Query(default=None, description="Comma-separated group names (default: all)"),
+    kind: Optional[str] = Query(default=None, enum=list(GROUP_KINDS)),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+):
+    """Sentiment / emotion per keyword group, and per group per day. Cached per data version."""
+    names = groups.split(",") if groups else None
+    return cached_response(
+        request, "keyword_comparison",
+        lambda: compare_groups(session, dataset, names, kind, since, until),
+        dataset, groups=groups, kind=kind, since=since, until=until,
+    )
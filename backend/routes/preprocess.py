@@ -24,6 +24,7 @@ class PreprocessOptions(BaseModel):
 @router.post("/preprocess")
 def preprocess(
     options: Optional[PreprocessOptions] = None,
+    dataset: Optional[str] = None,
     session: Session = Depends(get_session),
 ):
     """
@@ -32,7 +33,7 @@ def preprocess(
     """
     try:
         opts = options.model_dump() if options else {}
-        result = run_preprocessing(session, opts)
+        result = run_preprocessing(session, opts, dataset=dataset)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Preprocessing failed: {e}")
@@ -1,77 +1,123 @@
 """
 Route: /api/reports
-Generates and downloads reports in CSV and PDF formats.
+Generates and downloads reports in CSV, NDJSON, Parquet / Arrow and PDF formats.
+PDFs are rendered by a background job and cached per data version; the
+summary is cached per data version too (ETag / If-None-Match).
 """
-import io
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+import asyncio
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from sqlmodel import Session
 
 from database.db import get_session
-from services.report_service import export_csv, export_pdf, get_summary
+from responses import FastJSONResponse
+from services.job_service import FINISHED, scheduler
+from services.response_cache import cached_response, etag_matches
+from services.report_service import (
+    EXPORT_MEDIA_TYPES, export_rows, get_summary, pdf_report_etag, request_pdf_report,
+)
+
+router = APIRouter(prefix="/api", tags=["Reports"], default_response_class=FastJSONResponse)
 
-router = APIRouter(prefix="/api", tags=["Reports"])
+# How long a PDF download waits for its render before answering 202 + job id
+REPORT_WAIT_SECONDS = float(os.getenv("REPORT_WAIT_SECONDS", "60"))
 
 
 @router.get("/reports/summary")
-def report_summary(session: Session = Depends(get_session)):
+def report_summary(request: Request, dataset: Optional[str] = None, session: Session = Depends(get_session)):
     """Return text summary and sentiment/emotion counts for the Reports page."""
     try:
-        return get_summary(session)
+        return cached_response(request, "report_summary", lambda: get_summary(session, dataset), dataset)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Report generation failed: {e}")
 
 
 @router.get("/reports/download")
-def download_report(
-    format: str = Query(default="csv", enum=["csv", "pdf"]),
-    session: Session = Depends(get_session),
+async def download_report(
+    request: Request,
+    format: str = Query(default="csv", enum=["csv", "ndjson", "parquet", "arrow", "pdf"]),
+    dataset: Optional[str] = None,
+    columns: Optional[str] = Query(default=None, description="Comma-separated subset of columns"),
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    gzip: bool = False,
 ):
     """
     Download the full analysis report.
-    - format=csv → CSV file
-    - format=pdf → PDF file
+    - format=csv | ndjson → streamed rows, optionally filtered by
+      sentiment / emotion / min_confidence, limited to `columns`, gzip'ed
+    - format=parquet | arrow → the same rows as a typed, columnar file
+      (needs pyarrow)
+    - format=pdf → PDF file, cached per data version (ETag / 304)
     """
-    try:
-        if format == "csv":
-            buf = export_csv(session)
-            return StreamingResponse(
-                iter([buf.getvalue()]),
-                media_type="text/csv",
-                headers={"Content-Disposition": "attachment; filename=sentiment_report.csv"},
-            )
-        elif format == "pdf":
-            buf = export_pdf(session)
-            return StreamingResponse(
-                buf,
-                media_type="application/pdf",
-                headers={"Content-Disposition": "attachment; filename=sentiment_report.pdf"},
-            )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {e}")
+    if format == "pdf":
+        return await _pdf_response(request, dataset)
+    return await asyncio.to_thread(
+        _stream_export, format, dataset, columns=columns, sentiment=sentiment, emotion=emotion,
+        min_confidence=min_confidence, compress=gzip,
+    )
 
 
 # Backward-compatible aliases
 @router.get("/export/csv")
-def export_csv_compat(session: Session = Depends(get_session)):
-    buf = export_csv(session)
+def export_csv_compat(dataset: Optional[str] = None):
+    return _stream_export("csv", dataset)
+
+
+def _stream_export(format: str, dataset: Optional[str], columns: Optional[str] = None, compress: bool = False, **filters):
+    try:
+        chunks = export_rows(
+            format, columns=columns.split(",") if columns else None, dataset=dataset, compress=compress, **filters,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"sentiment_report.{format}" + (".gz" if compress else "")
     return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=sentiment_report.csv"},
+        chunks,
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
 @router.get("/export/pdf")
-def export_pdf_compat(session: Session = Depends(get_session)):
-    buf = export_pdf(session)
-    return StreamingResponse(
-        buf,
+async def export_pdf_compat(request: Request, dataset: Optional[str] = None):
+    return await _pdf_response(request, dataset)
+
+
+async def _pdf_response(request: Request, dataset: Optional[str]):
+    """
+    The cached PDF of the current data version, or 304 if the client's ETag
+    still matches. A missing PDF is rendered by one background job that every
+    concurrent download waits on; after REPORT_WAIT_SECONDS the answer is 202
+    with the job id (follow /api/jobs/{id}, then /api/jobs/{id}/download).
+    """
+    path, job_id = await asyncio.to_thread(request_pdf_report, dataset)
+    if job_id is None and etag_matches(request.headers.get("if-none-match"), pdf_report_etag(path)):
+        return Response(status_code=304, headers={"ETag": pdf_report_etag(path)})
+    deadline = time.monotonic() + REPORT_WAIT_SECONDS
+    while job_id and not os.path.exists(path):
+        job = await asyncio.to_thread(scheduler.get, job_id)
+        if job and job["status"] == "done":
+            path = job["result"]["report"]  # the data may have moved on while it was queued
+            break
+        if not job or job["status"] in FINISHED:
+            raise HTTPException(status_code=500, detail=f"Report generation failed: {job and job['error']}")
+        if time.monotonic() > deadline:
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]})
+        await asyncio.sleep(0.2)
+    return FileResponse(
+        path,
         media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=sentiment_report.pdf"},
+        filename="sentiment_report.pdf",
+        headers={"ETag": pdf_report_etag(path), "Cache-Control": "no-cache"},
     )
 
 
 @router.get("/insights/summary")
-def insights_summary_compat(session: Session = Depends(get_session)):
-    return get_summary(session)
+def insights_summary_compat(request: Request, dataset: Optional[str] = None, session: Session = Depends(get_session)):
+    return cached_response(request, "report_summary", lambda: get_summary(session, dataset), dataset)
@@ -0,0 +1,46 @@
+"""
+Route: /api/search
+Full-text keyword search over record text (see services/search_service.py).
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+
+from database.db import get_session
+from responses import FastJSONResponse
+from services.job_service import scheduler
+from services.search_service import SEARCH_MAX_LIMIT, search_records
+
+router = APIRouter(prefix="/api", tags=["Search"], default_response_class=FastJSONResponse)
+
+
+@router.get("/search")
+def search(
+    q: str = Query(description='FTS5 query: words, "a phrase", prefix*, AND / OR / NOT, text: / clean_text:'),
+    dataset: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    limit: int = Query(default=20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(default=0, ge=0),
+    total: bool = False,
+    session: Session = Depends(get_session),
+):
+    """
+    Search records by keyword, best match (bm25) first, with a highlighted
+    snippet per hit. Combine with sentiment / emotion / confidence filters.
+    """
+    try:
+        return FastJSONResponse(search_records(
+            session, q, dataset, limit=limit, offset=offset, with_total=total,
+            sentiment=sentiment, emotion=emotion, min_confidence=min_confidence,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/search/rebuild")
+def rebuild_index():
+    """Rebuild the search index from scratch as a low-priority background job."""
+    return {"job_id": scheduler.submit("reindex", priority="low")}
@@ -2,14 +2,17 @@
 Route: /api/sentiment
 Runs sentiment inference on records and supports single-text analysis.
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Session
 
 from database.db import get_session
+from responses import FastJSONResponse
 from services.sentiment_service import run_sentiment_analysis, analyze_single
 
-router = APIRouter(prefix="/api", tags=["Sentiment"])
+router = APIRouter(prefix="/api", tags=["Sentiment"], default_response_class=FastJSONResponse)
 
 
 class SingleTextRequest(BaseModel):
@@ -17,13 +20,13 @@ class SingleTextRequest(BaseModel):
 
 
 @router.post("/analyze/sentiment")
-def run_sentiment(session: Session = Depends(get_session)):
+def run_sentiment(dataset: Optional[str] = None, session: Session = Depends(get_session)):
     """
-    Run sentiment classification on all database records.
+    Run sentiment classification on all database records (or one dataset).
     Returns counts per label and a preview table.
     """
     try:
-        return run_sentiment_analysis(session)
+        return FastJSONResponse(run_sentiment_analysis(session, dataset=dataset))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sentiment analysis failed: {e}")
 
@@ -2,23 +2,31 @@
 routes/stream.py — REST endpoints to control the real-time stream + WebSocket endpoint.
 
 Endpoints:
-  POST /api/stream/start   – Begin the live analysis loop
+  POST /api/stream/start   – Begin the live analysis loop (interval or target-rate, any source)
   POST /api/stream/pause   – Pause the stream (same as stop for now)
   POST /api/stream/stop    – Stop the live analysis loop
   GET  /api/stream/status  – Current stream status + session stats
-  WS   /ws/live            – WebSocket channel clients subscribe to
+  GET  /api/stream/windows – Sliding / tumbling window analytics over recent records
+  WS   /ws/live            – WebSocket channel clients subscribe to (?since=<seq>&epoch=<epoch> to resume)
 """
+import json
 import logging
+from typing import Optional
 
-from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
 
 from services.stream_service import (
+    current_epoch,
+    current_seq,
     get_session_stats,
     is_running,
+    latest_window_snapshot,
     pause_stream,
+    replay_since,
     reset_session_stats,
     start_stream,
     stop_stream,
+    windows,
 )
 from ws_manager import manager
 
@@ -31,8 +39,31 @@ router = APIRouter()
 @router.post("/stream/start")
 async def api_start_stream(
     interval: float = Query(default=2.0, ge=0.5, le=10.0, description="Seconds between records"),
+    rate: Optional[float] = Query(default=None, gt=0, le=100_000, description="Target records/sec (overrides interval)"),
+    source: str = Query(default="pool", enum=["pool", "file", "stdin", "socket"]),
+    path: Optional[str] = Query(default=None, description="Replay file, relative to STREAM_REPLAY_DIR"),
+    format: Optional[str] = Query(default=None, enum=["csv", "ndjson"]),
+    text_field: Optional[str] = Query(default=None),
+    timestamp_field: Optional[str] = Query(default=None),
+    timestamp_faithful: bool = Query(default=False, description="Replay following original timestamps"),
+    speed: float = Query(default=1.0, gt=0, le=10_000, description="Speed-up for timestamp-faithful replay"),
+    loop: bool = Query(default=False, description="Restart the replay file when it ends"),
 ):
-    result = await start_stream(interval=interval)
+    try:
+        result = await start_stream(
+            interval=interval,
+            rate=rate,
+            source=source,
+            path=path,
+            fmt=format,
+            text_field=text_field,
+            timestamp_field=timestamp_field,
+            timestamp_faithful=timestamp_faithful,
+            speed=speed,
+            loop=loop,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -56,23 +87,47 @@ async def api_reset_stream():
 
 
 @router.get("/stream/status")
-def api_stream_status():
+async def api_stream_status():
     return {
-        "running": is_running(),
+        "running": await is_running(),
         "clients": manager.client_count,
-        "stats": get_session_stats(),
+        "stats": await get_session_stats(),
+    }
+
+
+@router.get("/stream/windows")
+def api_stream_windows(
+    mode: str = Query(default="sliding", enum=["sliding", "tumbling"]),
+    window: int = Query(default=300, ge=1, description="Sliding window length in seconds"),
+    size: int = Query(default=60, ge=1, description="Tumbling window size in seconds"),
+    count: int = Query(default=10, ge=1, le=1000, description="Number of tumbling windows"),
+):
+    """
+    Windowed analytics over the live stream, served from in-memory buckets.
+    - mode=sliding  → one aggregate over the last `window` seconds
+    - mode=tumbling → `count` consecutive `size`-second windows, oldest first
+    """
+    base = {
+        "bucket_seconds": windows.bucket_seconds,
+        "horizon_seconds": windows.horizon_seconds,
+        "ewma_score": round(windows.ewma_score, 4) if windows.ewma_score is not None else None,
     }
+    if mode == "tumbling":
+        return {**base, "mode": mode, "windows": windows.tumbling(size, count)}
+    return {**base, "mode": mode, "window": windows.sliding(window)}
 
 
 # ── WebSocket Endpoint ─────────────────────────────────────────────
 
 @router.websocket("/ws/live")
-async def websocket_live(websocket: WebSocket):
+async def websocket_live(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
     """
     Frontend connects here to receive real-time analysis events.
-    Each event is a JSON object:
+    Each sequenced event is a JSON object:
     {
       "type":       "new_record" | "stream_started" | "stream_stopped",
+      "seq":        int (monotonic — a jump means missed events),
+      "epoch":      str (the seq numbering; a new one means seq started over),
       "id":         int,
       "text":       str,
       "sentiment":  str,
@@ -85,15 +140,39 @@ async def websocket_live(websocket: WebSocket):
         "emotion":   {"Joy": int, ...}
       }
     }
+    Unsequenced "window_update" events carry the latest window analytics.
+
+    On connect the client receives a "connected" snapshot followed by a
+    "replay" frame with the buffered recent events. Pass ?since=<last seen seq>
+    and &epoch=<its epoch> when reconnecting to receive only what was missed;
+    "truncated": true means some of it is no longer buffered. A `since` from
+    another epoch (e.g. from before a server restart) is ignored: the frame
+    then has "since": null and "reset": true, like a fresh connect.
     """
+    # Read before connecting: these may wait on the broker, and nothing live should arrive meanwhile
+    running, stats = await is_running(), await get_session_stats()
     await manager.connect(websocket)
+    # Snapshot the buffer before the first await so nothing slips between it and live events
+    # (a live event may still overtake the replay frame; clients de-duplicate by seq)
+    seq = current_seq()
+    events, truncated, reset = replay_since(since, epoch)
+    if reset:
+        since = None
     # Send current state immediately on connect
     await websocket.send_json({
         "type": "connected",
-        "running": is_running(),
-        "stats": get_session_stats(),
+        "running": running,
+        "stats": stats,
         "clients": manager.client_count,
+        "seq": seq,
+        "epoch": current_epoch(),
+        "windows": latest_window_snapshot(),
     })
+    # Buffered events are already serialized — splice them in without re-encoding
+    await websocket.send_text(
+        f'{{"type": "replay", "since": {json.dumps(since)}, "truncated": {json.dumps(truncated)}, '
+        f'"reset": {json.dumps(reset)}, "epoch": {json.dumps(current_epoch())}, "events": [{",".join(events)}]}}'
+    )
     try:
         while True:
             # Keep the connection alive; frontend sends pings as needed
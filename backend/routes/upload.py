@@ -1,82 +1,212 @@
 """
 Route: /api/upload
-Handles large file ingestion via background tasks.
-Returns a job_id immediately, frontend polls /api/upload/status/{job_id}
+Handles large file ingestion via the background job scheduler.
+Returns a job_id immediately; the frontend follows /api/upload/events/{job_id}
+(Server-Sent Events) and falls back to polling /api/upload/status/{job_id}.
+
+Very large files go through the chunked, resumable protocol under
+/api/upload/sessions (see services/upload_service.py).
 """
 import asyncio
+import os
 import uuid
-from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
-from sqlmodel import Session
+from fastapi import APIRouter, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
 
-from database.db import engine
-from services.file_service import ingest_file
+from routes.jobs import job_event_stream
+from services.dataset_service import DEFAULT_DATASET, MODES
+from services.file_service import UNSUPPORTED_FORMAT, is_supported
+from services.job_service import PRIORITIES, UPLOAD_DIR, scheduler
+from services.upload_service import (
+    ChunkRejected, ChunkTooLarge, abort_session, complete_session, create_session, get_session, open_chunk,
+)
 
 router = APIRouter(prefix="/api", tags=["Upload"])
 
-# In-memory job store  { job_id: { status, progress, result, error } }
-_jobs: dict[str, dict] = {}
-_executor = ThreadPoolExecutor(max_workers=2)
-
-
-def _run_ingest(job_id: str, content: bytes, filename: str):
-    """Runs in a thread pool — performs the full NLP analysis and saves to DB."""
-    try:
-        _jobs[job_id]["status"] = "processing"
-        with Session(engine) as session:
-            result = ingest_file(content, filename, session, progress_cb=lambda pct: _update_progress(job_id, pct))
-        _jobs[job_id]["status"] = "done"
-        _jobs[job_id]["result"] = result
-    except Exception as e:
-        _jobs[job_id]["status"] = "error"
-        _jobs[job_id]["error"] = str(e)
-
-
-def _update_progress(job_id: str, pct: int):
-    if job_id in _jobs:
-        _jobs[job_id]["progress"] = pct
+_READ_CHUNK = 1 << 20
 
 
 @router.post("/upload")
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    priority: str = Query(default="normal", enum=list(PRIORITIES)),
+    dataset: str = Query(default=DEFAULT_DATASET, min_length=1, max_length=64),
+    mode: str = Query(default="replace", enum=list(MODES)),
+    sheet: Optional[str] = Query(default=None, max_length=100),
+    text_column: Optional[str] = Query(default=None, max_length=200),
 ):
     """
-    Accept a CSV/XLSX file, start async NLP analysis in background,
+    Accept a CSV/TSV/NDJSON/XLSX file — optionally gzip/bz2/zstd compressed
+    or zipped — queue NLP analysis as a background job,
     return a job_id to poll for progress.
+    - dataset: name of the dataset to load into
+    - mode: replace (the dataset's previous rows) | append
+    - sheet: Excel worksheet name or 0-based index (default: the first)
+    - text_column: column holding the text (default: detected from a sample)
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided.")
-    if not file.filename.lower().endswith((".csv", ".xlsx", ".xls")):
-        raise HTTPException(status_code=400, detail="File must be CSV or XLSX.")
+    if not is_supported(file.filename):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FORMAT)
 
+    # Persist the upload so the job survives a restart
+    job_id = str(uuid.uuid4())
+    path = os.path.join(UPLOAD_DIR, job_id + os.path.splitext(file.filename)[1].lower())
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
     try:
-        content = await file.read()
+        with open(path, "wb") as out:
+            while chunk := await file.read(_READ_CHUNK):
+                out.write(chunk)
     except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
         raise HTTPException(status_code=400, detail=f"Could not read file: {e}")
 
-    job_id = str(uuid.uuid4())
-    _jobs[job_id] = {"status": "queued", "progress": 0, "result": None, "error": None}
-
-    # Run analysis in thread pool so the HTTP response is immediate
-    loop = asyncio.get_event_loop()
-    loop.run_in_executor(_executor, _run_ingest, job_id, content, file.filename)
-
+    scheduler.submit(
+        "ingest",
+        {"path": path, "filename": file.filename, "dataset": dataset, "mode": mode,
+         "sheet": sheet, "text_column": text_column},
+        priority=priority,
+        job_id=job_id,
+    )
     return {"job_id": job_id, "status": "queued"}
 
 
 @router.get("/upload/status/{job_id}")
 def upload_status(job_id: str):
     """Poll for background job status."""
-    job = _jobs.get(job_id)
+    job = scheduler.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found.")
     return {
         "job_id": job_id,
-        "status": job["status"],        # queued | processing | done | error
+        "status": job["status"],        # queued | processing | done | error | cancelled
         "progress": job["progress"],    # 0-100
+        "stage": job["stage"],          # parsing | analyzing | finalizing
+        "detail": job["detail"],        # rows_done, rows_total, rows_per_sec, eta_seconds
         "result": job["result"],        # populated when done
         "error": job["error"],
     }
+
+
+@router.get("/upload/events/{job_id}")
+def upload_events(job_id: str):
+    """Push progress for an upload as Server-Sent Events (see /api/jobs/{job_id}/events)."""
+    return job_event_stream(job_id)
+
+
+@router.post("/upload/cancel/{job_id}")
+def upload_cancel(job_id: str):
+    """Cancel a queued or running upload analysis."""
+    status = scheduler.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {"job_id": job_id, "status": status}
+
+
+# ── Chunked / resumable uploads ───────────────────────────────────────────────
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: Optional[int] = None
+    dataset: str = Field(default=DEFAULT_DATASET, min_length=1, max_length=64)
+    mode: str = "replace"
+    priority: str = "normal"
+    analyze_early: bool = False
+    sheet: Optional[str] = Field(default=None, max_length=100)
+    text_column: Optional[str] = Field(default=None, max_length=200)
+
+
+class CompleteRequest(BaseModel):
+    sha256: Optional[str] = None
+
+
+def _rejected(e: ChunkRejected) -> JSONResponse:
+    return JSONResponse(status_code=409, content={"detail": str(e), "received": e.received})
+
+
+@router.post("/upload/sessions")
+def open_upload_session(body: UploadSessionRequest):
+    """
+    Start a chunked upload. Send the file with PUT /upload/sessions/{id}?offset=N,
+    then POST /upload/sessions/{id}/complete. With analyze_early=true (line formats only)
+    analysis starts on the received prefix while later chunks are still arriving.
+    """
+    if body.mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(MODES)}.")
+    if body.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITIES)}.")
+    try:
+        return create_session(
+            body.filename, body.size, dataset=body.dataset, mode=body.mode,
+            priority=body.priority, analyze_early=body.analyze_early,
+            sheet=body.sheet, text_column=body.text_column,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/upload/sessions/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    content_encoding: Optional[str] = Header(default=None),
+    x_chunk_sha256: Optional[str] = Header(default=None),
+):
+    """
+    Write one chunk at `offset` (must not be past the bytes already received).
+    409 responses carry `received` — resume from there.
+    """
+    try:
+        writer = await asyncio.to_thread(open_chunk, upload_id, offset, content_encoding, x_chunk_sha256)
+        if writer is None:
+            raise HTTPException(status_code=404, detail="Upload not found.")
+        try:
+            # Each part goes to disk as it arrives; nothing is buffered per chunk
+            async for part in request.stream():
+                await asyncio.to_thread(writer.write, part)
+            upload = await asyncio.to_thread(writer.finish)
+        finally:
+            await asyncio.to_thread(writer.close)
+    except ChunkRejected as e:
+        return _rejected(e)
+    except ChunkTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return upload
+
+
+@router.get("/upload/sessions/{upload_id}")
+def upload_session_status(upload_id: str):
+    """Bytes received so far (the offset to resume from), status and the ingest job id."""
+    upload = get_session(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return upload
+
+
+@router.post("/upload/sessions/{upload_id}/complete")
+async def complete_upload_session(upload_id: str, body: Optional[CompleteRequest] = None):
+    """Seal the upload (optionally verifying the whole-file sha256) and start analysis."""
+    try:
+        upload = await asyncio.to_thread(complete_session, upload_id, body.sha256 if body else None)
+    except ChunkRejected as e:
+        return _rejected(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return upload
+
+
+@router.delete("/upload/sessions/{upload_id}")
+def abort_upload_session(upload_id: str):
+    """Abort an upload, deleting its data and cancelling early analysis."""
+    if not abort_session(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return {"upload_id": upload_id, "status": "aborted"}
@@ -1,49 +1,107 @@
 """
 Route: /api/visualizations + /api/dashboard
 Aggregated data for charts and dashboard summary.
+Responses are cached per data version and carry an ETag (If-None-Match → 304).
 """
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import Session
 
 from database.db import get_session
+from responses import FastJSONResponse
+from services.response_cache import cached_response
 from services.visualize_service import (
-    get_visualization_data, get_dashboard_summary, get_dataset_preview
+    BROWSE_MAX_LIMIT, browse_records, get_visualization_data, get_dashboard_summary, get_dataset_preview
 )
 
-router = APIRouter(prefix="/api", tags=["Visualizations"])
+router = APIRouter(prefix="/api", tags=["Visualizations"], default_response_class=FastJSONResponse)
 
 
 @router.get("/visualizations/data")
-def visualizations_data(session: Session = Depends(get_session)):
+def visualizations_data(
+    request: Request,
+    dataset: Optional[str] = None,
+    deduplicated: bool = Query(default=False, description="Count each near-duplicate cluster once"),
+    session: Session = Depends(get_session),
+):
     """
     Return aggregated sentiment + emotion data for chart rendering.
     """
     try:
-        return get_visualization_data(session)
+        return cached_response(
+            request, "visualizations", lambda: get_visualization_data(session, dataset, deduplicated),
+            dataset, deduplicated=deduplicated,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Visualization failed: {e}")
 
 
 @router.get("/dashboard/summary")
-def dashboard_summary(session: Session = Depends(get_session)):
+def dashboard_summary(
+    request: Request,
+    dataset: Optional[str] = None,
+    deduplicated: bool = Query(default=False, description="Count each near-duplicate cluster once"),
+    session: Session = Depends(get_session),
+):
     """
     Return high-level KPI summary for the Dashboard page.
     """
     try:
-        return get_dashboard_summary(session)
+        return cached_response(
+            request, "dashboard_summary", lambda: get_dashboard_summary(session, dataset, deduplicated),
+            dataset, deduplicated=deduplicated,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dashboard summary failed: {e}")
 
 
 # Backward-compat alias used by the existing frontend
 @router.get("/dashboard")
-def dashboard_compat(session: Session = Depends(get_session)):
-    return get_visualization_data(session)
+def dashboard_compat(
+    request: Request, dataset: Optional[str] = None, deduplicated: bool = False, session: Session = Depends(get_session)
+):
+    return cached_response(
+        request, "visualizations", lambda: get_visualization_data(session, dataset, deduplicated),
+        dataset, deduplicated=deduplicated,
+    )
 
 
 @router.get("/dataset/preview")
-def dataset_preview(limit: int = 50, session: Session = Depends(get_session)):
+def dataset_preview(limit: int = 50, dataset: Optional[str] = None, session: Session = Depends(get_session)):
     """
     Return a preview of the analyzed dataset.
     """
-    return get_dataset_preview(session, limit)
+    return FastJSONResponse(get_dataset_preview(session, limit, dataset))
+
+
+@router.get("/dataset/records")
+def dataset_records(
+    dataset: Optional[str] = None,
+    columns: Optional[str] = Query(default=None, description="Comma-separated subset of columns"),
+    cursor: Optional[int] = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=50, ge=1, le=BROWSE_MAX_LIMIT),
+    order: str = Query(default="desc", enum=["desc", "asc"]),
+    total: bool = Query(default=False, description="Also return the matching row count (cached per data version)"),
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    max_confidence: Optional[float] = Query(default=None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    deduplicated: bool = Query(default=False, description="Only one record per near-duplicate cluster"),
+    session: Session = Depends(get_session),
+):
+    """
+    Browse records page by page. Follow `next_cursor` until it is null; every
+    page costs the same however deep it is.
+    """
+    try:
+        return FastJSONResponse(browse_records(
+            session, dataset, columns=columns.split(",") if columns else None, cursor=cursor, limit=limit,
+            order=order, with_total=total, sentiment=sentiment, emotion=emotion, min_confidence=min_confidence,
+            max_confidence=max_confidence, since=since, until=until, deduplicated=deduplicated,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
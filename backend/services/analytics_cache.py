@@ -0,0 +1,427 @@
+"""
+Analytics cache — the analysis columns of every record held in NumPy arrays.
+
+Dashboard summaries, chart aggregates and filtered counts only need a few
+small columns, so each worker process keeps them in memory, in id order:
+  id              int64
+  created_at      datetime64[us]
+  sentiment       int16 label code (database/labels.py), -1 if none
+  emotion         int16 label code, -1 if none
+  confidence      int16 fixed-point confidence, -1 if none
+  partition       int32 index into the cached partition ids
+  representative  bool, duplicate_of IS NULL
+— about 27 bytes a row. Alongside them a small cube of row counts per
+(partition, representative, sentiment, emotion, day) is kept up to date, so
+summaries, charts and label-filtered counts sum a few thousand entries, and
+counts with confidence or time filters mask the columns: milliseconds on
+millions of rows, where reading them through the ORM takes seconds.
+
+The cache is built in a background thread on startup and caught up before
+every query. Rows are only ever added with ids above the committed ones
+(SQLite has one writer at a time), so whatever uploads, the stream writer or
+other worker processes committed since the last query is read as a short
+id > last range of the primary key. Rows of partitions being deleted, or
+already purged and gone from the Dataset table, are compacted away; that
+also lowers the range start, since SQLite hands out the ids above the
+surviving rows again. Records updated in place (re-analysis) advance the
+REWRITTEN data version, and rows removed any other way (the highest id drops
+below the range start), rebuild the cache in the background.
+
+Past ANALYTICS_CACHE_MAX_MB, while (re)building, or with ANALYTICS_CACHE=0
+every query returns None and callers fall back to the snapshot or SQL.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import Integer, String, type_coerce
+from sqlmodel import Session, col, func, select
+
+from database.db import engine
+from database.labels import CONFIDENCE_SCALE, label_code, label_name
+from models.data_models import DataVersion, Dataset, Record
+from services.dataset_service import REWRITTEN, _naive_utc
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_ENABLED = os.getenv("ANALYTICS_CACHE", "1") == "1"
+ANALYTICS_CACHE_MAX_MB = int(os.getenv("ANALYTICS_CACHE_MAX_MB", "256"))
+
+_NONE = -1
+_PAGE_SIZE = 20000
+_DTYPES = {
+    "id": np.int64, "created_at": "datetime64[us]", "sentiment": np.int16, "emotion": np.int16,
+    "confidence": np.int16, "partition": np.int32, "representative": np.bool_,
+}
+_ROW_BYTES = sum(np.dtype(t).itemsize for t in _DTYPES.values())
+# Raw column values: the stored label codes and fixed-point confidence, the
+# created_at text (numpy parses it far faster than the DateTime type)
+_FIELDS = [
+    Record.dataset_id,
+    func.coalesce(type_coerce(Record.sentiment, Integer), _NONE),
+    func.coalesce(type_coerce(Record.emotion, Integer), _NONE),
+    func.coalesce(type_coerce(Record.confidence, Integer), _NONE),
+    type_coerce(Record.created_at, String),
+    col(Record.duplicate_of).is_(None),
+]
+
+
+class _OverCeiling(Exception):
+    pass
+
+
+class _Columns:
+    """
+    Growable column arrays plus `cube`: row counts per (partition,
+    representative, sentiment, emotion, day) with the lowest id of each, which
+    is all summaries and charts need — a few thousand entries however many
+    rows. Views up to `size` stay valid while rows are appended.
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self.size = 0
+        self.arrays = {name: np.empty(0, dtype) for name, dtype in _DTYPES.items()}
+        self.cube = (np.empty((0, 5), np.int64), np.empty(0, np.int64), np.empty(0, np.int64))
+        self.partitions: list[str] = []
+        self._partition_index: dict[str, int] = {}
+        # Partitions whose rows have been compacted away
+        self.dropped: set[str] = set()
+        # Highest id read; the next tail starts after it
+        self.last_id = 0
+
+    def read(self, deleting: list[str]):
+        """
+        Append the committed rows after last_id, leaving out partitions being
+        deleted. Keyset pages like dataset_service.record_pages, but through a
+        Connection: the ORM's row loading would cost more than the rest of the
+        build together.
+        """
+        conditions = [col(Record.dataset_id).not_in(deleting)] if deleting else []
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(Record.id, *_FIELDS)
+                    .where(*conditions, col(Record.id) > self.last_id)
+                    .order_by(col(Record.id))
+                    .limit(_PAGE_SIZE)
+                ).all()
+            if rows:
+                self._append(rows)
+            if len(rows) < _PAGE_SIZE:
+                return
+
+    def _append(self, rows: list):
+        ids, partitions, sentiment, emotion, confidence, created_at, representative = zip(*rows)
+        index_of = self._index_of
+        columns = {
+            "id": np.array(ids, np.int64),
+            "created_at": np.array(created_at, "datetime64[us]"),
+            "sentiment": np.array(sentiment, np.int16),
+            "emotion": np.array(emotion, np.int16),
+            "confidence": np.array(confidence, np.int16),
+            "partition": np.array([index_of(p) for p in partitions], np.int32),
+            "representative": np.array(representative, np.bool_),
+        }
+        end = self.size + len(rows)
+        if end > self.max_rows:
+            raise _OverCeiling
+        if end > len(self.arrays["id"]):
+            capacity = min(self.max_rows, max(end, int(len(self.arrays["id"]) * 1.5), 1024))
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, values in columns.items():
+            self.arrays[name][self.size:end] = values
+        self.size = end
+        self.last_id = int(ids[-1])
+
+        keys = np.stack([
+            columns["partition"], columns["representative"], columns["sentiment"], columns["emotion"],
+            columns["created_at"].astype("datetime64[D]").astype(np.int64),  # NaT becomes the int64 minimum
+        ], axis=1).astype(np.int64)
+        self._add_to_cube(keys, np.ones(len(rows), np.int64), columns["id"])
+
+    def _add_to_cube(self, keys: np.ndarray, counts: np.ndarray, first: np.ndarray):
+        old_keys, old_counts, old_first = self.cube
+        unique, inverse = _group(np.concatenate([old_keys, keys]))
+        merged_first = np.full(len(unique), np.iinfo(np.int64).max)
+        np.minimum.at(merged_first, inverse, np.concatenate([old_first, first]))
+        merged_counts = np.bincount(inverse, weights=np.concatenate([old_counts, counts]), minlength=len(unique))
+        self.cube = (unique, merged_counts.astype(np.int64), merged_first)
+
+    def _index_of(self, partition_id: str) -> int:
+        index = self._partition_index.get(partition_id)
+        self.dropped.discard(partition_id)
+        if index is None:
+            index = self._partition_index[partition_id] = len(self.partitions)
+            self.partitions.append(partition_id)
+        return index
+
+    def drop_partitions(self, gone: set[str]):
+        """Remove the rows of `gone` partitions (into new arrays, so handed-out views stay intact)."""
+        dead = np.array([p in gone for p in self.partitions], bool)
+        keep = ~dead[self.arrays["partition"][:self.size]]
+        self.arrays = {name: array[:self.size][keep] for name, array in self.arrays.items()}
+        self.size = int(keep.sum())
+        keys, counts, first = self.cube
+        kept = ~dead[keys[:, 0]]
+        self.cube = (keys[kept], counts[kept], first[kept])
+        self.dropped |= gone
+        # Ids above the surviving rows may be handed out again once the dropped rows are purged
+        self.last_id = int(self.arrays["id"][self.size - 1]) if self.size else 0
+
+    def view(self) -> dict[str, np.ndarray]:
+        return {name: array[:self.size] for name, array in self.arrays.items()}
+
+
+class AnalyticsCache:
+    """The per-process cache; see the module docstring. Queries return None to ask for the fallback."""
+
+    def __init__(self, max_bytes: int = ANALYTICS_CACHE_MAX_MB << 20):
+        self.max_rows = max_bytes // _ROW_BYTES
+        self._lock = threading.Lock()
+        self._columns: Optional[_Columns] = None
+        self._rewritten: Optional[int] = None
+        self._building = False
+        # Partitions present when the data outgrew the ceiling; retried once they change
+        self._over: Optional[frozenset] = None
+
+    def warm(self):
+        """Build the cache in the background (at startup)."""
+        if ANALYTICS_CACHE_ENABLED:
+            with self._lock:
+                self._start_rebuild()
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def summary(self, dataset: Optional[str] = None, deduplicated: bool = False) -> Optional[dict]:
+        """visualize_service.get_dashboard_summary from the cache."""
+        visible = self._visible(dataset, deduplicated)
+        if visible is None:
+            return None
+        _, (keys, counts, _), _, entries = visible
+        sentiment = _label_counts("sentiment", keys[entries, 2], counts[entries])
+        emotion = _label_counts("emotion", keys[entries, 3], counts[entries])
+        return {
+            "total_records": int(counts[entries].sum()),
+            "positive": sentiment.get("Positive", 0),
+            "neutral": sentiment.get("Neutral", 0),
+            "negative": sentiment.get("Negative", 0),
+            "dominant_emotion": max(emotion, key=emotion.get) if emotion else "N/A",
+        }
+
+    def visualization(self, dataset: Optional[str] = None, deduplicated: bool = False) -> Optional[dict]:
+        """The label distributions and daily sentiment series of get_visualization_data (no top words)."""
+        visible = self._visible(dataset, deduplicated)
+        if visible is None:
+            return None
+        _, (keys, counts, first), _, entries = visible
+        analyzed = entries & (keys[:, 2] != _NONE)
+        time_series: dict[str, dict[str, int]] = {}
+        if analyzed.any():
+            codes = keys[analyzed, 2]
+            days, inverse = np.unique(keys[analyzed, 4], return_inverse=True)
+            inverse = inverse.reshape(-1)
+            grid = np.zeros((len(days), int(codes.max()) + 1), np.int64)
+            np.add.at(grid, (inverse, codes), counts[analyzed])
+            first_id = np.full(len(days), np.iinfo(np.int64).max)
+            np.minimum.at(first_id, inverse, first[analyzed])
+            # Days in order of their first record, like a pass over the records in id order
+            for i in np.argsort(first_id, kind="stable"):
+                date = days[i].astype("datetime64[D]").astype(object)
+                day = time_series.setdefault(
+                    date.strftime("%b %d") if date else "Unknown", {"Positive": 0, "Neutral": 0, "Negative": 0}
+                )
+                for code in np.flatnonzero(grid[i]):
+                    label = label_name("sentiment", int(code))
+                    if label:
+                        day[label] = day.get(label, 0) + int(grid[i, code])
+        return {
+            "sentiment_distribution": _label_counts("sentiment", keys[entries, 2], counts[entries]),
+            "emotion_distribution": _label_counts("emotion", keys[entries, 3], counts[entries]),
+            "sentiment_over_time": [{"date": k, **v} for k, v in time_series.items()],
+            "total": int(counts[entries].sum()),
+        }
+
+    def count(
+        self,
+        dataset: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        emotion: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        deduplicated: bool = False,
+    ) -> Optional[int]:
+        """
+        Number of visible records matching the record_conditions filters:
+        from the cube unless confidence or time filters need the rows.
+        """
+        visible = self._visible(dataset, deduplicated)
+        if visible is None:
+            return None
+        columns, (keys, counts, _), allowed, entries = visible
+        labels = {}
+        for kind, name in (("sentiment", sentiment), ("emotion", emotion)):
+            if name:
+                labels[kind] = label_code(kind, name)
+                # Unknown names get a code no row has; here it would match the unlabeled rows
+                if labels[kind] == _NONE:
+                    return 0
+        if min_confidence is None and max_confidence is None and since is None and until is None:
+            for kind, code in labels.items():
+                entries &= keys[:, 2 if kind == "sentiment" else 3] == code
+            return int(counts[entries].sum())
+
+        mask = np.ones(len(columns["id"]), bool) if allowed.all() else allowed[columns["partition"]]
+        if deduplicated:
+            mask &= columns["representative"]
+        for kind, code in labels.items():
+            mask &= columns[kind] == code
+        confidence = columns["confidence"]
+        if min_confidence is not None:
+            mask &= (confidence != _NONE) & (confidence >= round(min_confidence * CONFIDENCE_SCALE))
+        if max_confidence is not None:
+            mask &= (confidence != _NONE) & (confidence <= round(max_confidence * CONFIDENCE_SCALE))
+        if since is not None:
+            mask &= columns["created_at"] >= np.datetime64(_naive_utc(since), "us")
+        if until is not None:
+            mask &= columns["created_at"] < np.datetime64(_naive_utc(until), "us")
+        return int(np.count_nonzero(mask))
+
+    def _visible(self, dataset: Optional[str], deduplicated: bool) -> Optional[tuple]:
+        """
+        (column views, cube, partitions record_filter lets through, cube
+        entries it lets through) after catching up; None to fall back.
+        """
+        current = self._current()
+        if current is None:
+            return None
+        columns, cube, partitions, statuses = current
+        if dataset:
+            allowed = [statuses.get(p) == (dataset, "active") for p in partitions]
+        else:
+            # A partition missing from the table has been purged since the rows were read
+            allowed = [statuses.get(p, (None, None))[1] == "active" for p in partitions]
+        allowed = np.array(allowed, bool)
+        keys = cube[0]
+        entries = allowed[keys[:, 0]]
+        if deduplicated:
+            entries &= keys[:, 1] == 1
+        return columns, cube, allowed, entries
+
+    # ── Maintenance ───────────────────────────────────────────────────────────
+
+    def _current(self) -> Optional[tuple[dict, tuple, list, dict]]:
+        """(column views, cube, partition ids, partition id -> (name, status)) after catching up."""
+        if not ANALYTICS_CACHE_ENABLED:
+            return None
+        with Session(engine) as session:
+            rewritten = session.get(DataVersion, REWRITTEN)
+            statuses = {
+                p: (name, status) for p, name, status in session.exec(select(Dataset.id, Dataset.name, Dataset.status))
+            }
+            max_id = session.exec(select(func.max(Record.id))).one() or 0
+        deleting = [p for p, (_, status) in statuses.items() if status == "deleting"]
+        with self._lock:
+            if self._building:
+                return None
+            if self._over is not None:
+                if self._over != frozenset(statuses) - set(deleting):
+                    self._start_rebuild()
+                return None
+            if self._columns is None or self._rewritten != (rewritten.version if rewritten else 0):
+                self._start_rebuild()
+                return None
+            columns = self._columns
+            gone = {
+                p for p in columns.partitions
+                if p not in columns.dropped and (p not in statuses or statuses[p][1] == "deleting")
+            }
+            if gone:
+                columns.drop_partitions(gone)
+            if max_id < columns.last_id:
+                # Rows we hold were deleted outside a partition drop; their ids may come back
+                self._columns = None
+                self._start_rebuild()
+                return None
+            try:
+                columns.read(deleting)
+            except _OverCeiling:
+                self._went_over(statuses, deleting)
+                return None
+            return columns.view(), columns.cube, list(columns.partitions), statuses
+
+    def _start_rebuild(self):
+        """Rebuild in a background thread; the caller holds the lock."""
+        if self._building:
+            return
+        self._building = True
+        threading.Thread(target=self._rebuild, name="analytics-cache", daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            with Session(engine) as session:
+                rewritten = session.get(DataVersion, REWRITTEN)
+                statuses = {p: s for p, s in session.exec(select(Dataset.id, Dataset.status))}
+            deleting = [p for p, status in statuses.items() if status == "deleting"]
+            columns = _Columns(self.max_rows)
+            columns.read(deleting)
+            with self._lock:
+                self._columns, self._over = columns, None
+                self._rewritten = rewritten.version if rewritten else 0
+            logger.info(
+                f"[ANALYTICS] Cached {columns.size} records ({columns.size * _ROW_BYTES / 2**20:.1f} MB)."
+            )
+        except _OverCeiling:
+            with self._lock:
+                self._went_over(statuses, deleting)
+        except Exception as e:
+            # Left empty, so the next query tries again
+            logger.error(f"[ANALYTICS] Building the cache failed: {e}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _went_over(self, statuses: dict, deleting: list[str]):
+        self._columns = None
+        self._over = frozenset(statuses) - set(deleting)
+        logger.warning(
+            f"[ANALYTICS] More than {self.max_rows} records (ANALYTICS_CACHE_MAX_MB); "
+            "falling back to the snapshot / SQL until the datasets change."
+        )
+
+
+def _group(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """np.unique(keys, axis=0, return_inverse=True), on one integer per row when the key ranges allow."""
+    low = keys.min(axis=0)
+    dims = keys.max(axis=0) - low + 1
+    # A NaT day (the int64 minimum) overflows the range to a negative one
+    if (dims > 0).all() and np.prod(dims.astype(float)) < 2 ** 62:
+        flat = np.ravel_multi_index(tuple((keys - low).T), tuple(dims))
+        unique, inverse = np.unique(flat, return_inverse=True)
+        return np.stack(np.unravel_index(unique, tuple(dims)), axis=1) + low, inverse.reshape(-1)
+    # Sorting whole rows is several times slower; only a missing created_at (NaT) gets here
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return unique, inverse.reshape(-1)
+
+
+def _label_counts(kind: str, codes: np.ndarray, counts: np.ndarray) -> dict[str, int]:
+    """Rows per non-empty label, from cube entries' label codes and row counts."""
+    labeled = codes != _NONE
+    totals = np.bincount(codes[labeled], weights=counts[labeled])
+    out = {}
+    for code in np.flatnonzero(totals):
+        label = label_name(kind, int(code))
+        if label:
+            out[label] = int(totals[code])
+    return out
+
+
+analytics_cache = AnalyticsCache()
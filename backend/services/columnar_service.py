@@ -0,0 +1,303 @@
+"""
+Columnar service — Parquet / Arrow IPC exports and the analytics snapshot.
+
+Both are built from keyset pages of the record table (see
+dataset_service.record_pages) into Arrow record batches of
+COLUMNAR_BATCH_ROWS rows. Sentiment and emotion are dictionary-encoded
+against one dictionary per export (the distinct labels are read up front),
+so each row stores a one-byte code instead of the label string and the
+types survive a round-trip into pandas.
+
+The snapshot is an uncompressed Arrow IPC file per dataset in SNAPSHOT_DIR,
+opened through a memory map, so the visualization layer aggregates straight
+off the page cache without copying or parsing anything. Rows added since the
+snapshot was written are read from the database as a small tail; the file is
+rewritten when the tail grows past SNAPSHOT_MAX_TAIL rows, when the dataset's
+partitions change, or after invalidate_snapshots() (records updated in place).
+
+Needs the optional pyarrow package. Without it the columnar export formats
+are rejected and load_snapshot() returns None, so callers fall back to SQL.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Iterator, Optional
+
+from sqlmodel import Session, col, distinct, func, select
+
+from database.db import engine
+from models.data_models import Dataset, Record
+from services.dataset_service import record_filter, record_pages
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+COLUMNAR_MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"}
+COLUMNAR_BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", "65536"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./database/snapshots")
+SNAPSHOT_MAX_TAIL = int(os.getenv("SNAPSHOT_MAX_TAIL", "50000"))
+
+# The snapshot leaves out the raw text — only exports need it
+SNAPSHOT_COLUMNS = ["id", "clean_text", "sentiment", "emotion", "confidence", "created_at", "duplicate_of"]
+_LABEL_COLUMNS = ("sentiment", "emotion")
+_PAGE_SIZE = 5000
+
+# path -> (mtime_ns, table, max_id, partitions) of the snapshots opened by this process
+_open_snapshots: dict[str, tuple] = {}
+# Guards _open_snapshots, _write_locks and _generation; never held while a snapshot is written
+_snapshot_lock = threading.Lock()
+# path -> lock held while that snapshot is rewritten, so concurrent loads write it once
+_write_locks: dict[str, threading.Lock] = {}
+# Bumped by invalidate_snapshots(); a snapshot written across a bump is discarded
+_generation = 0
+
+
+# ── Exports ───────────────────────────────────────────────────────────────────
+
+def export_columnar(
+    format: str,
+    columns: list[str],
+    conditions: list,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> Iterator[bytes]:
+    """
+    Stream the records matching `conditions` as a zstd-compressed Parquet file
+    (one row group per batch) or Arrow IPC file. Rows added after the call are
+    not included, so the label dictionaries always cover every row.
+    """
+    if pa is None:
+        raise ValueError("Parquet / Arrow exports need the 'pyarrow' package on the server.")
+    with Session(engine) as session:
+        max_id = session.exec(select(func.max(Record.id)).where(*conditions)).one() or 0
+        conditions = [*conditions, col(Record.id) <= max_id]
+        builder = _BatchBuilder(columns, _labels(session, columns, conditions))
+    return _columnar_chunks(format, builder, conditions, check_cancelled)
+
+
+def _columnar_chunks(format, builder, conditions, check_cancelled) -> Iterator[bytes]:
+    sink = _Drain()
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, builder.schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, builder.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    for batch in _batches(builder, conditions, check_cancelled=check_cancelled):
+        writer.write_table(pa.Table.from_batches([batch]))
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.take()
+
+
+class _BatchBuilder:
+    """Turns pages of (id, *columns) rows into Arrow record batches of a fixed schema."""
+
+    def __init__(self, columns: list[str], labels: dict[str, list[str]]):
+        self.columns = columns
+        self.fields = [getattr(Record, c) for c in columns]
+        self._codes = {c: {label: i for i, label in enumerate(values)} for c, values in labels.items()}
+        self._dictionaries = {c: pa.array(values, pa.string()) for c, values in labels.items()}
+        self.schema = pa.schema([pa.field(c, self._type(c)) for c in columns])
+
+    def _type(self, column: str):
+        if column in self._codes:
+            index = pa.int8() if len(self._codes[column]) <= 127 else pa.int32()
+            return pa.dictionary(index, pa.string())
+        return {
+            "id": pa.int64(), "text": pa.string(), "clean_text": pa.string(),
+            "confidence": pa.float64(), "created_at": pa.timestamp("us"), "duplicate_of": pa.int64(),
+        }[column]
+
+    def build(self, rows: list) -> "pa.RecordBatch":
+        values = list(zip(*rows))[1:]  # drop the keyset id
+        arrays = []
+        for column, data in zip(self.columns, values):
+            kind = self.schema.field(column).type
+            if column in self._codes:
+                codes = self._codes[column]
+                indices = pa.array([codes.get(v) for v in data], kind.index_type)
+                arrays.append(pa.DictionaryArray.from_arrays(indices, self._dictionaries[column]))
+            else:
+                arrays.append(pa.array(data, kind))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def _labels(session: Session, columns: list[str], conditions: list) -> dict[str, list[str]]:
+    """Distinct values of each label column among the exported rows."""
+    out = {}
+    for column in _LABEL_COLUMNS:
+        if column in columns:
+            field = getattr(Record, column)
+            out[column] = sorted(
+                v for v in session.exec(select(distinct(field)).where(*conditions)).all() if v is not None
+            )
+    return out
+
+
+def _batches(builder: _BatchBuilder, conditions: list, after_id: int = 0, check_cancelled=None):
+    buffered: list = []
+    for rows in record_pages(builder.fields, conditions, after_id, _PAGE_SIZE, check_cancelled):
+        buffered.extend(rows)
+        if len(buffered) >= COLUMNAR_BATCH_ROWS:
+            yield builder.build(buffered)
+            buffered = []
+    if buffered:
+        yield builder.build(buffered)
+
+
+class _Drain:
+    """Write-only file object whose contents a generator takes out piece by piece."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+# ── Snapshot ──────────────────────────────────────────────────────────────────
+
+def load_snapshot(dataset: Optional[str] = None) -> Optional["pa.Table"]:
+    """
+    Snapshot columns (SNAPSHOT_COLUMNS) of every visible record of `dataset`
+    as an Arrow table backed by a memory-mapped file, plus any newer rows
+    read from the database. None if pyarrow is not installed.
+    """
+    if pa is None:
+        return None
+    with Session(engine) as session:
+        conditions = [record_filter(session, dataset)]
+        partitions = _partition_key(session, dataset)
+        max_id = session.exec(select(func.max(Record.id)).where(*conditions)).one() or 0
+
+    path = os.path.join(SNAPSHOT_DIR, _snapshot_name(dataset))
+    with _snapshot_lock:
+        snapshot = _open_snapshot(path)
+        write_lock = _write_locks.setdefault(path, threading.Lock())
+    while not _usable(snapshot, partitions, max_id):
+        with write_lock:
+            # Another thread may have rewritten it while this one waited
+            with _snapshot_lock:
+                snapshot, generation = _open_snapshot(path), _generation
+            if _usable(snapshot, partitions, max_id):
+                break
+            tmp = _write_snapshot(path, [*conditions, col(Record.id) <= max_id], partitions, max_id)
+            with _snapshot_lock:
+                if generation != _generation:
+                    # Records were updated in place while it was written; write it again
+                    os.remove(tmp)
+                    continue
+                os.replace(tmp, path)
+                _open_snapshots.pop(path, None)
+                snapshot = _open_snapshot(path)
+    _, table, snapshot_max, _ = snapshot
+    if max_id <= snapshot_max:
+        return table
+
+    # Rows that arrived after the snapshot was written
+    tail_conditions = [*conditions, col(Record.id) <= max_id]
+    with Session(engine) as session:
+        builder = _BatchBuilder(SNAPSHOT_COLUMNS, _labels(
+            session, SNAPSHOT_COLUMNS, [*tail_conditions, col(Record.id) > snapshot_max]
+        ))
+    tail = list(_batches(builder, tail_conditions, after_id=snapshot_max))
+    if not tail:
+        return table
+    return pa.concat_tables([table, pa.Table.from_batches(tail)], promote_options="permissive")
+
+
+def invalidate_snapshots():
+    """Drop every snapshot — call after records were updated in place (re-analysis, preprocessing)."""
+    global _generation
+    with _snapshot_lock:
+        _generation += 1
+        _open_snapshots.clear()
+        if os.path.isdir(SNAPSHOT_DIR):
+            for name in os.listdir(SNAPSHOT_DIR):
+                if name.endswith(".arrow"):
+                    os.remove(os.path.join(SNAPSHOT_DIR, name))
+
+
+def _usable(snapshot: Optional[tuple], partitions: str, max_id: int) -> bool:
+    """True if `snapshot` covers the current partitions and at most SNAPSHOT_MAX_TAIL rows are missing."""
+    return (
+        snapshot is not None
+        and snapshot[3] == partitions
+        and snapshot[2] <= max_id
+        and max_id - snapshot[2] <= SNAPSHOT_MAX_TAIL
+    )
+
+
+def _write_snapshot(path: str, conditions: list, partitions: str, max_id: int) -> str:
+    """Write the snapshot for `path` to a temporary file next to it and return that file's path."""
+    with Session(engine) as session:
+        builder = _BatchBuilder(SNAPSHOT_COLUMNS, _labels(session, SNAPSHOT_COLUMNS, conditions))
+    schema = builder.schema.with_metadata({"partitions": partitions, "max_id": str(max_id)})
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    rows = 0
+    # Uncompressed, so the memory-mapped buffers can be used in place
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in _batches(builder, conditions):
+            writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+            rows += batch.num_rows
+    logger.info(f"[SNAPSHOT] Wrote {rows} rows for {path}.")
+    return tmp
+
+
+def _open_snapshot(path: str) -> Optional[tuple]:
+    """(mtime_ns, table, max_id, partitions) of the snapshot at `path`, reusing this process' mapping."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _open_snapshots.get(path)
+    if cached and cached[0] == mtime:
+        return cached
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if table.column_names != SNAPSHOT_COLUMNS:
+        return None  # written by a version with other columns
+    meta = table.schema.metadata or {}
+    snapshot = (mtime, table, int(meta.get(b"max_id", 0)), meta.get(b"partitions", b"").decode())
+    _open_snapshots[path] = snapshot
+    return snapshot
+
+
+def _partition_key(session: Session, dataset: Optional[str]) -> str:
+    """Identifies the set of visible partitions; it changes on every load, replace or drop."""
+    query = select(Dataset.id).where(Dataset.status == "active")
+    if dataset:
+        query = query.where(Dataset.name == dataset)
+    return hashlib.sha1(",".join(sorted(session.exec(query).all())).encode()).hexdigest()
+
+
+def _snapshot_name(dataset: Optional[str]) -> str:
+    # Dataset names are free text; keep file names safe
+    return "all.arrow" if not dataset else f"ds-{hashlib.sha1(dataset.encode()).hexdigest()[:16]}.arrow"
@@ -0,0 +1,319 @@
+"""
+Dataset service — named datasets stored as partitions of the record table.
+
+Every Record carries a dataset_id that points at a Dataset partition. A
+logical dataset ("default", "stream", or any upload name) is the set of its
+*active* partitions:
+  - append  – load into a new partition, then mark it active
+  - replace – load into a new partition, then in one transaction mark it
+              active and the dataset's previous partitions deleting
+  - drop    – mark all of a dataset's partitions deleting
+
+Each of those is a single-row status update, however many rows are involved.
+Rows of loading / deleting partitions are filtered out of every read, and a
+low-priority "purge" job deletes them in small chunks afterwards.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, Optional
+
+from sqlalchemy import insert, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, col, delete, func, select, text, update
+
+from database.db import engine
+from models.data_models import DataVersion, Dataset, EntityCount, Job, Record
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = "default"
+STREAM_DATASET = "stream"
+MODES = ("append", "replace")
+# DataVersion row counting writes to any dataset
+ALL_DATA = "*"
+# DataVersion row counting in-place updates of existing records (see analytics_cache)
+REWRITTEN = "*rewritten"
+PURGE_BATCH_SIZE = int(os.getenv("DATASET_PURGE_BATCH", "5000"))
+
+
+def ensure_default_dataset():
+    """Register the partition that pre-existing records (dataset_id='default') belong to."""
+    with Session(engine) as session:
+        if not session.get(Dataset, DEFAULT_DATASET):
+            rows = session.exec(
+                select(func.count()).select_from(Record).where(Record.dataset_id == DEFAULT_DATASET)
+            ).one()
+            session.add(Dataset(
+                id=DEFAULT_DATASET, name=DEFAULT_DATASET, status="active",
+                row_count=rows, activated_at=datetime.utcnow(),
+            ))
+            session.commit()
+    if has_pending_purge():
+        schedule_purge()
+
+
+def record_filter(session: Session, dataset: Optional[str] = None):
+    """
+    WHERE clause restricting Record to visible rows, optionally of one dataset.
+    Use as select(Record).where(record_filter(session, dataset)).
+    """
+    if dataset:
+        ids = session.exec(
+            select(Dataset.id).where(Dataset.name == dataset, Dataset.status == "active")
+        ).all()
+        return col(Record.dataset_id).in_(ids)
+    hidden = session.exec(select(Dataset.id).where(Dataset.status != "active")).all()
+    return col(Record.dataset_id).not_in(hidden) if hidden else true()
+
+
+def record_conditions(
+    session: Session,
+    dataset: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    deduplicated: bool = False,
+) -> list:
+    """
+    record_filter plus the optional row filters shared by exports and
+    browsing; until is exclusive. deduplicated keeps one record (the
+    representative) per near-duplicate cluster.
+    """
+    conditions = [record_filter(session, dataset)]
+    if sentiment:
+        conditions.append(Record.sentiment == sentiment)
+    if emotion:
+        conditions.append(Record.emotion == emotion)
+    if min_confidence is not None:
+        conditions.append(col(Record.confidence) >= min_confidence)
+    if max_confidence is not None:
+        conditions.append(col(Record.confidence) <= max_confidence)
+    if since is not None:
+        conditions.append(col(Record.created_at) >= _naive_utc(since))
+    if until is not None:
+        conditions.append(col(Record.created_at) < _naive_utc(until))
+    if deduplicated:
+        conditions.append(col(Record.duplicate_of).is_(None))
+    return conditions
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # created_at is stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def data_version(dataset: Optional[str] = None) -> int:
+    """Current write counter of `dataset` (of all data if None) — see bump_data_version."""
+    with Session(engine) as session:
+        row = session.get(DataVersion, dataset or ALL_DATA)
+        return row.version if row else 0
+
+
+def bump_data_version(session, datasets: Optional[Iterable[str]] = None, rewritten: bool = False):
+    """
+    Advance the version of `datasets` (every dataset if None) and of all data,
+    inside the caller's transaction — the caller commits. `session` may be a
+    Session or a Connection. Pass rewritten=True when existing records were
+    updated in place rather than added or dropped.
+    """
+    if datasets is None:
+        # Datasets without a counter row yet (still at version 0) must move on too
+        datasets = [
+            *session.execute(select(Dataset.name).distinct()).scalars(),
+            *session.execute(select(DataVersion.name).where(DataVersion.name != REWRITTEN)).scalars(),
+        ]
+    for name in {*datasets, ALL_DATA, *([REWRITTEN] if rewritten else [])}:
+        session.execute(
+            sqlite_insert(DataVersion).values(name=name, version=1)
+            .on_conflict_do_update(index_elements=["name"], set_={"version": DataVersion.version + 1})
+        )
+
+
+def record_pages(
+    fields: list,
+    conditions: list,
+    after_id: int = 0,
+    page_size: int = 2000,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> Iterator[list]:
+    """
+    Yield rows of select(Record.id, *fields).where(*conditions) in keyset
+    pages (WHERE id > last ORDER BY id), each read in its own short session so
+    no read transaction stays open while the caller works through a page.
+    """
+    last_id = after_id
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Record.id, *fields)
+                .where(*conditions, col(Record.id) > last_id)
+                .order_by(col(Record.id))
+                .limit(page_size)
+            ).all()
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+        if check_cancelled:
+            check_cancelled()
+
+
+def insert_records(conn, rows: list[dict]) -> list[int]:
+    """
+    Insert Record rows (`conn` may be a Session or a Connection; the caller
+    commits), match them against the keyword groups and index their hashtags,
+    mentions and domains in the same transaction. Rows may carry a "cluster"
+    (services/dedup_service.py) that sets their duplicate_of. Returns the new
+    ids in row order.
+    """
+    from database.labels import LABEL_KINDS, ensure_labels
+    from services.dedup_service import insertable, link_clusters
+    from services.entity_service import index_entities
+    from services.keyword_service import tag_records
+    # A Core insert on the table: the ORM's bulk insert would split the batch
+    # wherever a row's set of None columns changes (duplicate_of mostly is)
+    table = Record.__table__
+    for kind in LABEL_KINDS:
+        ensure_labels(conn, kind, {row.get(kind) for row in rows})
+    ids = conn.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True), insertable(rows)
+    ).scalars().all()
+    link_clusters(conn, rows, ids)
+    tag_records(conn, zip(ids, (row["text"] for row in rows)))
+    index_entities(conn, zip(ids, rows))
+    return ids
+
+
+def ensure_partition(session: Session, name: str) -> str:
+    """Id of an active partition of `name` to append live rows to, creating one if needed."""
+    partition_id = session.exec(
+        select(Dataset.id)
+        .where(Dataset.name == name, Dataset.status == "active")
+        .order_by(col(Dataset.created_at).desc())
+    ).first()
+    if partition_id:
+        return partition_id
+    partition = Dataset(id=uuid.uuid4().hex, name=name, status="active", activated_at=datetime.utcnow())
+    session.add(partition)
+    session.commit()
+    return partition.id
+
+
+def create_partition(session: Session, name: str, filename: Optional[str] = None) -> str:
+    """Start a hidden partition for a load; see activate_partition."""
+    partition = Dataset(id=uuid.uuid4().hex, name=name, filename=filename)
+    partition_id = partition.id
+    session.add(partition)
+    session.commit()
+    return partition_id
+
+
+def activate_partition(session: Session, partition_id: str, mode: str, row_count: int):
+    """Make a loaded partition visible; with mode='replace' retire the dataset's other partitions."""
+    partition = session.get(Dataset, partition_id)
+    if mode == "replace":
+        session.exec(
+            update(Dataset)
+            .where(Dataset.name == partition.name, Dataset.id != partition_id, Dataset.status == "active")
+            .values(status="deleting")
+        )
+    partition.status = "active"
+    partition.row_count = row_count
+    partition.activated_at = datetime.utcnow()
+    session.add(partition)
+    bump_data_version(session, [partition.name])
+    session.commit()
+    if mode == "replace":
+        schedule_purge()
+
+
+def discard_partition(session: Session, partition_id: str):
+    """Abandon a partition (e.g. a failed load); its rows are purged in the background."""
+    session.exec(update(Dataset).where(Dataset.id == partition_id).values(status="deleting"))
+    session.commit()
+    schedule_purge()
+
+
+def drop_dataset(session: Session, name: str) -> int:
+    """Hide every partition of a dataset and schedule their rows for purging."""
+    dropped = session.exec(
+        update(Dataset).where(Dataset.name == name, Dataset.status != "deleting").values(status="deleting")
+    ).rowcount
+    if dropped:
+        bump_data_version(session, [name])
+    session.commit()
+    if dropped:
+        schedule_purge()
+        logger.info(f"[DATASETS] Dropped '{name}' ({dropped} partitions).")
+    return dropped
+
+
+def list_datasets(session: Session) -> list[dict]:
+    """Active datasets with their partition and (live) row counts."""
+    counts = dict(session.exec(
+        select(Record.dataset_id, func.count()).group_by(Record.dataset_id)
+    ).all())
+    datasets: dict[str, dict] = {}
+    for p in session.exec(select(Dataset).where(Dataset.status == "active").order_by(Dataset.name)).all():
+        d = datasets.setdefault(p.name, {
+            "name": p.name, "partitions": 0, "rows": 0, "created_at": p.created_at, "updated_at": None,
+        })
+        d["partitions"] += 1
+        d["rows"] += counts.get(p.id, 0)
+        d["created_at"] = min(d["created_at"], p.created_at)
+        if p.activated_at and (d["updated_at"] is None or p.activated_at > d["updated_at"]):
+            d["updated_at"] = p.activated_at
+    return list(datasets.values())
+
+
+def has_pending_purge() -> bool:
+    with Session(engine) as session:
+        return session.exec(select(Dataset.id).where(Dataset.status == "deleting")).first() is not None
+
+
+def schedule_purge():
+    """Queue a purge job unless one is already waiting (it will pick up every deleting partition)."""
+    from services.job_service import scheduler
+    with Session(engine) as session:
+        waiting = session.exec(
+            select(Job.id).where(Job.kind == "purge", Job.status == "queued")
+        ).first()
+    if not waiting:
+        scheduler.submit("purge", priority="low")
+
+
+def purge_deleted(check_cancelled=None) -> int:
+    """Delete rows of deleting partitions in short transactions, then the partitions themselves."""
+    purged = 0
+    with Session(engine) as session:
+        for partition_id in session.exec(select(Dataset.id).where(Dataset.status == "deleting")).all():
+            while True:
+                # Keyword matches and entity links first: the same subquery still selects the batch
+                for link_table in ("record_group", "record_entity"):
+                    session.exec(text(  # type: ignore[attr-defined]
+                        f"DELETE FROM {link_table} WHERE record_id IN "
+                        "(SELECT rowid FROM record WHERE dataset_id = :pid LIMIT :n)"
+                    ).bindparams(pid=partition_id, n=PURGE_BATCH_SIZE))
+                deleted = session.exec(text(  # type: ignore[attr-defined]
+                    "DELETE FROM record WHERE rowid IN "
+                    "(SELECT rowid FROM record WHERE dataset_id = :pid LIMIT :n)"
+                ).bindparams(pid=partition_id, n=PURGE_BATCH_SIZE)).rowcount
+                session.commit()
+                purged += deleted
+                if check_cancelled:
+                    check_cancelled()
+                if deleted < PURGE_BATCH_SIZE:
+                    break
+            session.exec(delete(EntityCount).where(EntityCount.dataset_id == partition_id))
+            # Statement (not ORM) delete: a concurrent purge may already have removed it
+            session.exec(delete(Dataset).where(Dataset.id == partition_id, Dataset.status == "deleting"))
+            session.commit()
+    if purged:
+        logger.info(f"[DATASETS] Purged {purged} rows of dropped partitions.")
+    return purged
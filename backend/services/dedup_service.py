@@ -0,0 +1,201 @@
+"""
+Dedup service — near-duplicate clustering (MinHash + LSH) of incoming records.
+
+Bot storms and lightly edited retweets arrive as many copies of one text. At
+ingest every record's clean_text is turned into a set of word shingles and a
+MinHash signature of DEDUP_NUM_PERM values; the signature is split into
+DEDUP_BANDS bands, and records sharing any band are candidates. A candidate
+whose estimated Jaccard similarity (share of equal signature values) reaches
+DEDUP_THRESHOLD joins that cluster.
+
+The first record of a cluster is its representative: it is analyzed as usual.
+Later members copy the representative's labels instead of running the NLP
+pipeline and store its id in Record.duplicate_of, so deduplicated reads
+(duplicate_of IS NULL) count each cluster once. Re-analysis runs classify the
+representatives and spread their labels to the members.
+
+Clusters never span partitions. A NearDuplicateIndex covers one partition (an
+upload, or the stream's partition) and keeps its DEDUP_WINDOW most recent
+clusters in memory; storms are bursts, so older clusters are let go. An index
+over a partition that already has rows (a resumed ingest, a restarted stream)
+is rebuilt from its representatives.
+"""
+import logging
+import os
+import zlib
+from collections import deque
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, col, select
+
+from database.db import engine
+from models.data_models import Record
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+# Shingles are the runs of 1..DEDUP_SHINGLE_WORDS words: single words tolerate edits,
+# pairs keep texts that merely share a vocabulary apart
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "2"))
+# Shorter texts (in cleaned words) are too generic to call near-duplicates
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "3"))
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "50000"))
+
+_ROWS = DEDUP_NUM_PERM // DEDUP_BANDS
+_BUCKET_CANDIDATES = 8
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures must agree across processes and restarts
+_rng = np.random.RandomState(48)
+_A = _rng.randint(1, 1 << 32, size=(DEDUP_NUM_PERM, 1), dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=(DEDUP_NUM_PERM, 1), dtype=np.uint64)
+
+
+class Cluster:
+    """
+    A near-duplicate cluster: its representative's signature and labels. `id`
+    is the representative's record id once it is written; until then
+    `founder` is the representative's pending row (see link_clusters).
+    """
+    __slots__ = ("id", "founder", "signature", "sentiment", "emotion", "confidence", "keys")
+
+    def __init__(self, signature, sentiment, emotion, confidence, record_id=None, founder=None):
+        self.id = record_id
+        self.founder = founder
+        self.signature = signature
+        self.sentiment = sentiment
+        self.emotion = emotion
+        self.confidence = confidence
+        self.keys: list[bytes] = []
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of the word shingles of `text`; None if it is too short to deduplicate."""
+    words = text.split()
+    if len(words) < DEDUP_MIN_WORDS:
+        return None
+    shingles = {
+        " ".join(words[i:i + n]) for n in range(1, DEDUP_SHINGLE_WORDS + 1) for i in range(len(words) - n + 1)
+    }
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # a·x + b stays below 2^64 for 32-bit a, b and x, so the universal hash is exact
+    return (((_A * hashes + _B) % _PRIME).min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH buckets over the recent clusters of one partition."""
+
+    def __init__(self, window: int = DEDUP_WINDOW):
+        self.window = window
+        self._buckets: dict[bytes, list[Cluster]] = {}
+        self._clusters: deque[Cluster] = deque()
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def match(self, sig: Optional[np.ndarray]) -> Optional[Cluster]:
+        """The most similar cluster at or above DEDUP_THRESHOLD, if any."""
+        if sig is None:
+            return None
+        candidates: dict[int, Cluster] = {}
+        for key in _band_keys(sig):
+            # Only the newest clusters of a crowded bucket: text that shares a band with
+            # thousands of others would otherwise be compared against all of them
+            for cluster in self._buckets.get(key, ())[-_BUCKET_CANDIDATES:]:
+                candidates[id(cluster)] = cluster
+        if not candidates:
+            return None
+        clusters = list(candidates.values())
+        scores = (np.stack([c.signature for c in clusters]) == sig).sum(axis=1)
+        best = int(scores.argmax())
+        return clusters[best] if scores[best] >= DEDUP_THRESHOLD * DEDUP_NUM_PERM else None
+
+    def add(self, sig: Optional[np.ndarray], sentiment, emotion, confidence, record_id=None, founder=None):
+        """Start a cluster represented by a newly analyzed record; None if `sig` is None."""
+        if sig is None:
+            return None
+        cluster = Cluster(sig, sentiment, emotion, confidence, record_id, founder)
+        cluster.keys = _band_keys(sig)
+        for key in cluster.keys:
+            self._buckets.setdefault(key, []).append(cluster)
+        self._clusters.append(cluster)
+        if len(self._clusters) > self.window:
+            self._evict(self._clusters.popleft())
+        return cluster
+
+    def _evict(self, cluster: Cluster):
+        for key in cluster.keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.remove(cluster)
+                if not bucket:
+                    del self._buckets[key]
+
+    @classmethod
+    def for_partition(cls, partition_id: str, window: int = DEDUP_WINDOW) -> "NearDuplicateIndex":
+        """An index over the most recent representatives already stored in `partition_id`."""
+        index = cls(window)
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Record.id, Record.clean_text, Record.sentiment, Record.emotion, Record.confidence)
+                .where(Record.dataset_id == partition_id, col(Record.duplicate_of).is_(None))
+                .order_by(col(Record.id).desc())
+                .limit(window)
+            ).all()
+        for record_id, clean, sentiment, emotion, confidence in reversed(rows):
+            index.add(signature(clean or ""), sentiment, emotion, confidence, record_id=record_id)
+        if rows:
+            logger.info(f"[DEDUP] Rebuilt the index of partition {partition_id} from {len(rows)} records.")
+        return index
+
+
+def _band_keys(sig: np.ndarray) -> list[bytes]:
+    return [bytes([band]) + sig[band * _ROWS:(band + 1) * _ROWS].tobytes() for band in range(DEDUP_BANDS)]
+
+
+def insertable(rows: list[dict]) -> list[dict]:
+    """
+    Record rows without their "cluster" entries (see link_clusters), all with
+    a duplicate_of so they insert as one batch: set for members of clusters
+    whose representative is already written.
+    """
+    out = []
+    for row in rows:
+        cluster = row.get("cluster")
+        out.append({
+            **{k: v for k, v in row.items() if k != "cluster"},
+            "duplicate_of": cluster.id if cluster is not None and cluster.founder is None else None,
+        })
+    return out
+
+
+def link_clusters(conn, rows: list[dict], ids: list[int]):
+    """
+    After inserting `rows` as `ids`: give the clusters founded in this batch
+    their representative's id, and point the members inserted along with it
+    at that id (in the caller's transaction).
+    """
+    founded: dict[Cluster, int] = {}
+    for row, record_id in zip(rows, ids):
+        cluster = row.get("cluster")
+        if cluster is not None and cluster.founder is row:
+            founded[cluster] = record_id
+    if not founded:
+        return
+    members = [
+        {"rid": record_id, "rep": founded[row["cluster"]]}
+        for row, record_id in zip(rows, ids)
+        if row.get("cluster") in founded and row["cluster"].founder is not row
+    ]
+    if members:
+        # On the table, not the model: ORM bulk updates want the primary key as the only criterion
+        table = Record.__table__
+        conn.execute(
+            update(table).where(table.c.id == bindparam("rid")).values(duplicate_of=bindparam("rep")), members
+        )
+    for cluster, record_id in founded.items():
+        cluster.id, cluster.founder = record_id, None
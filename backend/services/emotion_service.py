@@ -1,9 +1,14 @@
 """
 Emotion service — runs emotion detection on all DB records.
 """
+from typing import Callable, Optional
+
 from sqlmodel import Session, select
 
+from database.labels import ensure_labels
 from models.data_models import Record
+from services.columnar_service import invalidate_snapshots
+from services.dataset_service import bump_data_version, record_filter
 from utils.text_cleaner import clean_text as _clean
 
 try:
@@ -13,32 +18,61 @@ except ImportError:
         return "Joy"
 
 
-def run_emotion_analysis(session: Session) -> dict:
+def run_emotion_analysis(
+    session: Session,
+    progress_cb: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    dataset: Optional[str] = None,
+) -> dict:
     """
     Run emotion detection on all Records. Persists emotion label.
+    Near-duplicates (Record.duplicate_of) take their representative's label.
     """
-    records = session.exec(select(Record)).all()
+    records = session.exec(select(Record).where(record_filter(session, dataset)).order_by(Record.id)).all()
     if not records:
         return {"message": "No records. Upload, preprocess and run sentiment first.", "total": 0}
 
     emotion_counts: dict[str, int] = {}
     table = []
-    for record in records:
-        text = record.clean_text or _clean(record.text)
-        emotion = emotion_detector(text)
-        record.emotion = emotion
-        session.add(record)
-        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        if len(table) < 100:
-            table.append({
-                "id": record.id,
-                "text": record.text,
-                "sentiment": record.sentiment,
-                "emotion": emotion,
-                "confidence": record.confidence,
-            })
-
-    session.commit()
+    # representative id -> emotion
+    results: dict[int, str] = {}
+    datasets = [dataset] if dataset else None
+    try:
+        for i, record in enumerate(records):
+            if record.duplicate_of in results:
+                emotion = results[record.duplicate_of]
+            else:
+                text = record.clean_text or _clean(record.text)
+                emotion = emotion_detector(text)
+                if record.duplicate_of is None:
+                    results[record.id] = emotion
+            record.emotion = emotion
+            session.add(record)
+            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+            if len(table) < 100:
+                table.append({
+                    "id": record.id,
+                    "text": record.text,
+                    "sentiment": record.sentiment,
+                    "emotion": emotion,
+                    "confidence": record.confidence,
+                })
+
+            # Chunked commit + progress / cancellation checkpoint; the version is bumped per chunk
+            if (i + 1) % 500 == 0:
+                ensure_labels(session, "emotion", emotion_counts)
+                bump_data_version(session, datasets, rewritten=True)
+                session.commit()
+                if progress_cb:
+                    progress_cb(int((i + 1) * 100 / len(records)))
+                if check_cancelled:
+                    check_cancelled()
+
+        ensure_labels(session, "emotion", emotion_counts)
+        bump_data_version(session, datasets, rewritten=True)
+        session.commit()
+    finally:
+        invalidate_snapshots()
     return {"total": len(records), "emotion_counts": emotion_counts, "table": table}
 
 
@@ -0,0 +1,319 @@
+"""
+Entity service — hashtags, @mentions and URL domains pulled out of record text.
+
+clean_text drops them, so they are extracted from the raw text as records are
+inserted (dataset_service.insert_records, used by file ingest and the stream
+writer) into three side tables:
+  entity         – the normalized values (lower-cased, no leading #/@/www.)
+  record_entity  – which records mention which entity; label breakdowns join
+                   it to record, so they follow re-analysis
+  entity_count   – occurrences per entity, partition and ENTITY_BUCKET_SECONDS
+                   time bucket; top-k lists and timelines read only this
+
+Records inserted before the index existed are picked up by the
+"entity_reindex" job: ensure_entity_index() queues it at startup when the
+tables were just created over existing records, and POST /api/entities/rebuild
+runs it on demand.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import MetaData, Table, insert, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, col, delete, func, select
+
+from database.db import created_tables, engine
+from models.data_models import Dataset, Entity, EntityCount, Record, RecordEntity
+from services.dataset_service import _naive_utc, bump_data_version, record_conditions, record_pages
+
+logger = logging.getLogger(__name__)
+
+ENTITY_KINDS = ("hashtag", "mention", "domain")
+ENTITY_BUCKET_SECONDS = int(os.getenv("ENTITY_BUCKET_SECONDS", "3600"))
+# How many of the most frequent entities a sentiment-sorted top-k ranks
+ENTITY_CANDIDATES = int(os.getenv("ENTITY_CANDIDATES", "500"))
+REINDEX_PAGE_SIZE = 5000
+_REINDEX_FIELDS = [Record.text, Record.dataset_id, Record.created_at]
+
+# A hashtag needs at least one non-digit ("#2024" is not one); a handle is at most 15 characters
+_HASHTAG = re.compile(r"(?<![\w&#])#(\w*[^\W\d]\w*)")
+_MENTION = re.compile(r"(?<![\w@])@(\w{1,15})\b")
+_DOMAIN = re.compile(r"(?:\bhttps?://|(?<![\w.])www\.)([\w.-]+\.[a-z]{2,})", re.IGNORECASE)
+_SENTIMENTS = ("Positive", "Neutral", "Negative")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def ensure_entity_index():
+    """Queue an "entity_reindex" job if the index tables are new and there are records they don't cover yet."""
+    if RecordEntity.__tablename__ not in created_tables:
+        return
+    with Session(engine) as session:
+        if session.exec(select(Record.id).limit(1)).first() is None:
+            return
+    from services.job_service import scheduler
+    scheduler.submit("entity_reindex", priority="low")
+    logger.info("[ENTITIES] Created the entity index; indexing existing records in the background.")
+
+
+def extract_entities(text: str) -> set[tuple[str, str]]:
+    """(kind, value) pairs of the hashtags, mentions and URL domains in `text`."""
+    if not text:
+        return set()
+    found = {("hashtag", m.lower()) for m in _HASHTAG.findall(text)}
+    found.update(("mention", m.lower()) for m in _MENTION.findall(text))
+    for domain in _DOMAIN.findall(text):
+        domain = domain.lower().rstrip(".")
+        found.add(("domain", domain[4:] if domain.startswith("www.") else domain))
+    return found
+
+
+def bucket_of(ts: datetime) -> datetime:
+    """Start of the ENTITY_BUCKET_SECONDS bucket holding `ts`, as naive UTC like created_at."""
+    seconds = int((_naive_utc(ts) - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % ENTITY_BUCKET_SECONDS)
+
+
+# ── Indexing ──────────────────────────────────────────────────────────────────
+
+def index_entities(
+    conn,
+    rows: Iterable[tuple[int, dict]],
+    link_table: Table = RecordEntity.__table__,
+    count_table: Table = EntityCount.__table__,
+):
+    """
+    Index (record id, record row) pairs inside the caller's transaction. The
+    rows need text, dataset_id and created_at. `link_table` and `count_table`
+    are the record_entity and entity_count tables to write to
+    (rebuild_entity_index passes its shadow copies).
+    """
+    links: list[tuple[int, tuple[str, str]]] = []
+    counts: Counter = Counter()
+    for record_id, row in rows:
+        entities = extract_entities(row["text"])
+        if not entities:
+            continue
+        bucket = bucket_of(row.get("created_at") or datetime.utcnow())
+        for entity in entities:
+            links.append((record_id, entity))
+            counts[(entity, row["dataset_id"], bucket)] += 1
+    if not links:
+        return
+
+    ids = _entity_ids(conn, {entity for _, entity in links})
+    conn.execute(
+        sqlite_insert(link_table).on_conflict_do_nothing(),
+        [{"entity_id": ids[entity], "record_id": record_id} for record_id, entity in links],
+    )
+    upsert = sqlite_insert(count_table)
+    conn.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["entity_id", "dataset_id", "bucket"],
+            set_={"count": count_table.c.count + upsert.excluded.count},
+        ),
+        [
+            {"entity_id": ids[entity], "dataset_id": dataset_id, "bucket": bucket, "kind": entity[0], "count": n}
+            for (entity, dataset_id, bucket), n in counts.items()
+        ],
+    )
+
+
+def _entity_ids(conn, entities: set[tuple[str, str]]) -> dict[tuple[str, str], int]:
+    """Ids of `entities`, creating the ones not seen before."""
+    entities = list(entities)
+    conn.execute(sqlite_insert(Entity).on_conflict_do_nothing(), [{"kind": k, "value": v} for k, v in entities])
+    ids = {}
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(entities), 400):
+        chunk = entities[start:start + 400]
+        for entity_id, kind, value in conn.execute(
+            select(Entity.id, Entity.kind, Entity.value).where(tuple_(Entity.kind, Entity.value).in_(chunk))
+        ).all():
+            ids[(kind, value)] = entity_id
+    return ids
+
+
+def rebuild_entity_index(
+    progress_cb: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> int:
+    """
+    Re-extract the entities of every record in keyset pages into shadow
+    copies of record_entity and entity_count, then swap them in with one
+    transaction: queries read the complete old index until that commits, and
+    a cancelled or failed rebuild leaves it as it was. Records inserted
+    meanwhile (indexed by their writer into the live tables) are caught up
+    inside the swap, under the write lock, so none is lost or counted twice.
+    """
+    link_table, count_table = _shadow_table(RecordEntity.__table__), _shadow_table(EntityCount.__table__)
+    try:
+        with Session(engine) as session:
+            max_id = session.exec(select(func.max(Record.id))).one() or 0
+        indexed, last_id = 0, 0
+        for rows in record_pages(_REINDEX_FIELDS, [], 0, REINDEX_PAGE_SIZE, check_cancelled):
+            with engine.begin() as conn:
+                index_entities(conn, _reindex_rows(rows), link_table, count_table)
+            indexed, last_id = indexed + len(rows), rows[-1][0]
+            if progress_cb and max_id:
+                progress_cb(min(99, int(last_id * 100 / max_id)))
+
+        with engine.begin() as conn:
+            # The first write takes the write lock: no record can be inserted (or purged) until the commit
+            conn.execute(delete(RecordEntity))
+            conn.execute(delete(EntityCount))
+            rows = conn.execute(select(Record.id, *_REINDEX_FIELDS).where(col(Record.id) > last_id)).all()
+            index_entities(conn, _reindex_rows(rows), link_table, count_table)
+            indexed += len(rows)
+            # Records and partitions purged while the rebuild ran keep no links or counts
+            conn.execute(insert(RecordEntity).from_select(
+                ["entity_id", "record_id"],
+                select(link_table.c.entity_id, link_table.c.record_id)
+                .where(link_table.c.record_id.in_(select(Record.id))),
+            ))
+            columns = ["entity_id", "dataset_id", "bucket", "kind", "count"]
+            conn.execute(insert(EntityCount).from_select(
+                columns,
+                select(*(count_table.c[c] for c in columns)).where(count_table.c.dataset_id.in_(select(Dataset.id))),
+            ))
+            bump_data_version(conn)
+    finally:
+        link_table.drop(engine, checkfirst=True)
+        count_table.drop(engine, checkfirst=True)
+    logger.info(f"[ENTITIES] Re-indexed entities of {indexed} records.")
+    return indexed
+
+
+def _reindex_rows(rows) -> Iterable[tuple[int, dict]]:
+    return ((r[0], {"text": r[1], "dataset_id": r[2], "created_at": r[3]}) for r in rows)
+
+
+def _shadow_table(table: Table) -> Table:
+    """An empty copy of `table` (same columns and primary key) to rebuild into."""
+    shadow = Table(f"{table.name}_rebuild", MetaData(), *(c._copy() for c in table.columns))
+    # Left over by a rebuild whose process died
+    shadow.drop(engine, checkfirst=True)
+    shadow.create(engine)
+    return shadow
+
+
+# ── Queries ───────────────────────────────────────────────────────────────────
+
+def top_entities(
+    session: Session,
+    kind: str,
+    dataset: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    sort: str = "count",
+    min_count: int = 1,
+) -> dict:
+    """
+    The `limit` most frequent entities of `kind` (sort="count"), or the most
+    negative / positive ones by share of labeled mentions, among the
+    ENTITY_CANDIDATES most frequent with at least `min_count` mentions. Each
+    comes with its sentiment breakdown. `since` / `until` apply at bucket
+    granularity for the counts.
+    """
+    if kind not in ENTITY_KINDS:
+        raise ValueError(f"kind must be one of {list(ENTITY_KINDS)}.")
+    if sort not in ("count", "negative", "positive"):
+        raise ValueError("sort must be 'count', 'negative' or 'positive'.")
+    total = func.sum(EntityCount.count).label("total")
+    query = (
+        select(EntityCount.entity_id, total)
+        .where(EntityCount.kind == kind, *_count_conditions(session, dataset, since, until))
+        .group_by(EntityCount.entity_id)
+        .having(total >= min_count)
+        .order_by(total.desc())
+        .limit(limit if sort == "count" else ENTITY_CANDIDATES)
+    )
+    counts = dict(session.exec(query).all())
+    if not counts:
+        return {"kind": kind, "sort": sort, "entities": []}
+
+    breakdown = _sentiment_breakdown(session, list(counts), dataset, since, until)
+    values = dict(session.exec(select(Entity.id, Entity.value).where(col(Entity.id).in_(list(counts)))).all())
+    entities = []
+    for entity_id, n in counts.items():
+        sentiment = breakdown.get(entity_id, dict.fromkeys(_SENTIMENTS, 0))
+        labeled = sum(sentiment.values())
+        entities.append({
+            "value": values[entity_id],
+            "count": n,
+            "sentiment": sentiment,
+            "negative_share": round(sentiment["Negative"] / labeled, 4) if labeled else None,
+            "positive_share": round(sentiment["Positive"] / labeled, 4) if labeled else None,
+        })
+    if sort != "count":
+        key = f"{sort}_share"
+        entities.sort(key=lambda e: (e[key] is not None, e[key] or 0, e["count"]), reverse=True)
+    return {"kind": kind, "sort": sort, "entities": entities[:limit]}
+
+
+def entity_detail(
+    session: Session,
+    kind: str,
+    value: str,
+    dataset: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Optional[dict]:
+    """Sentiment / emotion breakdown and per-bucket timeline of one entity; None if never seen."""
+    value = value.lower().lstrip("#@")
+    entity_id = session.exec(select(Entity.id).where(Entity.kind == kind, Entity.value == value)).first()
+    if entity_id is None:
+        return None
+    timeline = session.exec(
+        select(EntityCount.bucket, func.sum(EntityCount.count))
+        .where(EntityCount.entity_id == entity_id, *_count_conditions(session, dataset, since, until))
+        .group_by(EntityCount.bucket)
+        .order_by(EntityCount.bucket)
+    ).all()
+    mentions = (
+        select(Record.emotion, func.count(), func.avg(Record.confidence, type_=Record.confidence.type))
+        .join(RecordEntity, col(RecordEntity.record_id) == Record.id)
+        .where(RecordEntity.entity_id == entity_id, *record_conditions(session, dataset, since=since, until=until))
+    )
+    emotions = session.exec(mentions.group_by(Record.emotion)).all()
+    return {
+        "kind": kind,
+        "value": value,
+        "count": sum(n for _, n in timeline),
+        "sentiment": _sentiment_breakdown(session, [entity_id], dataset, since, until).get(
+            entity_id, dict.fromkeys(_SENTIMENTS, 0)
+        ),
+        "emotion": {e: n for e, n, _ in sorted(emotions, key=lambda r: -r[1]) if e},
+        "timeline": [{"bucket": b, "count": n} for b, n in timeline],
+    }
+
+
+def _count_conditions(session: Session, dataset, since, until) -> list:
+    """Restrict entity_count to visible partitions (of `dataset`) and the buckets overlapping since..until."""
+    partitions = select(Dataset.id).where(Dataset.status == "active")
+    if dataset:
+        partitions = partitions.where(Dataset.name == dataset)
+    conditions = [col(EntityCount.dataset_id).in_(partitions)]
+    if since is not None:
+        conditions.append(col(EntityCount.bucket) >= bucket_of(since))
+    if until is not None:
+        conditions.append(col(EntityCount.bucket) < until.replace(tzinfo=None))
+    return conditions
+
+
+def _sentiment_breakdown(session: Session, entity_ids: list[int], dataset, since, until) -> dict[int, dict]:
+    """entity id -> sentiment label counts of its mentions, from the current record labels."""
+    out: dict[int, dict] = {}
+    for entity_id, label, n in session.exec(
+        select(RecordEntity.entity_id, Record.sentiment, func.count())
+        .join(Record, col(Record.id) == RecordEntity.record_id)
+        .where(col(RecordEntity.entity_id).in_(entity_ids), *record_conditions(session, dataset, since=since, until=until))
+        .group_by(RecordEntity.entity_id, Record.sentiment)
+    ).all():
+        if label in _SENTIMENTS:
+            out.setdefault(entity_id, dict.fromkeys(_SENTIMENTS, 0))[label] = n
+    return out
@@ -1,15 +1,30 @@
 """
-File service — CSV/XLSX ingestion, NLP analysis, and DB persistence.
+File service — CSV/NDJSON/XLSX (plain, compressed or zipped) ingestion, NLP analysis, and DB persistence.
 Uses a progress_cb callback so background jobs can update a progress counter.
+Ingest is checkpointed per batch and published atomically as a dataset partition.
 """
+import bz2
+import gzip
+import hashlib
 import io
+import itertools
+import json
+import os
+import re
+import uuid
+import zipfile
 from datetime import datetime
-from typing import Callable, List, Optional
+from typing import BinaryIO, Callable, Iterator, List, Optional, Union
 
+import openpyxl
 import pandas as pd
-from sqlmodel import Session, text
+from sqlmodel import Session
 
-from models.data_models import Record
+from models.data_models import IngestCheckpoint
+from services.dataset_service import (
+    DEFAULT_DATASET, MODES, activate_partition, create_partition, discard_partition, insert_records,
+)
+from services.dedup_service import DEDUP_ENABLED, NearDuplicateIndex, signature as minhash
 from utils.text_cleaner import clean_text as _clean
 
 try:
@@ -23,124 +38,524 @@ except ImportError:
         return t.split()
 
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# Parsed front to back, so they can be read while still arriving
+LINE_EXTENSIONS = (".csv", ".tsv", ".ndjson", ".jsonl", ".json")
+TABULAR_EXTENSIONS = LINE_EXTENSIONS + (".xlsx", ".xls")
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".zst": "zstd", ".zstd": "zstd"}
+# Rows of the first chunk sampled to find the text column
+TEXT_DETECT_SAMPLE = int(os.getenv("TEXT_DETECT_SAMPLE", "1000"))
+_TEXT_NAMES = ("text", "tweet", "content", "review", "comment", "body", "message")
+_SOCIAL = re.compile(r"https?://|(?:^|\s)[@#]\w")
+
+UNSUPPORTED_FORMAT = "Unsupported format. Please upload CSV, TSV, NDJSON or XLSX (optionally gzip/bz2/zstd/zip)."
+_MAGIC = [(b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\x28\xb5\x2f\xfd", "zstd")]
+
+
 def ingest_file(
-    content: bytes,
+    source: Union[bytes, BinaryIO],
     filename: str,
     session: Session,
-    progress_cb: Optional[Callable[[int], None]] = None,
+    progress_cb: Optional[Callable[..., None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    job_id: Optional[str] = None,
+    dataset: str = DEFAULT_DATASET,
+    mode: str = "replace",
+    file_hash: Optional[str] = None,
+    size: Optional[int] = None,
+    sheet: Optional[str] = None,
+    text_column: Optional[str] = None,
 ) -> dict:
     """
-    Validate, parse, NLP-analyze, and persist an uploaded CSV/XLSX file.
+    Validate, parse, NLP-analyze, and persist an uploaded file: CSV, TSV,
+    NDJSON or Excel, optionally gzip / bz2 / zstd compressed, or a ZIP of those.
+
+    `source` is the file's bytes or a binary file object; line formats are
+    parsed in chunks and decompressed on the fly, so a file object is never
+    loaded whole (it may even still be
+    growing — see upload_service.GrowingUpload). File objects need a
+    `file_hash` identifying their content, and `size` for byte-based progress.
+    `sheet` selects an Excel worksheet by name or 0-based index (default: the
+    first); .xlsx sheets are streamed row by row as well. The text column is
+    detected from a sample of the first chunk unless `text_column` names it.
 
-    progress_cb is called with integers 0-100 as processing advances.
+    Rows are written to a new, not yet visible partition of `dataset` in
+    batches of INGEST_BATCH_SIZE, each committed together with an
+    IngestCheckpoint. Calling again with the same job_id and file resumes
+    after the last committed batch. At the end the partition is activated in
+    one transaction — appended to the dataset, or replacing its previous
+    partitions (mode="replace") — so readers never see a half-loaded file.
+    That transaction also stores the summary on the checkpoint, and calling
+    again once it has committed returns it without reading the file.
+
+    progress_cb is called with integers 0-100 as processing advances, plus
+    rows_done / rows_total (estimated from bytes consumed) / stage keywords
+    (parsing → analyzing → finalizing).
+    check_cancelled is called between chunks and raises to abort the job.
+    Near-duplicates of earlier rows of the partition (dedup_service) skip the
+    NLP pipeline and take their representative's labels.
     Returns a rich summary dict with distribution counts and a row preview.
     """
+    if isinstance(source, (bytes, bytearray)):
+        file_hash = file_hash or hashlib.sha256(source).hexdigest()
+        size = len(source)
+        source = io.BytesIO(source)
+    elif file_hash is None:
+        raise ValueError("file_hash is required when ingesting from a file object.")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {list(MODES)}.")
+    if job_id:
+        done = finished_ingest(session, job_id)
+        if done is not None:
+            print(f"[UPLOAD] '{filename}' was already loaded by job {job_id}.")
+            return done
+
     # ── Parse ─────────────────────────────────────────────────────────────────
-    if filename.lower().endswith(".csv"):
-        df = pd.read_csv(io.BytesIO(content), encoding="utf-8", on_bad_lines="skip")
-    elif filename.lower().endswith((".xlsx", ".xls")):
-        df = pd.read_excel(io.BytesIO(content))
+    if progress_cb:
+        progress_cb(0, stage="parsing")
+    # (text column, confidence) per file / archive member, picked on its first chunk
+    text_columns: dict[str, tuple[str, float]] = {}
+    texts = _iter_texts(_read_frames(source, filename, sheet), text_columns, text_column)
+    first = next(texts, None)
+    if first is None:
+        raise ValueError("The uploaded file contains no rows.")
+    texts = itertools.chain([first], texts)
+
+    # ── Resume or start a partition load ───────────────────────────────────────
+    checkpoint = _open_checkpoint(session, job_id or uuid.uuid4().hex, file_hash, dataset, filename)
+    partition_id = checkpoint.partition_id
+    state = json.loads(checkpoint.state or "{}")
+    sentiment_counts: dict[str, int] = state.get("sentiment", {"Positive": 0, "Negative": 0, "Neutral": 0})
+    emotion_counts: dict[str, int] = state.get("emotion", {})
+    preview: list[dict] = state.get("preview", [])
+    error_rows: int = state.get("error_rows", 0)
+    inserted: int = state.get("inserted", 0)
+    duplicates: int = state.get("duplicates", 0)
+    start = checkpoint.rows_done
+    # A resumed load also matches against the representatives it already wrote
+    near_duplicates = NearDuplicateIndex.for_partition(partition_id) if DEDUP_ENABLED else None
+
+    if start:
+        print(f"[UPLOAD] Resuming '{filename}' at row {start} (batch {checkpoint.batches}).")
     else:
-        raise ValueError("Unsupported format. Please upload CSV or XLSX.")
+        print(f"[UPLOAD] Starting analysis of '{filename}'...")
 
-    text_col = _detect_text_column(df)
-    df["_text"] = df[text_col].astype(str).str.strip()
+    def report(rows_done: int, stage: str = "analyzing"):
+        consumed = _position(source)
+        if size and consumed:
+            fraction = min(1.0, consumed / size)
+            rows_total = max(rows_done, int(rows_done / fraction)) if fraction else None
+        else:
+            fraction, rows_total = 0.0, None
+        progress_cb(min(95, 5 + int(fraction * 90)), rows_done=rows_done, rows_total=rows_total, stage=stage)
 
-    # ── Clear old data ─────────────────────────────────────────────────────────
-    session.exec(text("DELETE FROM record"))  # type: ignore[attr-defined]
-    session.commit()
     if progress_cb:
-        progress_cb(5)  # 5% — parsed + cleared
+        report(start)
 
     # ── Analyze each row ───────────────────────────────────────────────────────
-    sentiment_counts: dict[str, int] = {"Positive": 0, "Negative": 0, "Neutral": 0}
-    emotion_counts: dict[str, int] = {}
-    preview: list[dict] = []
-    error_rows = 0
-    total_rows = len(df)
-
-    print(f"[UPLOAD] Starting analysis of {total_rows} rows from '{filename}'...")
-
-    for i, (_, row) in enumerate(df.iterrows()):
-        raw = row["_text"]
+    batch: list[dict] = []
+    rows_done = 0
+    for i, raw in enumerate(texts):
+        rows_done = i + 1
+        if i < start:
+            continue  # committed before the interruption
         if not raw or raw.lower() in ("nan", "none", ""):
             error_rows += 1
-            continue
-
-        cleaned = ""
-        try:
-            cleaned = _clean(raw)
-            tokens = tokenization(raw)
-            sentiment, confidence = sentiment_classifier(cleaned or raw)
-            emotion = emotion_detector(raw, tokens=tokens)
-        except Exception as e:
-            print(f"[ERROR] Row {i} analysis failed: {e}")
-            sentiment, confidence, emotion = "Neutral", 0.5, "Neutral"
-            error_rows += 1
-
-        record = Record(
-            text=raw,
-            clean_text=cleaned,
-            sentiment=sentiment,
-            emotion=emotion,
-            confidence=round(float(confidence), 4),
-            created_at=datetime.utcnow(),
-        )
-        session.add(record)
+        else:
+            cleaned, signature, cluster = "", None, None
+            try:
+                cleaned = _clean(raw)
+                if near_duplicates is not None:
+                    signature = minhash(cleaned)
+                    cluster = near_duplicates.match(signature)
+                if cluster is not None:
+                    # A near-duplicate takes its representative's labels
+                    sentiment, confidence, emotion = cluster.sentiment, cluster.confidence, cluster.emotion
+                    duplicates += 1
+                else:
+                    tokens = tokenization(raw)
+                    sentiment, confidence = sentiment_classifier(cleaned or raw)
+                    emotion = emotion_detector(raw, tokens=tokens)
+            except Exception as e:
+                print(f"[ERROR] Row {i} analysis failed: {e}")
+                sentiment, confidence, emotion = "Neutral", 0.5, "Neutral"
+                signature = None
+                error_rows += 1
 
-        sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
-        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-
-        if len(preview) < 50:
-            preview.append({
-                "text": raw[:120],
-                "clean_text": cleaned[:120],
+            inserted += 1
+            row = {
+                "dataset_id": partition_id,
+                "text": raw,
+                "clean_text": cleaned,
                 "sentiment": sentiment,
                 "emotion": emotion,
                 "confidence": round(float(confidence), 4),
-            })
+                "created_at": datetime.utcnow(),
+            }
+            if cluster is None and signature is not None:
+                cluster = near_duplicates.add(signature, sentiment, emotion, row["confidence"], founder=row)
+            row["cluster"] = cluster
+            batch.append(row)
 
-        # Chunked commit + progress
-        if (i + 1) % 500 == 0:
-            session.commit()
-            pct = min(95, 5 + int(((i + 1) / total_rows) * 90))
-            if progress_cb:
-                progress_cb(pct)
-            print(f"[UPLOAD] {i + 1}/{total_rows} rows processed ({pct}%)...")
+            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
+            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
 
-    session.commit()
-    if progress_cb:
-        progress_cb(100)
-    print(f"[UPLOAD] Done — {total_rows} rows analyzed.")
+            if len(preview) < 50:
+                preview.append({
+                    "text": raw[:120],
+                    "clean_text": cleaned[:120],
+                    "sentiment": sentiment,
+                    "emotion": emotion,
+                    "confidence": round(float(confidence), 4),
+                })
 
+        # Progress is cheap to report (the job context throttles it); commits are chunked
+        if progress_cb and rows_done % 100 == 0:
+            report(rows_done)
+        if rows_done % INGEST_BATCH_SIZE == 0:
+            _commit_batch(session, batch, checkpoint, rows_done, {
+                "sentiment": sentiment_counts,
+                "emotion": emotion_counts,
+                "preview": preview,
+                "error_rows": error_rows,
+                "inserted": inserted,
+                "duplicates": duplicates,
+            })
+            batch = []
+            if check_cancelled:
+                check_cancelled()
+            print(f"[UPLOAD] {rows_done} rows processed...")
+
+    # ── Publish the partition ──────────────────────────────────────────────────
+    total_rows = max(rows_done, start)
+    if progress_cb:
+        progress_cb(96, rows_done=total_rows, rows_total=total_rows, stage="finalizing")
     total_analyzed = sum(sentiment_counts.values())
     dominant_emotion = (
         max(emotion_counts, key=emotion_counts.get) if emotion_counts else "N/A"
     )
-
-    return {
+    summary = {
         "status": "Analyzed & Stored",
         "filename": filename,
+        "dataset": dataset,
+        "mode": mode,
         "total_rows": total_rows,
         "analyzed": total_analyzed,
         "error_rows": error_rows,
-        "text_column_detected": text_col,
-        "file_size_kb": round(len(content) / 1024, 2),
+        "near_duplicates": duplicates,
+        "text_column_detected": ", ".join(dict.fromkeys(c for c, _ in text_columns.values())),
+        "text_column_confidence": min(conf for _, conf in text_columns.values()),
+        "file_size_kb": round((size or _position(source) or 0) / 1024, 2),
         "sentiment_distribution": sentiment_counts,
         "emotion_distribution": emotion_counts,
         "dominant_emotion": dominant_emotion,
         "preview": preview,
     }
 
+    if batch:
+        insert_records(session, batch)
+    if job_id:
+        # The checkpoint keeps the result (until the job is evicted): a job interrupted
+        # after this commit returns it instead of loading the file a second time
+        checkpoint.state = json.dumps({"result": summary})
+        checkpoint.updated_at = datetime.utcnow()
+        session.add(checkpoint)
+    else:
+        session.delete(checkpoint)
+    activate_partition(session, partition_id, mode, inserted)
+    if progress_cb:
+        progress_cb(100, rows_done=total_rows, rows_total=total_rows)
+    print(f"[UPLOAD] Done — {total_rows} rows analyzed.")
+    return summary
+
+
+def finished_ingest(session: Session, job_id: str) -> Optional[dict]:
+    """The result of an ingest whose partition was already activated, or None if it has not finished."""
+    checkpoint = session.get(IngestCheckpoint, job_id)
+    if not checkpoint or not checkpoint.state:
+        return None
+    return json.loads(checkpoint.state).get("result")
+
+
+def discard_ingest(session: Session, job_id: str):
+    """Abandon an ingest that will not be resumed: drop its checkpoint and partition."""
+    checkpoint = session.get(IngestCheckpoint, job_id)
+    if not checkpoint or finished_ingest(session, job_id) is not None:
+        return
+    partition_id = checkpoint.partition_id
+    session.delete(checkpoint)
+    session.commit()
+    discard_partition(session, partition_id)
+
+
+def _open_checkpoint(
+    session: Session, job_id: str, file_hash: str, dataset: str, filename: str
+) -> IngestCheckpoint:
+    """Return the checkpoint to continue from, starting a fresh partition if none matches."""
+    checkpoint = session.get(IngestCheckpoint, job_id)
+    if checkpoint and checkpoint.file_hash == file_hash:
+        return checkpoint
+    if checkpoint:
+        # A different file under the same job — start over
+        discard_ingest(session, job_id)
+    checkpoint = IngestCheckpoint(
+        job_id=job_id,
+        file_hash=file_hash,
+        partition_id=create_partition(session, dataset, filename),
+    )
+    session.add(checkpoint)
+    session.commit()
+    session.refresh(checkpoint)
+    return checkpoint
+
+
+def _commit_batch(session: Session, rows: list[dict], checkpoint: IngestCheckpoint, rows_done: int, state: dict):
+    """Append a batch to the partition and advance the checkpoint in the same transaction."""
+    if rows:
+        insert_records(session, rows)
+    checkpoint.rows_done = rows_done
+    checkpoint.state = json.dumps(state)
+    checkpoint.batches += 1
+    checkpoint.updated_at = datetime.utcnow()
+    session.add(checkpoint)
+    session.commit()
+
+
+def is_supported(filename: str) -> bool:
+    """True if ingest_file can read this file (optionally compressed / zipped)."""
+    inner, _ = _split_compression(filename.lower())
+    return inner.endswith(TABULAR_EXTENSIONS + (".zip",))
+
+
+def is_streamable(filename: str) -> bool:
+    """True if the file can be parsed front to back while it is still arriving."""
+    inner, _ = _split_compression(filename.lower())
+    return inner.endswith(LINE_EXTENSIONS)
+
+
+def _split_compression(name: str) -> tuple[str, Optional[str]]:
+    """("tweets.csv.gz") → ("tweets.csv", "gzip")."""
+    root, ext = os.path.splitext(name)
+    codec = COMPRESSION_SUFFIXES.get(ext.lower())
+    return (root, codec) if codec else (name, None)
+
+
+def _decompress(stream: BinaryIO, codec: str) -> BinaryIO:
+    """Wrap a stream in a streaming decompressor — nothing is inflated to disk or memory in full."""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if codec == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+    if zstandard is None:
+        raise ValueError("zstd files need the 'zstandard' package on the server.")
+    return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+
+
+def _read_frames(source: BinaryIO, filename: str, sheet: Optional[str] = None) -> Iterator[tuple[str, pd.DataFrame]]:
+    """
+    Yield (member, DataFrame) chunks of the file in INGEST_BATCH_SIZE-row
+    chunks (legacy .xls whole); `sheet` picks the Excel worksheet. gzip /
+    bz2 / zstd are detected by suffix or magic bytes and decompressed on the
+    fly; each CSV / NDJSON / Excel member of a ZIP archive is read in turn.
+    """
+    stream = source if hasattr(source, "peek") else io.BufferedReader(source)
+    inner, codec = _split_compression(filename)
+    if codec is None and not inner.lower().endswith((".xlsx", ".zip")):
+        head = stream.peek(4)[:4]
+        codec = next((c for magic, c in _MAGIC if head.startswith(magic)), None)
+    if codec:
+        stream = _decompress(stream, codec)
+    if inner.lower().endswith(".zip"):
+        yield from _zip_frames(stream, inner, sheet)
+    else:
+        yield from ((inner, df) for df in _parse(stream, inner, sheet))
+
+
+def _zip_frames(stream: BinaryIO, name: str, sheet: Optional[str] = None) -> Iterator[tuple[str, pd.DataFrame]]:
+    if not stream.seekable():
+        raise ValueError("ZIP archives can only be analyzed once fully uploaded.")
+    with zipfile.ZipFile(stream) as archive:
+        members = [
+            m for m in archive.infolist()
+            if not m.is_dir()
+            and not os.path.basename(m.filename).startswith((".", "__MACOSX"))
+            and m.filename.lower().endswith(TABULAR_EXTENSIONS)
+        ]
+        if not members:
+            raise ValueError("The ZIP archive contains no CSV, NDJSON or Excel files.")
+        for member in members:
+            with archive.open(member) as f:
+                for df in _parse(f, member.filename, sheet):
+                    yield f"{name}/{member.filename}", df
+
+
+def _parse(stream: BinaryIO, name: str, sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    lowered = name.lower()
+    if lowered.endswith((".csv", ".tsv")):
+        yield from pd.read_csv(
+            stream, sep="\t" if lowered.endswith(".tsv") else ",",
+            encoding="utf-8", on_bad_lines="skip", chunksize=INGEST_BATCH_SIZE,
+        )
+    elif lowered.endswith((".ndjson", ".jsonl", ".json")):
+        yield from _ndjson_frames(stream)
+    elif lowered.endswith(".xlsx"):
+        yield from _xlsx_frames(stream, sheet)
+    elif lowered.endswith(".xls"):
+        # Legacy BIFF workbooks (≤ 65,536 rows) have no streaming reader
+        yield pd.read_excel(stream, sheet_name=_sheet_key(sheet))
+    else:
+        raise ValueError(UNSUPPORTED_FORMAT)
+
+
+def _xlsx_frames(stream: BinaryIO, sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream one worksheet in INGEST_BATCH_SIZE-row chunks with openpyxl's
+    read-only, values-only iterator, so memory stays flat however many rows
+    the sheet has. The first non-empty row is the header.
+    """
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = _pick_sheet(workbook, sheet).iter_rows(values_only=True)
+        header = next((r for r in rows if any(v is not None for v in r)), None)
+        if header is None:
+            return
+        columns = [str(v) if v is not None else f"Unnamed: {i}" for i, v in enumerate(header)]
+        width = len(columns)
+        batch: list[tuple] = []
+        for row in rows:
+            if any(v is not None for v in row):
+                batch.append(row[:width])
+            if len(batch) >= INGEST_BATCH_SIZE:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _pick_sheet(workbook, sheet: Optional[str]):
+    """Worksheet by name, or by 0-based position for an all-digit `sheet`; the first one by default."""
+    if sheet is None:
+        return workbook.worksheets[0]
+    if sheet in workbook.sheetnames:
+        return workbook[sheet]
+    if sheet.isdigit() and int(sheet) < len(workbook.worksheets):
+        return workbook.worksheets[int(sheet)]
+    raise ValueError(f"Sheet '{sheet}' not found. Available sheets: {', '.join(workbook.sheetnames)}.")
+
+
+def _sheet_key(sheet: Optional[str]) -> Union[str, int]:
+    if sheet is None:
+        return 0
+    return int(sheet) if sheet.isdigit() else sheet
+
+
+def _ndjson_frames(stream: BinaryIO) -> Iterator[pd.DataFrame]:
+    """
+    One JSON object per line (Twitter API exports). Nested objects are
+    flattened one level, so {"data": {"text": …}} becomes a "data.text" column.
+    Malformed lines are skipped, like bad CSV lines.
+    """
+    lines = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    try:
+        batch: list[dict] = []
+        for n, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            if n == 0 and line.startswith("["):
+                raise ValueError("JSON arrays are not supported; upload NDJSON (one object per line).")
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(obj, dict):
+                batch.append(obj)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                yield pd.json_normalize(batch, max_level=1)
+                batch = []
+        if batch:
+            yield pd.json_normalize(batch, max_level=1)
+    finally:
+        # Don't let the wrapper close the underlying stream when it is collected
+        lines.detach()
+
+
+def _iter_texts(
+    frames: Iterator[tuple[str, pd.DataFrame]],
+    columns: dict[str, tuple[str, float]],
+    override: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Stripped texts of every frame. Each member's text column (and the
+    detection confidence) is picked on its first chunk and recorded in
+    `columns`; `override` names the column explicitly.
+    """
+    for member, df in frames:
+        if member not in columns:
+            if override is None:
+                columns[member] = _detect_text_column(df)
+            elif override in df.columns:
+                columns[member] = (override, 1.0)
+            else:
+                raise ValueError(
+                    f"Column '{override}' not found in {member}. Available columns: {', '.join(map(str, df.columns))}."
+                )
+        yield from df[columns[member][0]].astype(str).str.strip()
+
 
-def _detect_text_column(df: pd.DataFrame) -> str:
-    """Pick the most likely text column by name heuristics."""
-    candidates = ["text", "tweet", "content", "review", "comment", "body", "message"]
-    for col in candidates:
-        for actual in df.columns:
-            if col in actual.lower():
-                return actual
-    str_cols = df.select_dtypes(include="object").columns.tolist()
-    if not str_cols:
+def _position(source: BinaryIO) -> Optional[int]:
+    """Bytes consumed so far (for progress), if the source can tell."""
+    try:
+        return source.tell()
+    except (OSError, ValueError):
+        return None
+
+
+def _detect_text_column(df: pd.DataFrame) -> tuple[str, float]:
+    """
+    Pick the most likely free-text column from the first TEXT_DETECT_SAMPLE
+    rows, so wide frames never get converted to strings in full.
+
+    Each column scores 0-1 on how text-like its sampled values are — share of
+    non-empty strings, length, word count, distinctness, links / @mentions /
+    #hashtags — plus a small bonus for a telling name ("text", "tweet", …).
+    Returns (column, confidence): the winner's score discounted by how close
+    the runner-up came.
+    """
+    sample = df.head(TEXT_DETECT_SAMPLE)
+    scores = sorted(
+        ((_text_score(sample[col], str(col)), col) for col in sample.columns),
+        key=lambda sc: sc[0], reverse=True,
+    )
+    if not scores or scores[0][0] < 0.15:
         raise ValueError("No text column found in uploaded file.")
-    return max(str_cols, key=lambda c: df[c].astype(str).str.len().mean())
+    best, column = scores[0]
+    runner_up = scores[1][0] if len(scores) > 1 else 0.0
+    return column, round(best * best / (best + runner_up), 3)
+
+
+def _text_score(values: pd.Series, name: str) -> float:
+    strings = [v.strip() for v in values if isinstance(v, str) and v.strip()]
+    if not strings:
+        return 0.0
+    filled = len(strings) / len(values)
+    length = min(sum(map(len, strings)) / len(strings), 140) / 140
+    words = min(sum(v.count(" ") for v in strings) / len(strings), 10) / 10
+    distinct = len(set(strings)) / len(strings)
+    social = sum(1 for v in strings if _SOCIAL.search(v)) / len(strings)
+    score = filled * (0.35 * length + 0.35 * words + 0.2 * distinct + 0.1 * social)
+    lowered = name.lower()
+    if lowered in _TEXT_NAMES:
+        score += 0.2
+    elif any(hint in lowered for hint in _TEXT_NAMES):
+        score += 0.1
+    return min(score, 1.0)
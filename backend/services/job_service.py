@@ -0,0 +1,739 @@
+"""
+Job service — durable background job scheduler.
+
+Jobs are rows in the `job` table, so queued work survives a restart and
+finished results stay pollable until they are evicted after JOB_RESULT_TTL
+seconds. Work runs on a bounded thread pool (JOB_WORKERS) and is dispatched
+by priority class (high → normal → low, FIFO within a class). Ingests of
+uploads that are still arriving (early analysis) spend most of their time
+waiting for the client, so they run on a pool of their own
+(UPLOAD_INGEST_WORKERS) and can't starve purges, exports and backfills.
+
+Handlers receive a JobContext and must call ctx.progress(pct) and
+ctx.check_cancelled() between chunks; cancellation is cooperative. A cancel
+request is stored on the job row, so it reaches the job in whichever worker
+process runs it, and running jobs heartbeat on a timer, so a long step that
+reports no progress is not mistaken for an orphan. A processing job whose
+heartbeat stops (its process died) is re-queued by whichever process notices
+first, at startup or on its next heartbeat tick.
+
+Progress snapshots (percentage, stage, rows/s, ETA) are throttled to one every
+JOB_PROGRESS_INTERVAL seconds (stage changes always go out) and pushed to
+watchers — the SSE endpoint in routes/jobs.py — instead of being polled.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlmodel import Session, col, delete, func, select, update
+
+from database.db import engine
+from models.data_models import IngestCheckpoint, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+UPLOAD_INGEST_WORKERS = int(os.getenv("UPLOAD_INGEST_WORKERS", "2"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+JOB_SWEEP_INTERVAL = int(os.getenv("JOB_SWEEP_INTERVAL", "300"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.25"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./database/uploads")
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./database/exports")
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("done", "error", "cancelled")
+
+# Progress is persisted at most this often (seconds); live values stay in memory
+_PERSIST_INTERVAL = 1.0
+# A processing job whose heartbeat is older than this is considered orphaned
+_STALE_AFTER = 60
+# Running jobs' heartbeats are refreshed this often, progress or not
+_HEARTBEAT_INTERVAL = 10.0
+# check_cancelled() reads the job's cancel request at most this often
+_CANCEL_POLL_SECONDS = 1.0
+# Watchers fall back to reading the job row when no push arrived for this long
+_WATCH_POLL_SECONDS = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class JobInterrupted(JobCancelled):
+    """Raised inside a handler when the scheduler is shutting down; the job is re-queued."""
+
+
+class JobContext:
+    """Handed to job handlers: parameters, progress reporting and cancellation checks."""
+
+    def __init__(self, scheduler: "JobScheduler", job_id: str, params: dict):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.params = params
+        self._cancel = threading.Event()
+        self._last_persist = 0.0
+        self._last_emit = 0.0
+        self.lane = "jobs"
+        self._stage: Optional[str] = None
+        self._stage_started = time.monotonic()
+        self._rate_mark: Optional[tuple[float, int]] = None
+        self._rows_per_sec: Optional[float] = None
+        self._last_cancel_poll = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        now = time.monotonic()
+        if not self._cancel.is_set() and now - self._last_cancel_poll >= _CANCEL_POLL_SECONDS:
+            # The request may have been made in another worker process
+            self._last_cancel_poll = now
+            if self.scheduler._cancel_requested(self.job_id):
+                self._cancel.set()
+        if self._cancel.is_set():
+            if self.scheduler._stopping.is_set():
+                raise JobInterrupted()
+            raise JobCancelled()
+
+    def progress(
+        self,
+        pct: int,
+        rows_done: Optional[int] = None,
+        rows_total: Optional[int] = None,
+        stage: Optional[str] = None,
+    ):
+        """Report progress. Cheap to call often — emission and persistence are throttled."""
+        now = time.monotonic()
+        stage_changed = stage is not None and stage != self._stage
+        if stage_changed:
+            self._stage, self._stage_started = stage, now
+            self._rate_mark, self._rows_per_sec = None, None
+        if rows_done is not None:
+            self._update_rate(now, rows_done)
+
+        eta = None
+        if self._rows_per_sec and rows_total is not None and rows_done is not None:
+            eta = round(max(0, rows_total - rows_done) / self._rows_per_sec, 1)
+        live = self.scheduler._live.setdefault(self.job_id, {"status": "processing"})
+        live["progress"] = pct
+        live["stage"] = self._stage
+        live["detail"] = {
+            "rows_done": rows_done,
+            "rows_total": rows_total,
+            "rows_per_sec": round(self._rows_per_sec, 1) if self._rows_per_sec else None,
+            "eta_seconds": eta,
+            "stage_elapsed": round(now - self._stage_started, 1),
+        }
+        if not stage_changed and now - self._last_emit < JOB_PROGRESS_INTERVAL:
+            return
+        self._last_emit = now
+        self.scheduler._notify(self.job_id)
+        if stage_changed or now - self._last_persist >= _PERSIST_INTERVAL:
+            self._last_persist = now
+            self.scheduler._update(
+                self.job_id, progress=pct, stage=self._stage, progress_detail=json.dumps(live["detail"])
+            )
+
+    def _update_rate(self, now: float, rows_done: int):
+        """Smoothed rows/sec between successive reports."""
+        if self._rate_mark is None:
+            self._rate_mark = (now, rows_done)
+            return
+        t0, r0 = self._rate_mark
+        if now - t0 < 0.1:
+            return
+        instant = (rows_done - r0) / (now - t0)
+        self._rows_per_sec = instant if self._rows_per_sec is None else 0.7 * self._rows_per_sec + 0.3 * instant
+        self._rate_mark = (now, rows_done)
+
+
+_HANDLERS: dict[str, Callable[[JobContext], Any]] = {}
+
+
+def job_handler(kind: str):
+    """Register a function as the handler for jobs of `kind`."""
+    def decorator(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def _lane(kind: str, params: dict) -> str:
+    """The worker pool a job runs on: "uploads" for early-analysis ingests, "jobs" for everything else."""
+    return "uploads" if kind == "ingest" and params.get("upload_id") else "jobs"
+
+
+class JobScheduler:
+    def __init__(self, workers: int = JOB_WORKERS, upload_workers: int = UPLOAD_INGEST_WORKERS):
+        self.workers = workers
+        self.upload_workers = upload_workers
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        # One priority heap per lane (see _lane)
+        self._queues: dict[str, list[tuple[int, int, str]]] = {"jobs": [], "uploads": []}
+        self._order = itertools.count()
+        self._running: dict[str, JobContext] = {}
+        # Fresh status/progress for jobs this process knows about (avoids a DB read per poll)
+        self._live: dict[str, dict] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.completed = 0
+        # job_id -> [(event loop, queue)] of SSE watchers in this process
+        self._watchers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start workers and re-queue jobs left over from a previous run."""
+        if self._executors:
+            return
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        self._executors = {
+            "jobs": ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job"),
+            "uploads": ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="job-upload"),
+        }
+        self._stopping.clear()
+        self._requeue_orphans()
+        with Session(engine) as session:
+            resumed = session.exec(
+                select(Job.id, Job.priority, Job.kind, Job.params)
+                .where(Job.status == "queued")
+                .order_by(Job.created_at)
+            ).all()
+        for job_id, priority, kind, params in resumed:
+            self._enqueue(job_id, priority, _lane(kind, json.loads(params or "{}")))
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="job-sweeper", daemon=True)
+        self._sweeper.start()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+        logger.info(
+            f"[JOBS] Scheduler started ({self.workers} workers, {self.upload_workers} for uploads, "
+            f"{len(resumed)} jobs resumed)."
+        )
+
+    def shutdown(self):
+        self._stopping.set()
+        for ctx in list(self._running.values()):
+            ctx._cancel.set()
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors = {}
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def submit(self, kind: str, params: Optional[dict] = None, priority: str = "normal", job_id: Optional[str] = None) -> str:
+        if kind not in _HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priority must be one of {list(PRIORITIES)}.")
+        job = Job(
+            id=job_id or str(uuid.uuid4()),
+            kind=kind,
+            priority=PRIORITIES[priority],
+            params=json.dumps(params or {}),
+        )
+        job_id, priority_value = job.id, job.priority
+        with Session(engine) as session:
+            session.add(job)
+            session.commit()
+        self._enqueue(job_id, priority_value, _lane(kind, params or {}))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+            if not job:
+                return None
+            out = _job_dict(job)
+        live = self._live.get(job_id)
+        # Another process may have finished (or cancelled) it since
+        if live and out["status"] not in FINISHED:
+            out.update(live)
+        return out
+
+    def list_jobs(self, limit: int = 50, status: Optional[str] = None) -> list[dict]:
+        with Session(engine) as session:
+            stmt = select(Job).order_by(col(Job.created_at).desc()).limit(limit)
+            if status:
+                stmt = stmt.where(Job.status == status)
+            jobs = [_job_dict(j) for j in session.exec(stmt).all()]
+        for j in jobs:
+            if j["status"] not in FINISHED:
+                j.update(self._live.get(j["job_id"], {}))
+        return jobs
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a queued or running job (in any worker process). Returns its
+        resulting status, None if unknown.
+        """
+        with self._lock:
+            ctx = self._running.get(job_id)
+            if ctx:
+                ctx._cancel.set()
+        now = datetime.utcnow()
+        with Session(engine) as session:
+            # Conditional updates: a worker may claim or finish the job meanwhile
+            dropped = session.exec(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(status="cancelled", finished_at=now, updated_at=now)
+            ).rowcount
+            requested = dropped or session.exec(
+                update(Job).where(Job.id == job_id, Job.status == "processing").values(cancel_requested_at=now)
+            ).rowcount
+            session.commit()
+        if dropped:
+            # Lazily dropped from the heap when popped
+            self._live.pop(job_id, None)
+            self.completed += 1
+            self._notify(job_id, self.get(job_id))
+            return "cancelled"
+        if requested or ctx:
+            return "cancelling"
+        job = self.get(job_id)
+        return job["status"] if job else None
+
+    def watch(self, job_id: str) -> asyncio.Queue:
+        """Subscribe the calling event loop to progress snapshots of a job."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        with self._lock:
+            self._watchers.setdefault(job_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unwatch(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            watchers = [w for w in self._watchers.get(job_id, []) if w[1] is not queue]
+            if watchers:
+                self._watchers[job_id] = watchers
+            else:
+                self._watchers.pop(job_id, None)
+
+    async def events(self, job_id: str):
+        """
+        Yield progress snapshots for a job until it finishes, or None as a keepalive.
+
+        Jobs run by this process push their updates; jobs picked up by another
+        worker process are followed by reading the persisted row once a second.
+        """
+        queue = self.watch(job_id)
+        try:
+            snapshot = self.get(job_id)
+            if snapshot is None:
+                return
+            yield snapshot
+            while snapshot["status"] not in FINISHED:
+                try:
+                    latest = await asyncio.wait_for(queue.get(), timeout=_WATCH_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    # No push within the interval: the job may live in another process, so re-read it
+                    latest = await asyncio.to_thread(self.get, job_id)
+                    if latest is None:
+                        return
+                    if _same_progress(latest, snapshot):
+                        yield None
+                        continue
+                snapshot = latest
+                yield snapshot
+        finally:
+            self.unwatch(job_id, queue)
+
+    def _notify(self, job_id: str, snapshot: Optional[dict] = None):
+        """Push a snapshot to watchers; safe to call from worker threads."""
+        with self._lock:
+            watchers = list(self._watchers.get(job_id, []))
+        if not watchers:
+            return
+        snapshot = snapshot or {"job_id": job_id, **self._live.get(job_id, {})}
+        for loop, queue in watchers:
+            loop.call_soon_threadsafe(_offer, queue, snapshot)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            depth = {name: 0 for name in PRIORITIES}
+            by_value = {v: k for k, v in PRIORITIES.items()}
+            for queue in self._queues.values():
+                for priority, _, job_id in queue:
+                    if self._live.get(job_id, {}).get("status") == "queued":
+                        depth[by_value[priority]] += 1
+            running = len(self._running)
+        with Session(engine) as session:
+            by_status = dict(session.exec(select(Job.status, func.count()).group_by(Job.status)).all())
+        return {
+            "workers": self.workers,
+            "upload_workers": self.upload_workers,
+            "running": running,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "jobs_by_status": by_status,
+            "completed_since_start": self.completed,
+            "result_ttl_seconds": JOB_RESULT_TTL,
+        }
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _enqueue(self, job_id: str, priority: int, lane: str = "jobs"):
+        with self._lock:
+            self._live[job_id] = {"status": "queued", "progress": 0}
+            heapq.heappush(self._queues[lane], (priority, next(self._order), job_id))
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand queued jobs to their lane's pool while it has free workers."""
+        if not self._executors:
+            return
+        capacity = {"jobs": self.workers, "uploads": self.upload_workers}
+        with self._lock:
+            for lane, queue in self._queues.items():
+                busy = sum(1 for ctx in self._running.values() if ctx.lane == lane)
+                while queue and busy < capacity[lane]:
+                    _, _, job_id = heapq.heappop(queue)
+                    if self._live.get(job_id, {}).get("status") != "queued":
+                        continue  # cancelled while waiting
+                    ctx = JobContext(self, job_id, {})
+                    ctx.lane = lane
+                    self._running[job_id] = ctx
+                    self._live[job_id] = {"status": "processing", "progress": 0, "stage": None}
+                    self._executors[lane].submit(self._execute, ctx)
+                    busy += 1
+
+    def _execute(self, ctx: JobContext):
+        job_id = ctx.job_id
+        try:
+            now = datetime.utcnow()
+            with Session(engine) as session:
+                # Atomic claim: another worker process may have queued the same job
+                claimed = session.exec(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="processing", started_at=now, updated_at=now)
+                ).rowcount
+                session.commit()
+                job = session.get(Job, job_id)
+                if not claimed or not job:
+                    self._live.pop(job_id, None)
+                    return
+                ctx.params = json.loads(job.params or "{}")
+                kind = job.kind
+            logger.info(f"[JOBS] {kind} job {job_id} started.")
+            self._notify(job_id)
+            result = _HANDLERS[kind](ctx)
+            self._finish(job_id, "done", result=result)
+        except JobInterrupted:
+            # Handlers that checkpoint (ingest) pick up where they left off on the next start
+            logger.info(f"[JOBS] Job {job_id} interrupted by shutdown; re-queued.")
+            self._update(job_id, status="queued")
+            self._live.pop(job_id, None)
+        except JobCancelled:
+            logger.info(f"[JOBS] Job {job_id} cancelled.")
+            self._finish(job_id, "cancelled")
+        except Exception as e:
+            logger.error(f"[JOBS] Job {job_id} failed: {e}")
+            self._finish(job_id, "error", error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._dispatch()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        fields: dict = {"status": status, "finished_at": datetime.utcnow()}
+        if status == "done":
+            fields["progress"] = 100
+            fields["result"] = json.dumps(result, default=str)
+        if error:
+            fields["error"] = error
+        self._update(job_id, **fields)
+        self._live.pop(job_id, None)
+        self.completed += 1
+        final = self.get(job_id)
+        if final:
+            self._notify(job_id, final)
+
+    def _update(self, job_id: str, **fields):
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+            if not job:
+                return
+            for k, v in fields.items():
+                setattr(job, k, v)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with Session(engine) as session:
+            return session.exec(select(Job.cancel_requested_at).where(Job.id == job_id)).first() is not None
+
+    def _heartbeat_loop(self):
+        """
+        Refresh the heartbeat of this process's running jobs, whether or not
+        they report progress, and pick up jobs whose process stopped beating.
+        """
+        while not self._stopping.wait(_HEARTBEAT_INTERVAL):
+            with self._lock:
+                running = list(self._running)
+            try:
+                if running:
+                    with Session(engine) as session:
+                        session.exec(
+                            update(Job)
+                            .where(col(Job.id).in_(running), Job.status == "processing")
+                            .values(updated_at=datetime.utcnow())
+                        )
+                        session.commit()
+                for job_id, priority, lane in self._requeue_orphans():
+                    self._enqueue(job_id, priority, lane)
+            except Exception as e:
+                logger.error(f"[JOBS] Heartbeat failed: {e}")
+
+    def _requeue_orphans(self) -> list[tuple[str, int, str]]:
+        """Re-queue processing jobs with a dead heartbeat (their process is gone); returns (id, priority, lane)."""
+        stale = datetime.utcnow() - timedelta(seconds=_STALE_AFTER)
+        with Session(engine) as session:
+            # Other workers may be running jobs right now; only reclaim those with a dead heartbeat
+            orphaned = session.exec(
+                update(Job)
+                .where(Job.status == "processing", col(Job.updated_at) < stale)
+                .values(status="queued", progress=0)
+                .returning(Job.id, Job.priority, Job.kind, Job.params)
+            ).all()
+            session.commit()
+        if orphaned:
+            logger.info(f"[JOBS] Re-queued {len(orphaned)} interrupted jobs.")
+        return [
+            (job_id, priority, _lane(kind, json.loads(params or "{}"))) for job_id, priority, kind, params in orphaned
+        ]
+
+    def _sweep_loop(self):
+        from services.upload_service import expire_sessions
+        while not self._stopping.wait(JOB_SWEEP_INTERVAL):
+            try:
+                self.evict_expired()
+                expire_sessions()
+            except Exception as e:
+                logger.error(f"[JOBS] Eviction sweep failed: {e}")
+
+    def evict_expired(self) -> int:
+        """Delete finished jobs (and their uploaded/exported files) older than the TTL."""
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_RESULT_TTL)
+        with Session(engine) as session:
+            expired = session.exec(
+                select(Job).where(col(Job.status).in_(FINISHED), col(Job.finished_at) < cutoff)
+            ).all()
+            for job in expired:
+                for path in job_files(job.id, json.loads(job.params or "{}"), json.loads(job.result or "null")):
+                    if os.path.exists(path):
+                        os.remove(path)
+            expired_ids = [j.id for j in expired]
+            session.exec(delete(IngestCheckpoint).where(col(IngestCheckpoint.job_id).in_(expired_ids)))
+            session.exec(delete(Job).where(col(Job.id).in_(expired_ids)))
+            session.commit()
+        if expired:
+            logger.info(f"[JOBS] Evicted {len(expired)} expired jobs.")
+        return len(expired)
+
+
+def _offer(queue: asyncio.Queue, snapshot: dict):
+    """Enqueue a snapshot, dropping the oldest one if a slow watcher fell behind."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(snapshot)
+
+
+def _same_progress(a: dict, b: dict) -> bool:
+    return all(a.get(k) == b.get(k) for k in ("status", "progress", "stage"))
+
+
+def job_files(job_id: str, params: dict, result: Any) -> list[str]:
+    """Files on disk owned by a job (its uploaded input and any export artifact)."""
+    paths = []
+    if params.get("path"):
+        paths.append(params["path"])
+    if isinstance(result, dict) and result.get("artifact"):
+        paths.append(result["artifact"])
+    return paths
+
+
+def _job_dict(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": {v: k for k, v in PRIORITIES.items()}.get(job.priority, "normal"),
+        "progress": job.progress,
+        "stage": job.stage,
+        "detail": json.loads(job.progress_detail) if job.progress_detail else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# ── Handlers ──────────────────────────────────────────────────────────────────
+
+@job_handler("ingest")
+def _ingest_job(ctx: JobContext) -> dict:
+    """
+    Checkpointed: re-running an interrupted ingest job resumes after its last
+    committed batch. Chunked uploads with early analysis are read while they
+    are still arriving.
+    """
+    from services.dataset_service import DEFAULT_DATASET
+    from services.file_service import discard_ingest, finished_ingest, ingest_file
+    from services.upload_service import open_upload, sha256_file
+    path = ctx.params["path"]
+    with Session(engine) as session:
+        # Interrupted after its partition went live: the upload may already be gone
+        result = finished_ingest(session, ctx.job_id)
+    if result is not None:
+        if os.path.exists(path):
+            os.remove(path)
+        return result
+    upload_id = ctx.params.get("upload_id")
+    if upload_id:
+        source = open_upload(upload_id, check_cancelled=ctx.check_cancelled)
+        file_hash, size = f"upload:{upload_id}", source.raw.size
+    else:
+        source = open(path, "rb")
+        file_hash, size = sha256_file(path), os.path.getsize(path)
+    with source, Session(engine) as session:
+        try:
+            result = ingest_file(
+                source, ctx.params["filename"], session,
+                progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled, job_id=ctx.job_id,
+                dataset=ctx.params.get("dataset") or DEFAULT_DATASET, mode=ctx.params.get("mode", "replace"),
+                file_hash=file_hash, size=size,
+                sheet=ctx.params.get("sheet"), text_column=ctx.params.get("text_column"),
+            )
+        except JobInterrupted:
+            raise
+        except Exception:
+            session.rollback()
+            discard_ingest(session, ctx.job_id)
+            raise
+    # The upload is no longer needed once it has been analyzed
+    os.remove(path)
+    return result
+
+
+@job_handler("preprocess")
+def _preprocess_job(ctx: JobContext) -> dict:
+    from services.preprocess_service import run_preprocessing
+    with Session(engine) as session:
+        return run_preprocessing(
+            session, ctx.params.get("options"),
+            progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled, dataset=ctx.params.get("dataset"),
+        )
+
+
+@job_handler("sentiment")
+def _sentiment_job(ctx: JobContext) -> dict:
+    from services.sentiment_service import run_sentiment_analysis
+    with Session(engine) as session:
+        return run_sentiment_analysis(
+            session, progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled, dataset=ctx.params.get("dataset")
+        )
+
+
+@job_handler("emotion")
+def _emotion_job(ctx: JobContext) -> dict:
+    from services.emotion_service import run_emotion_analysis
+    with Session(engine) as session:
+        return run_emotion_analysis(
+            session, progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled, dataset=ctx.params.get("dataset")
+        )
+
+
+@job_handler("reanalyze")
+def _reanalyze_job(ctx: JobContext) -> dict:
+    """Re-run sentiment then emotion over every record."""
+    from services.emotion_service import run_emotion_analysis
+    from services.sentiment_service import run_sentiment_analysis
+    with Session(engine) as session:
+        sentiment = run_sentiment_analysis(
+            session, progress_cb=lambda p: ctx.progress(p // 2), check_cancelled=ctx.check_cancelled,
+            dataset=ctx.params.get("dataset"),
+        )
+        emotion = run_emotion_analysis(
+            session, progress_cb=lambda p: ctx.progress(50 + p // 2), check_cancelled=ctx.check_cancelled,
+            dataset=ctx.params.get("dataset"),
+        )
+    return {"sentiment": sentiment.get("counts", {}), "emotion": emotion.get("emotion_counts", {}), "total": sentiment.get("total", 0)}
+
+
+@job_handler("purge")
+def _purge_job(ctx: JobContext) -> dict:
+    """Delete rows of dropped / replaced dataset partitions."""
+    from services.dataset_service import purge_deleted
+    return {"purged": purge_deleted(check_cancelled=ctx.check_cancelled)}
+
+
+@job_handler("reindex")
+def _reindex_job(ctx: JobContext) -> dict:
+    """Rebuild the full-text search index from the record table."""
+    from services.search_service import rebuild_search_index
+    return {"indexed": rebuild_search_index()}
+
+
+@job_handler("keyword_backfill")
+def _keyword_backfill_job(ctx: JobContext) -> dict:
+    """Match a new or edited keyword group against the existing records; resumes from its checkpoint."""
+    from services.keyword_service import backfill_group
+    return backfill_group(
+        ctx.params["group_id"], ctx.params["revision"],
+        progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled,
+    )
+
+
+@job_handler("entity_reindex")
+def _entity_reindex_job(ctx: JobContext) -> dict:
+    """Re-extract hashtags, mentions and domains of every record into the entity index."""
+    from services.entity_service import rebuild_entity_index
+    return {"indexed": rebuild_entity_index(progress_cb=ctx.progress, check_cancelled=ctx.check_cancelled)}
+
+
+@job_handler("export")
+def _export_job(ctx: JobContext) -> dict:
+    """
+    Params: format (csv | ndjson | parquet | arrow | pdf), dataset; for row
+    formats also columns (list), sentiment, emotion, min_confidence, and
+    gzip (bool, csv / ndjson only).
+
+    PDFs go to the report cache shared with /api/reports/download (keyed by
+    data version) rather than a per-job artifact, so they outlive the job.
+    """
+    from services.report_service import export_rows, render_pdf_report
+    fmt = ctx.params.get("format", "csv")
+    if fmt == "pdf":
+        path = render_pdf_report(ctx.params.get("dataset"))
+        return {"report": path, "format": fmt, "size_bytes": os.path.getsize(path)}
+    compress = bool(ctx.params.get("gzip"))
+    path = os.path.join(EXPORT_DIR, f"{ctx.job_id}.{fmt}" + (".gz" if compress else ""))
+    chunks = export_rows(
+        fmt, columns=ctx.params.get("columns"), dataset=ctx.params.get("dataset"),
+        sentiment=ctx.params.get("sentiment"), emotion=ctx.params.get("emotion"),
+        min_confidence=ctx.params.get("min_confidence"), compress=compress,
+        check_cancelled=ctx.check_cancelled,
+    )
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return {"artifact": path, "format": fmt, "gzip": compress, "size_bytes": os.path.getsize(path)}
+
+
+# Singleton — imported everywhere
+scheduler = JobScheduler()
@@ -0,0 +1,329 @@
+"""
+Keyword service — keyword groups (candidates, brands, topics) and the
+record ↔ group index used to compare them.
+
+All groups are compiled into one multi-pattern matcher: an Aho-Corasick
+automaton when the optional `pyahocorasick` package is installed, a single
+compiled regular-expression alternation otherwise. Either way each text is
+scanned once, whatever the number of groups and keywords. Keywords match
+case-insensitively on word boundaries ("#debate", "joe biden" and "tax" all
+work; "tax" does not match "taxi").
+
+Matches are written to record_group when records are inserted (see
+dataset_service.insert_records, used by file ingest and the stream writer),
+so comparing groups is an aggregate over record_group ⋈ record rather than a
+rescan of the text. A new or edited group is matched against the existing
+records by a "keyword_backfill" job that walks them in keyset pages and
+checkpoints its position, so it resumes after an interruption.
+"""
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, col, delete, func, select
+
+from database.db import engine
+from models.data_models import KeywordGroup, Record, RecordGroup
+from services.dataset_service import bump_data_version, record_conditions, record_pages
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+GROUP_KINDS = ("candidate", "brand", "topic")
+BACKFILL_PAGE_SIZE = 5000
+
+# Matcher over every group, rebuilt when a group changes: (groups signature, matcher)
+_matcher_cache: tuple = ((), None)
+_matcher_lock = threading.Lock()
+
+
+class KeywordMatcher:
+    """Finds which groups' keywords occur in a text, in one pass over it."""
+
+    def __init__(self, groups: dict[int, list[str]]):
+        self._groups_of: dict[str, set[int]] = {}
+        for group_id, keywords in groups.items():
+            for keyword in keywords:
+                self._groups_of.setdefault(keyword, set()).add(group_id)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self._groups_of:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            # Longest first, so a keyword that extends another wins at the same position
+            alternation = "|".join(re.escape(k) for k in sorted(self._groups_of, key=len, reverse=True))
+            self._pattern = re.compile(f"(?=({alternation}))")
+
+    def match(self, text: str) -> set[int]:
+        if not self._groups_of or not text:
+            return set()
+        text = text.lower()
+        found: set[int] = set()
+        if ahocorasick is not None:
+            hits = ((end - len(keyword) + 1, keyword) for end, keyword in self._automaton.iter(text))
+        else:
+            hits = ((m.start(), m.group(1)) for m in self._pattern.finditer(text))
+        for start, keyword in hits:
+            if _on_word_boundary(text, start, keyword):
+                found |= self._groups_of[keyword]
+        return found
+
+
+def _on_word_boundary(text: str, start: int, keyword: str) -> bool:
+    end = start + len(keyword)
+    if _is_word_char(keyword[0]) and start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if _is_word_char(keyword[-1]) and end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def normalize_keywords(keywords: Iterable[str]) -> list[str]:
+    """Lower-cased, stripped, de-duplicated keywords, in their original order."""
+    out = list(dict.fromkeys(k.strip().lower() for k in keywords if k and k.strip()))
+    if not out:
+        raise ValueError("A keyword group needs at least one keyword.")
+    return out
+
+
+# ── Ingest-time matching ──────────────────────────────────────────────────────
+
+def tag_records(conn, rows: Iterable[tuple[int, str]]):
+    """
+    Index (record id, text) pairs against every keyword group, inside the
+    caller's transaction. Call it after the insert: the groups are read under
+    the write lock, so a group created concurrently is either seen here or
+    created before its backfill job reads the records.
+    """
+    matcher = _current_matcher(conn)
+    if matcher is None:
+        return
+    links = [
+        {"group_id": group_id, "record_id": record_id}
+        for record_id, text in rows
+        for group_id in matcher.match(text)
+    ]
+    if links:
+        conn.execute(sqlite_insert(RecordGroup).on_conflict_do_nothing(), links)
+
+
+def _current_matcher(conn) -> Optional[KeywordMatcher]:
+    global _matcher_cache
+    groups = conn.execute(
+        select(KeywordGroup.id, KeywordGroup.revision, KeywordGroup.keywords).order_by(KeywordGroup.id)
+    ).all()
+    signature = tuple((g.id, g.revision) for g in groups)
+    with _matcher_lock:
+        if _matcher_cache[0] != signature:
+            matcher = KeywordMatcher({g.id: json.loads(g.keywords) for g in groups}) if groups else None
+            _matcher_cache = (signature, matcher)
+        return _matcher_cache[1]
+
+
+# ── Groups ────────────────────────────────────────────────────────────────────
+
+def list_groups(session: Session) -> list[dict]:
+    counts = dict(session.exec(
+        select(RecordGroup.group_id, func.count()).group_by(RecordGroup.group_id)
+    ).all())
+    return [_group_dict(g, counts.get(g.id, 0)) for g in session.exec(select(KeywordGroup).order_by(KeywordGroup.name)).all()]
+
+
+def save_group(session: Session, name: str, keywords: list[str], kind: str = "topic") -> tuple[dict, str]:
+    """
+    Create group `name`, or replace its keywords, and queue the backfill that
+    matches it against the existing records. Returns (group, backfill job id).
+    """
+    from services.job_service import scheduler
+    if kind not in GROUP_KINDS:
+        raise ValueError(f"kind must be one of {list(GROUP_KINDS)}.")
+    keywords = normalize_keywords(keywords)
+    group = session.exec(select(KeywordGroup).where(KeywordGroup.name == name)).first()
+    if group is None:
+        group = KeywordGroup(name=name, kind=kind, keywords=json.dumps(keywords))
+    else:
+        # Matches of the old keywords are dropped; the backfill redoes them all
+        session.exec(delete(RecordGroup).where(RecordGroup.group_id == group.id))
+        group.kind = kind
+        group.keywords = json.dumps(keywords)
+        group.revision += 1
+        group.backfilled_through = 0
+        group.status = "backfilling"
+        group.updated_at = datetime.utcnow()
+    session.add(group)
+    bump_data_version(session)
+    session.commit()
+    session.refresh(group)
+    job_id = scheduler.submit(
+        "keyword_backfill", {"group_id": group.id, "revision": group.revision}, priority="low"
+    )
+    logger.info(f"[KEYWORDS] Saved group '{name}' ({len(keywords)} keywords); backfill job {job_id}.")
+    return _group_dict(group, 0), job_id
+
+
+def delete_group(session: Session, name: str) -> bool:
+    group = session.exec(select(KeywordGroup).where(KeywordGroup.name == name)).first()
+    if group is None:
+        return False
+    session.exec(delete(RecordGroup).where(RecordGroup.group_id == group.id))
+    session.delete(group)
+    bump_data_version(session)
+    session.commit()
+    return True
+
+
+def backfill_group(
+    group_id: int,
+    revision: int,
+    progress_cb: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> dict:
+    """
+    Match one group against the records it has not seen yet, in keyset pages,
+    committing the matches and the checkpoint together. Records inserted after
+    the group was saved were matched by their writer already. Stops quietly
+    if the group is edited (new revision, new job) or deleted meanwhile.
+    """
+    with Session(engine) as session:
+        group = session.get(KeywordGroup, group_id)
+        if group is None or group.revision != revision:
+            return {"group_id": group_id, "skipped": True}
+        matcher = KeywordMatcher({group_id: json.loads(group.keywords)})
+        start = group.backfilled_through
+        max_id = session.exec(select(func.max(Record.id))).one() or 0
+
+    matched = 0
+    for rows in record_pages([Record.text], [col(Record.id) <= max_id], start, BACKFILL_PAGE_SIZE, check_cancelled):
+        links = [{"group_id": group_id, "record_id": rid} for rid, text in rows if matcher.match(text)]
+        with Session(engine) as session:
+            group = session.get(KeywordGroup, group_id)
+            if group is None or group.revision != revision:
+                return {"group_id": group_id, "skipped": True}
+            if links:
+                session.execute(sqlite_insert(RecordGroup).on_conflict_do_nothing(), links)
+            group.backfilled_through = rows[-1][0]
+            session.add(group)
+            session.commit()
+        matched += len(links)
+        if progress_cb and max_id:
+            progress_cb(min(99, int((rows[-1][0] - start) * 100 / max(max_id - start, 1))))
+
+    with Session(engine) as session:
+        group = session.get(KeywordGroup, group_id)
+        if group is None or group.revision != revision:
+            return {"group_id": group_id, "skipped": True}
+        group.backfilled_through = max_id
+        group.status = "ready"
+        session.add(group)
+        bump_data_version(session)
+        session.commit()
+    logger.info(f"[KEYWORDS] Backfilled group {group_id}: {matched} matching records.")
+    return {"group_id": group_id, "matched": matched}
+
+
+# ── Comparison ────────────────────────────────────────────────────────────────
+
+def compare_groups(
+    session: Session,
+    dataset: Optional[str] = None,
+    groups: Optional[list[str]] = None,
+    kind: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> dict:
+    """
+    Sentiment / emotion breakdown per keyword group over the visible records
+    of `dataset`, plus a daily sentiment series per group. Aggregates over
+    record_group ⋈ record; no text is read.
+    """
+    query = select(KeywordGroup).order_by(KeywordGroup.name)
+    if groups:
+        query = query.where(col(KeywordGroup.name).in_(groups))
+    if kind:
+        query = query.where(KeywordGroup.kind == kind)
+    selected = {g.id: g for g in session.exec(query).all()}
+    if not selected:
+        return {"groups": [], "over_time": []}
+
+    conditions = [
+        col(RecordGroup.group_id).in_(list(selected)),
+        *record_conditions(session, dataset, since=since, until=until),
+    ]
+
+    def matches(*columns):
+        return select(RecordGroup.group_id, *columns).join(Record, col(Record.id) == RecordGroup.record_id).where(*conditions)
+
+    stats = {gid: {"total": 0, "sentiment": {"Positive": 0, "Neutral": 0, "Negative": 0}, "emotion": {}} for gid in selected}
+    for gid, label, n in session.exec(
+        matches(Record.sentiment, func.count()).group_by(RecordGroup.group_id, Record.sentiment)
+    ).all():
+        stats[gid]["total"] += n
+        if label:
+            stats[gid]["sentiment"][label] = n
+    for gid, label, n in session.exec(
+        matches(Record.emotion, func.count()).group_by(RecordGroup.group_id, Record.emotion)
+    ).all():
+        if label:
+            stats[gid]["emotion"][label] = n
+    # avg() is typed Float unless told otherwise, which would skip the fixed-point decoding
+    for gid, avg in session.exec(
+        matches(func.avg(Record.confidence, type_=Record.confidence.type)).group_by(RecordGroup.group_id)
+    ).all():
+        stats[gid]["avg_confidence"] = round(avg, 4) if avg is not None else None
+
+    day = func.date(Record.created_at)
+    over_time = [
+        {"date": d, "group": selected[gid].name, "Positive": pos, "Neutral": neu, "Negative": neg}
+        for gid, d, pos, neu, neg in session.exec(
+            matches(
+                day,
+                func.count().filter(Record.sentiment == "Positive"),
+                func.count().filter(Record.sentiment == "Neutral"),
+                func.count().filter(Record.sentiment == "Negative"),
+            ).group_by(RecordGroup.group_id, day).order_by(day)
+        ).all()
+    ]
+
+    out = []
+    for gid, group in selected.items():
+        s = stats[gid]
+        sentiment = s["sentiment"]
+        labeled = sum(sentiment.values())
+        out.append({
+            "name": group.name,
+            "kind": group.kind,
+            "status": group.status,
+            "total": s["total"],
+            "sentiment": sentiment,
+            "emotion": dict(sorted(s["emotion"].items(), key=lambda kv: -kv[1])),
+            "avg_confidence": s.get("avg_confidence"),
+            # Share of positive minus share of negative, in [-1, 1]
+            "net_sentiment": round((sentiment["Positive"] - sentiment["Negative"]) / labeled, 4) if labeled else None,
+        })
+    return {"groups": out, "over_time": over_time}
+
+
+def _group_dict(group: KeywordGroup, matches: int) -> dict:
+    return {
+        "name": group.name,
+        "kind": group.kind,
+        "keywords": json.loads(group.keywords),
+        "status": group.status,
+        "matches": matches,
+        "backfilled_through": group.backfilled_through,
+        "created_at": group.created_at,
+        "updated_at": group.updated_at,
+    }
@@ -1,38 +1,62 @@
 """
 Preprocessing service — applies the NLP pipeline to all DB records.
 """
+from typing import Callable, Optional
+
 from sqlmodel import Session, select
 
 from models.data_models import Record
+from services.columnar_service import invalidate_snapshots
+from services.dataset_service import bump_data_version, record_filter
 from utils.text_cleaner import clean_text
 
 
-def run_preprocessing(session: Session, options: dict | None = None) -> dict:
+def run_preprocessing(
+    session: Session,
+    options: dict | None = None,
+    progress_cb: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    dataset: Optional[str] = None,
+) -> dict:
     """
     Load all Records from DB, clean their text, and persist clean_text back.
     Returns before/after samples plus total processed count.
     """
     opts = options or {}
-    records = session.exec(select(Record)).all()
+    records = session.exec(select(Record).where(record_filter(session, dataset))).all()
     if not records:
         return {"message": "No records found. Please upload a dataset first.", "total": 0}
 
     samples = []
-    for i, record in enumerate(records):
-        cleaned = clean_text(
-            record.text,
-            lowercase=opts.get("lowercase", True),
-            remove_urls=opts.get("remove_urls", True),
-            remove_mentions=opts.get("remove_mentions", True),
-            remove_stopwords=opts.get("remove_stopwords", True),
-            lemmatize=opts.get("lemmatize", True),
-        )
-        record.clean_text = cleaned
-        session.add(record)
-        if i < 10:
-            samples.append({"before": record.text, "after": cleaned})
+    datasets = [dataset] if dataset else None
+    try:
+        for i, record in enumerate(records):
+            cleaned = clean_text(
+                record.text,
+                lowercase=opts.get("lowercase", True),
+                remove_urls=opts.get("remove_urls", True),
+                remove_mentions=opts.get("remove_mentions", True),
+                remove_stopwords=opts.get("remove_stopwords", True),
+                lemmatize=opts.get("lemmatize", True),
+            )
+            record.clean_text = cleaned
+            session.add(record)
+            if i < 10:
+                samples.append({"before": record.text, "after": cleaned})
+
+            # Chunked commit + progress / cancellation checkpoint; the version is bumped per chunk
+            if (i + 1) % 500 == 0:
+                bump_data_version(session, datasets)
+                session.commit()
+                if progress_cb:
+                    progress_cb(int((i + 1) * 100 / len(records)))
+                if check_cancelled:
+                    check_cancelled()
 
-    session.commit()
+        bump_data_version(session, datasets)
+        session.commit()
+    finally:
+        invalidate_snapshots()
     return {
         "message": "Preprocessing complete",
         "total": len(records),
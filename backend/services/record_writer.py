@@ -0,0 +1,141 @@
+"""
+record_writer.py — Write-behind batched persistence for streamed records.
+
+The stream hands every analyzed record, together with the event announcing
+it, to the writer and moves on to the next one. Rows are buffered in memory
+and flushed to SQLite in a single transaction either every WRITE_BATCH_SIZE
+records or every WRITE_FLUSH_MS milliseconds, whichever comes first. SQLite
+assigns the ids; once the transaction has committed, each event gets its
+record's id and is handed to `on_written` (the stream broadcasts it), so
+clients only ever see ids that exist. A batch that fails to write goes back
+to the front of the buffer and is retried with the next flush.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from database.db import engine
+from services.dataset_service import STREAM_DATASET, bump_data_version, insert_records
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = int(os.getenv("STREAM_WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_MS = int(os.getenv("STREAM_WRITE_FLUSH_MS", "250"))
+
+
+class RecordWriter:
+    """Buffers Record rows and writes them in batched transactions."""
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BATCH_SIZE,
+        flush_interval_ms: int = WRITE_FLUSH_MS,
+        on_written: Optional[Callable[[list[dict]], Awaitable[None]]] = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.on_written = on_written
+        # (row, event) pairs; the event is None for rows nobody is told about
+        self._buffer: list[tuple[dict, Optional[dict]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.flushed_total = 0
+
+    # ── Buffering ─────────────────────────────────────────────────────────────
+
+    def submit(self, row: dict, event: Optional[dict] = None):
+        """Queue one row (a dict of Record columns, without an id) and the event to emit once it is written."""
+        self._buffer.append((row, event))
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def discard(self):
+        """Drop buffered rows and their events (used when the table is wiped)."""
+        self._buffer = []
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"[WRITER] Started (batch={self.batch_size}, flush={self.flush_interval * 1000:.0f}ms).")
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"[WRITER] Final flush failed; {self.pending} rows were not written: {e}")
+        logger.info(f"[WRITER] Stopped. {self.flushed_total} rows written this session.")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[WRITER] Flush failed, {self.pending} rows kept for the next one: {e}")
+
+    async def flush(self) -> int:
+        """Write the current buffer in one transaction off the event loop, then emit its events."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, []
+            try:
+                ids = await asyncio.to_thread(_write, [row for row, _ in batch])
+            except BaseException:
+                # Ahead of whatever was queued meanwhile, so rows keep their order
+                self._buffer[:0] = batch
+                raise
+            self.flushed_total += len(batch)
+            events = [
+                {**event, "id": record_id} for (_, event), record_id in zip(batch, ids) if event is not None
+            ]
+            if events and self.on_written:
+                await self.on_written(events)
+            return len(batch)
+
+
+def _write(rows: list[dict]) -> list[int]:
+    """Insert `rows` and bump the stream's data version in one transaction; the new ids in row order."""
+    # Clusters founded by this batch; link_clusters marks them written before the commit
+    founded = [
+        (row["cluster"], row) for row in rows
+        if row.get("cluster") is not None and row["cluster"].founder is row
+    ]
+    try:
+        with engine.begin() as conn:
+            ids = insert_records(conn, rows)
+            bump_data_version(conn, [STREAM_DATASET])
+    except BaseException:
+        for cluster, row in founded:
+            cluster.id, cluster.founder = None, row
+        raise
+    return ids
@@ -1,33 +1,77 @@
 """
-Report service — generates CSV and PDF exports from the database.
+Report service — generates CSV, NDJSON, Parquet / Arrow and PDF exports from the database.
 """
+import csv
+import hashlib
 import io
-from collections import Counter
+import json
+import logging
+import os
+import zlib
+from typing import Callable, Iterator, Optional
 
-from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select
 
+from database.db import engine
 from models.data_models import Record
+from services.columnar_service import COLUMNAR_FORMATS, COLUMNAR_MEDIA_TYPES, export_columnar
+from services.dataset_service import data_version, record_conditions, record_filter, record_pages
 
+logger = logging.getLogger(__name__)
 
-def generate_summary_text(records: list[Record]) -> str:
-    """Build a plain-text report summary."""
-    total = len(records)
-    analyzed = sum(1 for r in records if r.sentiment)
-    sentiment_counts = Counter(r.sentiment for r in records if r.sentiment)
-    emotion_counts = Counter(r.emotion for r in records if r.emotion)
-    dominant_sentiment = sentiment_counts.most_common(1)[0][0] if sentiment_counts else "N/A"
-    dominant_emotion = emotion_counts.most_common(1)[0][0] if emotion_counts else "N/A"
-    avg_conf = (
-        sum(r.confidence for r in records if r.confidence) / max(analyzed, 1)
-    )
+EXPORT_COLUMNS = ("id", "text", "clean_text", "sentiment", "emotion", "confidence", "created_at", "duplicate_of")
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv", "ndjson": "application/x-ndjson", "pdf": "application/pdf", **COLUMNAR_MEDIA_TYPES,
+}
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "2000"))
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "./database/reports")
+
+
+def report_stats(session: Session, dataset: Optional[str] = None) -> dict:
+    """Totals, label counts and mean confidence of the visible records, aggregated in SQL."""
+    visible = record_filter(session, dataset)
+    total, analyzed, conf_sum = session.exec(
+        select(
+            func.count(Record.id),
+            func.count(Record.sentiment),
+            func.sum(Record.confidence),
+        ).where(visible)
+    ).one()
+
+    def counts(field) -> dict[str, int]:
+        rows = session.exec(
+            select(field, func.count(Record.id))
+            .where(visible, field.is_not(None))
+            .group_by(field)
+            .order_by(func.count(Record.id).desc())
+        ).all()
+        return dict(rows)
+
+    return {
+        "total": total,
+        "analyzed": analyzed,
+        "sentiment": counts(Record.sentiment),
+        "emotion": counts(Record.emotion),
+        "avg_confidence": (conf_sum or 0) / max(analyzed, 1),
+    }
+
+
+def generate_summary_text(stats: dict) -> str:
+    """Build a plain-text report summary from report_stats()."""
+    sentiment_counts = stats["sentiment"]
+    emotion_counts = stats["emotion"]
+    dominant_sentiment = next(iter(sentiment_counts), "N/A")
+    dominant_emotion = next(iter(emotion_counts), "N/A")
 
     lines = [
         "=" * 50,
         "  TWITTER SENTIMENT ANALYSIS — DATA DRIVEN EMOTION",
         "  Automated Report",
         "=" * 50,
-        f"  Total Records     : {total}",
-        f"  Analyzed Records  : {analyzed}",
+        f"  Total Records     : {stats['total']}",
+        f"  Analyzed Records  : {stats['analyzed']}",
         "",
         "  SENTIMENT DISTRIBUTION",
         f"  Positive  : {sentiment_counts.get('Positive', 0)}",
@@ -36,40 +80,109 @@ def generate_summary_text(records: list[Record]) -> str:
         f"  Dominant  : {dominant_sentiment}",
         "",
         "  EMOTION DISTRIBUTION",
-        *[f"  {e:12}: {c}" for e, c in emotion_counts.most_common()],
+        *[f"  {e:12}: {c}" for e, c in emotion_counts.items()],
         f"  Dominant  : {dominant_emotion}",
         "",
-        f"  AVG CONFIDENCE    : {avg_conf:.2%}",
+        f"  AVG CONFIDENCE    : {stats['avg_confidence']:.2%}",
         "=" * 50,
     ]
     return "\n".join(lines)
 
 
-def export_csv(session: Session) -> io.StringIO:
-    """Return a CSV StringIO of all records."""
-    import csv
+def export_rows(
+    format: str = "csv",
+    columns: Optional[list[str]] = None,
+    dataset: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    compress: bool = False,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> Iterator[bytes]:
+    """
+    Stream records as CSV or NDJSON (optionally gzip'ed), or as Parquet /
+    Arrow IPC (see columnar_service), in byte chunks.
+
+    Rows are read in keyset pages of EXPORT_PAGE_SIZE (WHERE id > last ORDER
+    BY id), each in its own short read, so memory stays flat, the first bytes
+    go out after one page whatever the table size, and no read transaction is
+    held open for the length of a slow download. The dataset's partitions are
+    resolved once up front, so a dataset swapped mid-export doesn't mix in.
+
+    Arguments are validated here (ValueError) before anything is streamed.
+    """
+    if format not in EXPORT_FORMATS + COLUMNAR_FORMATS:
+        raise ValueError(f"format must be one of {list(EXPORT_FORMATS + COLUMNAR_FORMATS)}.")
+    if format in COLUMNAR_FORMATS and compress:
+        raise ValueError(f"{format} exports are compressed already; gzip applies to csv / ndjson only.")
+    columns = list(columns or EXPORT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}; choose from {list(EXPORT_COLUMNS)}.")
+
+    with Session(engine) as session:
+        conditions = record_conditions(
+            session, dataset, sentiment=sentiment, emotion=emotion, min_confidence=min_confidence
+        )
+    fields = [getattr(Record, c) for c in columns]
+    if format in COLUMNAR_FORMATS:
+        return export_columnar(format, columns, conditions, check_cancelled)
+    return _export_chunks(format, columns, fields, conditions, compress, check_cancelled)
+
+
+def _export_chunks(format, columns, fields, conditions, compress, check_cancelled) -> Iterator[bytes]:
+    encode = _encoder(format, columns)
+    deflate = zlib.compressobj(wbits=31) if compress else None
+    chunk = encode(None)  # CSV header (empty for NDJSON)
+    for rows in record_pages(fields, conditions, page_size=EXPORT_PAGE_SIZE, check_cancelled=check_cancelled):
+        chunk += encode([r[1:] for r in rows])
+        if deflate:
+            # Sync-flush every page so the client gets bytes as soon as they exist
+            chunk = deflate.compress(chunk) + deflate.flush(zlib.Z_SYNC_FLUSH)
+        if chunk:
+            yield chunk
+        chunk = b""
+    if deflate:
+        chunk = deflate.compress(chunk) + deflate.flush()
+    if chunk:
+        yield chunk
+
+
+def _encoder(format: str, columns: list[str]) -> Callable[[Optional[list]], bytes]:
+    """Page → bytes for the given format; called with None for the preamble."""
+    if format == "ndjson":
+        def encode(rows):
+            if rows is None:
+                return b""
+            return "".join(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n" for row in rows
+            ).encode("utf-8")
+        return encode
 
-    records = session.exec(select(Record)).all()
     buf = io.StringIO()
     writer = csv.writer(buf)
-    writer.writerow(["id", "text", "clean_text", "sentiment", "emotion", "confidence", "created_at"])
-    for r in records:
-        writer.writerow([r.id, r.text, r.clean_text, r.sentiment, r.emotion, r.confidence, r.created_at])
-    buf.seek(0)
-    return buf
 
+    def encode(rows):
+        buf.seek(0)
+        buf.truncate()
+        if rows is None:
+            writer.writerow(columns)
+        else:
+            writer.writerows(rows)
+        return buf.getvalue().encode("utf-8")
+    return encode
 
-def export_pdf(session: Session) -> io.BytesIO:
-    """Return a PDF BytesIO report."""
+
+def render_pdf(stats: dict) -> bytes:
+    """Lay out the PDF report for report_stats()."""
     from reportlab.lib.pagesizes import letter
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
     from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib import colors
 
-    records = session.exec(select(Record)).all()
-    summary = generate_summary_text(records)
-    sentiment_counts = Counter(r.sentiment for r in records if r.sentiment)
-    emotion_counts = Counter(r.emotion for r in records if r.emotion)
+    summary = generate_summary_text(stats)
+    sentiment_counts = stats["sentiment"]
+    emotion_counts = stats["emotion"]
 
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=letter)
@@ -110,21 +223,82 @@ def export_pdf(session: Session) -> io.BytesIO:
     story.append(e)
 
     doc.build(story)
-    buf.seek(0)
-    return buf
+    return buf.getvalue()
+
+
+def pdf_report_path(dataset: Optional[str] = None, version: Optional[int] = None) -> str:
+    """Where the PDF for `dataset` at data version `version` (default: current) is cached."""
+    version = data_version(dataset) if version is None else version
+    return os.path.join(REPORT_CACHE_DIR, f"report-{_report_key(dataset)}-v{version}.pdf")
+
+
+def pdf_report_etag(path: str) -> str:
+    return '"' + os.path.basename(path)[:-4] + '"'
+
+
+def request_pdf_report(dataset: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """
+    (cached path, None) if the PDF for the current data version exists,
+    else (expected path, id of the job rendering it). The job id is derived
+    from the version, so concurrent requests — from any worker — share one
+    render instead of each building the document.
+    """
+    from services.job_service import FINISHED, scheduler
+    path = pdf_report_path(dataset)
+    if os.path.exists(path):
+        return path, None
+    params = {"format": "pdf", "dataset": dataset}
+    job_id = os.path.basename(path)[:-4]
+    job = scheduler.get(job_id)
+    if job is None:
+        try:
+            scheduler.submit("export", params, priority="high", job_id=job_id)
+        except IntegrityError:
+            pass  # another request submitted it first
+    elif job["status"] in FINISHED and not os.path.exists((job["result"] or {}).get("report") or path):
+        # Failed, or its file has since been pruned — render afresh
+        job_id = scheduler.submit("export", params, priority="high")
+    return path, job_id
+
+
+def render_pdf_report(dataset: Optional[str] = None) -> str:
+    """
+    Render the PDF report of `dataset` into the cache unless the current data
+    version is cached already; returns its path. Older versions are removed.
+    """
+    version = data_version(dataset)
+    path = pdf_report_path(dataset, version)
+    if os.path.exists(path):
+        return path
+    with Session(engine) as session:
+        stats = report_stats(session, dataset)
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(render_pdf(stats))
+    os.replace(tmp, path)
+    prefix = f"report-{_report_key(dataset)}-v"
+    for name in os.listdir(REPORT_CACHE_DIR):
+        if name.startswith(prefix) and name.endswith(".pdf") and name != os.path.basename(path):
+            os.remove(os.path.join(REPORT_CACHE_DIR, name))
+    logger.info(f"[REPORTS] Rendered {path} ({stats['total']} records).")
+    return path
+
+
+def _report_key(dataset: Optional[str]) -> str:
+    # Dataset names are free text; keep file names safe
+    return "all" if not dataset else hashlib.sha1(dataset.encode()).hexdigest()[:16]
 
 
-def get_summary(session: Session) -> dict:
+def get_summary(session: Session, dataset: Optional[str] = None) -> dict:
     """Return summary text + counts for the reports page."""
-    records = session.exec(select(Record)).all()
-    if not records:
+    stats = report_stats(session, dataset)
+    if not stats["total"]:
         return {"summary": "No data analyzed yet. Upload and run analysis first.", "counts": {}}
-    sentiment_counts = Counter(r.sentiment for r in records if r.sentiment)
-    emotion_counts = Counter(r.emotion for r in records if r.emotion)
     return {
-        "summary": generate_summary_text(records),
+        "summary": generate_summary_text(stats),
         "counts": {
-            "sentiment": dict(sentiment_counts),
-            "emotion": dict(emotion_counts),
+            "sentiment": stats["sentiment"],
+            "emotion": stats["emotion"],
         },
     }
@@ -0,0 +1,108 @@
+"""
+Response cache — serialized read-endpoint responses, keyed by data version.
+
+Every write path bumps the data version of the datasets it touches (see
+dataset_service.bump_data_version), so a response computed at version N stays
+valid until the version moves on. cached_response() keeps the encoded body of the
+latest version per (endpoint, parameters) in a small LRU and hands out a weak
+ETag derived from the key and version, which lets clients revalidate with
+If-None-Match and get a 304 without the server re-reading anything.
+
+Concurrent misses for the same key and version collapse into one computation
+(single-flight): the first caller computes, the others wait for its result.
+
+The cache is per process; the version lives in the database, so every worker
+sees the same ETag for the same data.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from responses import dumps
+from services.dataset_service import data_version
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# (endpoint, dataset, params) -> (version, body)
+_entries: "OrderedDict[tuple, tuple[int, bytes]]" = OrderedDict()
+# (endpoint, dataset, params, version) -> Future of the body, for computations in flight
+_in_flight: dict[tuple, Future] = {}
+_lock = threading.Lock()
+
+
+def cached_response(
+    request: Request,
+    endpoint: str,
+    compute: Callable[[], Any],
+    dataset: Optional[str] = None,
+    **params,
+) -> Response:
+    """
+    JSON response of `compute()` for the current data version of `dataset`
+    (of all data if None); `params` are the other request parameters that
+    change the result. A client whose ETag is still current gets a 304 straight
+    away — the ETag only depends on the key and version, so this holds even on
+    a worker that never computed the body.
+    """
+    key = (endpoint, dataset, tuple(sorted(params.items())))
+    version = data_version(dataset)
+    etag = _etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(_body(key, version, compute), media_type="application/json", headers=headers)
+
+
+def _body(key: tuple, version: int, compute: Callable[[], Any]) -> bytes:
+    """Cached body of `key` at `version`, computing it once however many callers ask at the same time."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] == version:
+            _entries.move_to_end(key)
+            return entry[1]
+        flight = _in_flight.get((*key, version))
+        if flight is None:
+            flight = _in_flight[(*key, version)] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return flight.result()
+
+    try:
+        body = dumps(compute())
+    except BaseException as e:
+        with _lock:
+            del _in_flight[(*key, version)]
+        flight.set_exception(e)
+        raise
+    with _lock:
+        del _in_flight[(*key, version)]
+        # A slow computation must not replace a newer version stored meanwhile
+        if key not in _entries or _entries[key][0] <= version:
+            _entries[key] = (version, body)
+            _entries.move_to_end(key)
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _entries.popitem(last=False)
+    flight.set_result(body)
+    return body
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists `etag` (weak comparison, as RFC 9110 asks for)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+def _etag(key: tuple, version: int) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return f'W/"{digest}-v{version}"'
@@ -0,0 +1,149 @@
+"""
+Search service — SQLite FTS5 full-text search over Record.text / clean_text.
+
+record_fts is an external-content FTS5 table: it stores only the inverted
+index and reads the text back from the record table. Triggers on record keep
+it in sync with every writer — file ingest, the stream's batched writer,
+preprocessing (which rewrites clean_text) and the purge of dropped partitions
+— inside the writer's own transaction. Label updates (sentiment / emotion)
+don't touch indexed columns and so don't touch the index.
+
+Queries use the FTS5 syntax as-is: words, "exact phrases", prefix*, AND / OR
+/ NOT, NEAR(...), and column filters (text: / clean_text:). Results are
+restricted to visible rows (and optionally labels) by joining record, ranked
+by bm25 and returned with a highlighted snippet.
+
+An index created over an existing table starts empty; ensure_search_index()
+queues a "reindex" job to fill it. Rebuild by hand with
+`python -m services.search_service rebuild`.
+"""
+import logging
+import os
+import sys
+from typing import Optional
+
+from sqlalchemy import column, literal_column, table, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, col, func, select
+
+from database.db import engine
+from models.data_models import Record
+from services.dataset_service import record_conditions
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "record_fts"
+SEARCH_MAX_LIMIT = 200
+SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))
+
+_DDL = [
+    # prefix= adds 2- and 3-character prefix indexes so short prefix* queries stay index lookups
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        text, clean_text, content='record', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS record_fts_insert AFTER INSERT ON record BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, text, clean_text) VALUES (new.id, new.text, new.clean_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS record_fts_delete AFTER DELETE ON record BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text, clean_text)
+        VALUES ('delete', old.id, old.text, old.clean_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS record_fts_update AFTER UPDATE OF text, clean_text ON record BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text, clean_text)
+        VALUES ('delete', old.id, old.text, old.clean_text);
+        INSERT INTO {SEARCH_TABLE}(rowid, text, clean_text) VALUES (new.id, new.text, new.clean_text);
+    END""",
+]
+
+_fts = table(SEARCH_TABLE, column("rowid"))
+_match_column = literal_column(SEARCH_TABLE)
+
+
+def ensure_search_index():
+    """Create the index and its triggers if missing; a new index over existing rows is filled by a job."""
+    if _create_search_index():
+        from services.job_service import scheduler
+        scheduler.submit("reindex", priority="low")
+        logger.info(f"[SEARCH] Created {SEARCH_TABLE}; indexing existing records in the background.")
+
+
+def _create_search_index() -> bool:
+    """Run the DDL; True if the index is new and there are records it doesn't cover yet."""
+    with engine.begin() as conn:
+        created = not conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+        ).first()
+        for ddl in _DDL:
+            conn.execute(text(ddl))
+        return created and conn.execute(text("SELECT 1 FROM record LIMIT 1")).first() is not None
+
+
+def rebuild_search_index() -> int:
+    """Re-read every record into the index (one transaction); returns the number of indexed rows."""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+        rows = conn.execute(text("SELECT COUNT(*) FROM record")).scalar_one()
+    logger.info(f"[SEARCH] Rebuilt {SEARCH_TABLE} over {rows} records.")
+    return rows
+
+
+def search_records(
+    session: Session,
+    query: str,
+    dataset: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    with_total: bool = False,
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+) -> dict:
+    """
+    Records matching the FTS5 `query`, best bm25 rank first, each with a
+    snippet of the best-matching column (matches wrapped in <mark>…</mark>;
+    the text itself is not HTML-escaped).
+    """
+    if not query.strip():
+        raise ValueError("q is required.")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    conditions = [
+        _match_column.op("MATCH")(query),
+        *record_conditions(session, dataset, sentiment=sentiment, emotion=emotion, min_confidence=min_confidence),
+    ]
+    rank = func.bm25(_match_column)
+    snippet = func.snippet(_match_column, -1, "<mark>", "</mark>", "…", SNIPPET_TOKENS)
+    matches = _fts.join(Record, col(Record.id) == _fts.c.rowid)
+    try:
+        rows = session.exec(
+            select(
+                Record.id, Record.text, Record.sentiment, Record.emotion, Record.confidence, Record.created_at,
+                rank.label("rank"), snippet.label("snippet"),
+            )
+            .select_from(matches)
+            .where(*conditions)
+            .order_by(rank)
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        total = (
+            session.exec(select(func.count()).select_from(matches).where(*conditions)).one()
+            if with_total else None
+        )
+    except OperationalError as e:
+        # FTS5 syntax errors surface as OperationalError
+        raise ValueError(f"Invalid search query: {e.orig}")
+    return {
+        "query": query,
+        "results": [{**row._asdict(), "rank": round(row.rank, 4)} for row in rows],
+        "total": total,
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m services.search_service rebuild")
+    logging.basicConfig(level=logging.INFO)
+    _create_search_index()
+    print(f"Indexed {rebuild_search_index()} records.")
@@ -2,9 +2,14 @@
 Sentiment service — loads the NLP pipeline and runs inference on DB records.
 Uses the existing nlp_pipeline module so model weights are reused.
 """
+from typing import Callable, Optional
+
 from sqlmodel import Session, select
 
+from database.labels import ensure_labels
 from models.data_models import Record
+from services.columnar_service import invalidate_snapshots
+from services.dataset_service import bump_data_version, record_filter
 from utils.text_cleaner import clean_text as _clean
 
 # Import classifier from existing pipeline (avoids rewriting the model)
@@ -16,34 +21,65 @@ except ImportError:
         return ("Neutral", 0.5)
 
 
-def run_sentiment_analysis(session: Session) -> dict:
+def run_sentiment_analysis(
+    session: Session,
+    progress_cb: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    dataset: Optional[str] = None,
+) -> dict:
     """
     Run sentiment inference on all Records and persist labels + confidence.
-    Preprocessing is run inline if clean_text is missing.
+    Preprocessing is run inline if clean_text is missing. Near-duplicates
+    (Record.duplicate_of) take the result of their representative, which
+    comes first in id order.
     """
-    records = session.exec(select(Record)).all()
+    records = session.exec(select(Record).where(record_filter(session, dataset)).order_by(Record.id)).all()
     if not records:
         return {"message": "No records. Upload and preprocess first.", "total": 0}
 
     counts: dict[str, int] = {}
     table = []
-    for record in records:
-        text = record.clean_text or _clean(record.text)
-        label, confidence = sentiment_classifier(text)
-        record.sentiment = label
-        record.confidence = round(float(confidence), 4)
-        session.add(record)
-        counts[label] = counts.get(label, 0) + 1
-        if len(table) < 100:
-            table.append({
-                "id": record.id,
-                "text": record.text,
-                "clean_text": record.clean_text,
-                "sentiment": label,
-                "confidence": round(float(confidence), 4),
-            })
-
-    session.commit()
+    # representative id -> (label, confidence)
+    results: dict[int, tuple] = {}
+    datasets = [dataset] if dataset else None
+    try:
+        for i, record in enumerate(records):
+            if record.duplicate_of in results:
+                label, confidence = results[record.duplicate_of]
+            else:
+                text = record.clean_text or _clean(record.text)
+                label, confidence = sentiment_classifier(text)
+                if record.duplicate_of is None:
+                    results[record.id] = (label, confidence)
+            record.sentiment = label
+            record.confidence = round(float(confidence), 4)
+            session.add(record)
+            counts[label] = counts.get(label, 0) + 1
+            if len(table) < 100:
+                table.append({
+                    "id": record.id,
+                    "text": record.text,
+                    "clean_text": record.clean_text,
+                    "sentiment": label,
+                    "confidence": round(float(confidence), 4),
+                })
+
+            # Chunked commit + progress / cancellation checkpoint. The version is
+            # bumped with every chunk, so a run cancelled part-way still invalidates caches
+            if (i + 1) % 500 == 0:
+                ensure_labels(session, "sentiment", counts)
+                bump_data_version(session, datasets, rewritten=True)
+                session.commit()
+                if progress_cb:
+                    progress_cb(int((i + 1) * 100 / len(records)))
+                if check_cancelled:
+                    check_cancelled()
+
+        ensure_labels(session, "sentiment", counts)
+        bump_data_version(session, datasets, rewritten=True)
+        session.commit()
+    finally:
+        invalidate_snapshots()
     return {"total": len(records), "counts": counts, "table": table}
 
 
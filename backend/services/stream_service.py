@@ -1,29 +1,52 @@
 """
 stream_service.py — Background real-time ingestion and analysis loop.
 
-Simulates a live social media feed by streaming one record every 2 seconds
-from a built-in data pool. Each record is:
+Streams records from a pluggable source (see stream_sources.py) — by default
+the built-in simulated data pool, one record every 2 seconds. The loop runs
+either at a fixed interval or at a target rate (records/sec) paced by a token
+bucket, and reports its achieved rate and lag. Each record is:
   1. Cleaned (NLP preprocessing)
   2. Sentiment classified
   3. Emotion detected
-  4. Stored in SQLite
-  5. Broadcast to all WebSocket clients
+  4. Queued for batched (write-behind) storage in SQLite
+  5. Broadcast to all WebSocket clients once its batch is committed, with
+     the id SQLite gave it
+Near-duplicates of recent records (see dedup_service.py) skip steps 2-3 and
+take the labels of their cluster's representative.
+
+Events go through the pub/sub broker (pubsub.py): the producer publishes each
+event once and every worker's subscriber fans it out to its own WebSocket
+clients. A broker lease makes sure only one worker runs the producer; stop
+requests and status are shared through broker state.
+
+Every broadcast event carries a monotonically increasing `seq`, and the
+broker's `epoch`, which names the numbering (it changes when seq starts over,
+e.g. after a restart). The last REPLAY_BUFFER_SIZE serialized events are kept
+in a ring buffer so new or reconnecting clients can be brought up to date
+without a database query.
 
 The stream can be started, paused, and stopped from the frontend via API.
 """
 import asyncio
 import json
 import logging
-import random
+import os
 import time
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
 from typing import Optional
 
 from sqlmodel import Session
 
 from database.db import engine
-from models.data_models import Record
 from nlp_pipeline import clean_text, sentiment_classifier, emotion_detector
+from pubsub import WORKER_ID, broker
+from services.dataset_service import STREAM_DATASET, drop_dataset, ensure_partition, list_datasets
+from services.dedup_service import DEDUP_ENABLED, NearDuplicateIndex, signature as minhash
+from services.record_writer import RecordWriter
+from services.stream_sources import StreamSource, build_source
+from services.window_analytics import WindowedAnalytics
 from ws_manager import manager
 
 logger = logging.getLogger(__name__)
@@ -130,18 +153,203 @@ TWEET_POOL = [
 # -------------------------------------------------------------------
 # Stream State
 # -------------------------------------------------------------------
+# True only in the worker that currently runs the producer loop
 _stream_running = False
 _stream_task: Optional[asyncio.Task] = None
+_keeper_task: Optional[asyncio.Task] = None
+_started_at_ts = 0.0
+# Dataset partition streamed records are appended to (resolved at start)
+_partition_id: Optional[str] = None
+# Near-duplicate clusters of that partition (dedup_service), when enabled
+_near_duplicates: Optional[NearDuplicateIndex] = None
 _session_stats = {
     "total": 0,
     "sentiment": {"Positive": 0, "Negative": 0, "Neutral": 0},
     "emotion": {},
     "started_at": None,
 }
+_pacing: dict = {}
+windows = WindowedAnalytics()
+
+# Replay ring buffer: (seq, serialized event) for the last N events
+REPLAY_BUFFER_SIZE = int(os.getenv("STREAM_REPLAY_BUFFER", "500"))
+_replay: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+_seq = 0
+
+# Push a "window_update" event to clients at most this often (seconds)
+WINDOW_PUSH_INTERVAL = 1.0
+_last_window_push = 0.0
+
+# Yield to the event loop at least this often when nothing else sleeps
+_YIELD_EVERY = 64
+
+# Cross-worker coordination (see pubsub.py)
+STREAM_LEASE = "stream_producer"
+LEASE_TTL = 5.0
+LEASE_RENEW_INTERVAL = 1.0
+CONTROL_KEY = "stream_control"
+STATUS_KEY = "stream_status"
+
+
+class TokenBucket:
+    """Token-bucket pacer: `rate` tokens/sec, bursts of up to `burst` records."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    # Shorter sleeps are dominated by timer resolution; let tokens pile up instead
+    MIN_SLEEP = 0.005
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(max((1 - self.tokens) / self.rate, self.MIN_SLEEP))
+
+
+class RateMeter:
+    """Achieved records/sec over a short sliding window of one-second slots."""
+
+    def __init__(self, window: int = 5):
+        self.slots: deque = deque(maxlen=window + 1)
+
+    def tick(self, now: float):
+        second = int(now)
+        if self.slots and self.slots[-1][0] == second:
+            self.slots[-1][1] += 1
+        else:
+            self.slots.append([second, 1])
+
+    def rate(self, now: float) -> float:
+        # Ignore the current, still-filling second
+        full = [n for sec, n in self.slots if sec < int(now)]
+        return round(sum(full) / len(full), 1) if full else 0.0
+
+
+async def _publish(event: dict):
+    """Publish an event through the broker; it comes back via _on_event with its seq."""
+    await broker.publish(event)
+
+
+async def _publish_written(events: list[dict]):
+    """Writer callback: announce a committed batch of records."""
+    for event in events:
+        await _publish(event)
+
+
+writer = RecordWriter(on_written=_publish_written)
+
+
+async def _on_event(seq: int, payload: str):
+    """Broker subscriber (runs in every worker): buffer for replay and fan out locally."""
+    global _seq
+    _seq = seq
+    _replay.append((seq, payload))
+    await manager.broadcast_text(payload)
+    if _stream_running:
+        return  # the producer already updated its own stats and windows
+    event = json.loads(payload)
+    if event.get("type") == "new_record":
+        _session_stats.update(event.get("stats") or {})
+        ts = datetime.fromisoformat(event["timestamp"]).replace(tzinfo=timezone.utc).timestamp()
+        windows.add(event["sentiment"], event["emotion"], event["confidence"], ts)
+        await _maybe_push_windows(time.time())
+
+
+async def _maybe_push_windows(now_ts: float):
+    global _last_window_push
+    if now_ts - _last_window_push >= WINDOW_PUSH_INTERVAL and manager.client_count:
+        # Window snapshots are idempotent, so they are neither sequenced nor replayed
+        _last_window_push = now_ts
+        await manager.broadcast({"type": "window_update", **windows.snapshot(now=now_ts)})
+
+
+broker.subscribe(_on_event)
+
+
+async def start_pubsub():
+    """Start the broker subscription (called once per worker on startup)."""
+    await broker.start(backlog=REPLAY_BUFFER_SIZE)
 
 
-def get_session_stats() -> dict:
-    return dict(_session_stats)
+async def stop_pubsub():
+    if _stream_running:
+        await stop_stream()
+    await broker.close()
+
+
+def current_seq() -> int:
+    return _seq
+
+
+def current_epoch() -> str:
+    return broker.epoch
+
+
+def replay_since(since: Optional[int] = None, epoch: Optional[str] = None) -> tuple[list[str], bool, bool]:
+    """
+    Serialized events newer than `since` (all buffered events when None),
+    whether events after `since` have already fallen out of the buffer (a gap
+    the client cannot fill from here), and whether `since` was ignored because
+    it belongs to another numbering: `epoch` isn't the current one or, for
+    clients that don't send it, `since` is ahead of the current seq.
+    """
+    reset = since is not None and (epoch != broker.epoch if epoch else since > _seq)
+    if reset:
+        since = None
+    if not _replay:
+        return [], False, reset
+    oldest = _replay[0][0]
+    if since is None:
+        return [p for _, p in _replay], False, reset
+    truncated = since + 1 < oldest
+    if since >= _replay[-1][0]:
+        return [], False, False
+    # seq numbers are contiguous inside the buffer, so slice instead of scanning
+    start = max(0, since + 1 - oldest)
+    return [p for _, p in islice(_replay, start, None)], truncated, False
+
+
+def latest_window_snapshot() -> dict:
+    return windows.snapshot()
+
+
+async def get_session_stats() -> dict:
+    if not _stream_running and await is_running():
+        # Another worker is producing — report its last published status
+        shared = await broker.get_state(STATUS_KEY)
+        if shared:
+            return {**shared["stats"], "pacing": shared["pacing"], "producer": shared["worker"]}
+    return {**_session_stats, "pacing": get_pacing_stats()}
+
+
+def get_pacing_stats() -> dict:
+    """Target vs achieved rate and lag of the running stream."""
+    if not _pacing:
+        return {}
+    now = time.monotonic()
+    source: StreamSource = _pacing["source"]
+    lag = source.lag_seconds()
+    if lag is None and _pacing["target_rate"]:
+        # Records we should have emitted by now but have not, expressed in seconds
+        expected = (now - _pacing["started"]) * _pacing["target_rate"]
+        lag = round(max(0.0, expected - _pacing["processed"]) / _pacing["target_rate"], 3)
+    return {
+        "mode": _pacing["mode"],
+        "interval": _pacing["interval"],
+        "target_rate": _pacing["target_rate"],
+        "achieved_rate": _pacing["meter"].rate(now),
+        "processed": _pacing["processed"],
+        "lag_seconds": lag,
+        **source.describe(),
+    }
 
 
 def reset_session_stats(clear_db: bool = False):
@@ -152,20 +360,33 @@ def reset_session_stats(clear_db: bool = False):
         "emotion": {},
         "started_at": None,
     }
+    windows.reset()
+    _replay.clear()
     if clear_db:
         delete_all_records()
 
 
 def delete_all_records():
-    """Wipe all records from the database table."""
-    from sqlmodel import delete
+    """Drop every dataset; rows disappear from reads at once and are purged in the background."""
+    global _partition_id, _near_duplicates
+    writer.discard()
     with Session(engine) as session:
-        session.exec(delete(Record))
-        session.commit()
+        for dataset in list_datasets(session):
+            drop_dataset(session, dataset["name"])
+        if _stream_running:
+            _partition_id = ensure_partition(session, STREAM_DATASET)
+            if _near_duplicates is not None:
+                _near_duplicates = NearDuplicateIndex()
     logger.info("[DATABASE] All records cleared.")
 
 
-def is_running() -> bool:
+async def is_running() -> bool:
+    """True if any worker is running the stream producer."""
+    return _stream_running or await broker.lease_holder(STREAM_LEASE) is not None
+
+
+def is_producer() -> bool:
+    """True if this worker is the one running the producer loop."""
     return _stream_running
 
 
@@ -173,92 +394,185 @@ async def _process_and_broadcast(text: str):
     """Run the full NLP pipeline on one text and broadcast the result."""
     # 1. Clean
     clean = clean_text(text)
-    # 2. Sentiment
-    sentiment, confidence = sentiment_classifier(clean or text)
-    # 3. Emotion
-    emotion = emotion_detector(clean or text)
-    # 4. Persist
-    record = Record(
-        raw_text=text,
-        clean_text=clean,
-        sentiment=sentiment,
-        emotion=emotion,
-        confidence=confidence,
-        created_at=datetime.utcnow(),
-    )
-    with Session(engine) as session:
-        session.add(record)
-        session.commit()
-        session.refresh(record)
-        record_id = record.id
+    # A near-duplicate of a recent record reuses its labels instead of steps 2-3
+    signature = minhash(clean) if _near_duplicates is not None else None
+    cluster = _near_duplicates.match(signature) if signature is not None else None
+    if cluster is not None:
+        sentiment, confidence, emotion = cluster.sentiment, cluster.confidence, cluster.emotion
+    else:
+        # 2. Sentiment
+        sentiment, confidence = sentiment_classifier(clean or text)
+        # 3. Emotion
+        emotion = emotion_detector(clean or text)
+    # 4. Persist (write-behind — the writer flushes in batches)
+    now = datetime.utcnow()
+    row = {
+        "dataset_id": _partition_id,
+        "text": text,
+        "clean_text": clean,
+        "sentiment": sentiment,
+        "emotion": emotion,
+        "confidence": confidence,
+        "created_at": now,
+    }
+    if cluster is None and signature is not None:
+        row["cluster"] = _near_duplicates.add(signature, sentiment, emotion, confidence, founder=row)
+    else:
+        row["cluster"] = cluster
 
     # 5. Update session stats
     _session_stats["total"] += 1
     _session_stats["sentiment"][sentiment] = _session_stats["sentiment"].get(sentiment, 0) + 1
     _session_stats["emotion"][emotion] = _session_stats["emotion"].get(emotion, 0) + 1
+    now_ts = time.time()
+    windows.add(sentiment, emotion, confidence, now_ts)
 
-    # 6. Broadcast
-    payload = {
+    # 6. Broadcast — the writer publishes the event, with the record's id, once the row is committed
+    event = {
         "type": "new_record",
-        "id": record_id,
         "text": text[:120],
         "clean_text": clean[:120] if clean else "",
         "sentiment": sentiment,
         "confidence": round(confidence, 3),
         "emotion": emotion,
-        "timestamp": datetime.utcnow().isoformat(),
+        "duplicate": cluster is not None,
+        "timestamp": now.isoformat(),
         "stats": {
             "total": _session_stats["total"],
             "sentiment": _session_stats["sentiment"],
             "emotion": _session_stats["emotion"],
         },
     }
-    await manager.broadcast(payload)
-    logger.info(f"[STREAM] #{_session_stats['total']} | {sentiment} ({confidence:.2f}) | {emotion}")
+    writer.submit(row, event)
+    await _maybe_push_windows(now_ts)
+    logger.debug(f"[STREAM] #{_session_stats['total']} | {sentiment} ({confidence:.2f}) | {emotion}")
 
 
-async def _stream_loop(interval: float = 2.0):
-    """Core loop: pick a random tweet, process it, sleep, repeat."""
-    global _stream_running
-    pool = list(TWEET_POOL)
-    random.shuffle(pool)
-    idx = 0
-    while _stream_running:
-        text = pool[idx % len(pool)]
-        idx += 1
-        # Re-shuffle when we've gone through the whole pool
-        if idx % len(pool) == 0:
-            random.shuffle(pool)
-        try:
-            await _process_and_broadcast(text)
-        except Exception as e:
-            logger.error(f"[STREAM] Error processing record: {e}")
-        await asyncio.sleep(interval)
+async def _stream_loop(source: StreamSource, interval: float, rate: Optional[float]):
+    """Core loop: pull from the source, process, pace, repeat."""
+    global _stream_task
+    bucket = TokenBucket(rate) if rate else None
+    meter: RateMeter = _pacing["meter"]
+    exhausted = False
+    try:
+        async for item in source.items():
+            if not _stream_running:
+                break
+            if bucket:
+                await bucket.acquire()
+            try:
+                await _process_and_broadcast(item.text)
+            except Exception as e:
+                logger.error(f"[STREAM] Error processing record: {e}")
+            _pacing["processed"] += 1
+            meter.tick(time.monotonic())
+            if bucket is None and source.paced:
+                await asyncio.sleep(interval)
+            elif _pacing["processed"] % _YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        else:
+            exhausted = True
+    except Exception as e:
+        logger.error(f"[STREAM] Source '{source.name}' failed: {e}")
+        exhausted = True
+    finally:
+        await source.close()
     logger.info("[STREAM] Loop exited cleanly.")
+    if exhausted and _stream_running:
+        # Finite source (e.g. a replay file) ran out — stop without cancelling ourselves
+        _stream_task = None
+        await stop_stream()
 
 
-async def start_stream(interval: float = 2.0):
-    global _stream_running, _stream_task
-    if _stream_running:
+async def _lease_keeper():
+    """Renew the producer lease, publish status for other workers, and honour remote stop requests."""
+    global _keeper_task
+    while _stream_running:
+        await asyncio.sleep(LEASE_RENEW_INTERVAL)
+        control = await broker.get_state(CONTROL_KEY)
+        lost = not await broker.acquire_lease(STREAM_LEASE, LEASE_TTL)
+        if lost or (control and control.get("command") == "stop" and control.get("at", 0) >= _started_at_ts):
+            if lost:
+                logger.error("[STREAM] Producer lease lost — stopping this producer.")
+            # Stop without cancelling ourselves
+            _keeper_task = None
+            await stop_stream()
+            return
+        await broker.set_state(STATUS_KEY, {
+            "worker": WORKER_ID,
+            "stats": _session_stats,
+            "pacing": get_pacing_stats(),
+        })
+
+
+async def start_stream(
+    interval: float = 2.0,
+    rate: Optional[float] = None,
+    source: str = "pool",
+    **source_opts,
+):
+    """
+    Start the stream (in this worker, unless another worker already produces).
+
+    interval – seconds between records when no target rate is given
+    rate     – target records/sec (token-bucket paced); overrides interval
+    source   – pool | file | stdin | socket (extra options go to the source)
+    """
+    global _stream_running, _stream_task, _keeper_task, _pacing, _started_at_ts, _partition_id, _near_duplicates
+    if await is_running():
+        return {"status": "already_running"}
+    src = build_source(source, TWEET_POOL, **source_opts)
+    # The lease is per worker, so a concurrent start in this one must be caught here
+    if not await broker.acquire_lease(STREAM_LEASE, LEASE_TTL) or _stream_running:
+        await src.close()
         return {"status": "already_running"}
     _stream_running = True
+    _started_at_ts = time.time()
+    await broker.set_state(CONTROL_KEY, None)
     _session_stats["started_at"] = datetime.utcnow().isoformat()
-    _stream_task = asyncio.create_task(_stream_loop(interval))
-    logger.info(f"[STREAM] Started (interval={interval}s).")
-    await manager.broadcast({"type": "stream_started", "interval": interval})
-    return {"status": "started"}
+    _pacing = {
+        "mode": "rate" if rate else ("interval" if src.paced else "source"),
+        "interval": interval,
+        "target_rate": rate,
+        "processed": 0,
+        "started": time.monotonic(),
+        "meter": RateMeter(),
+        "source": src,
+    }
+    with Session(engine) as session:
+        _partition_id = ensure_partition(session, STREAM_DATASET)
+    if DEDUP_ENABLED:
+        _near_duplicates = await asyncio.to_thread(NearDuplicateIndex.for_partition, _partition_id)
+    writer.start()
+    _stream_task = asyncio.create_task(_stream_loop(src, interval, rate))
+    _keeper_task = asyncio.create_task(_lease_keeper())
+    logger.info(f"[STREAM] Started (source={source}, interval={interval}s, rate={rate}, worker={WORKER_ID}).")
+    await _publish({"type": "stream_started", "interval": interval, "rate": rate, "source": source})
+    return {"status": "started", "pacing": get_pacing_stats()}
 
 
 async def stop_stream():
-    global _stream_running, _stream_task
+    global _stream_running, _stream_task, _keeper_task
     if not _stream_running:
-        return {"status": "not_running"}
+        if await broker.lease_holder(STREAM_LEASE) is None:
+            return {"status": "not_running"}
+        # The producer lives in another worker — ask it to stop and wait briefly
+        await broker.set_state(CONTROL_KEY, {"command": "stop", "at": time.time(), "by": WORKER_ID})
+        for _ in range(int(3 * LEASE_TTL / LEASE_RENEW_INTERVAL)):
+            await asyncio.sleep(LEASE_RENEW_INTERVAL / 2)
+            if await broker.lease_holder(STREAM_LEASE) is None:
+                return {"status": "stopped"}
+        return {"status": "stopping"}
     _stream_running = False
-    if _stream_task:
-        _stream_task.cancel()
-        _stream_task = None
+    for task in (_stream_task, _keeper_task):
+        if task:
+            task.cancel()
+    _stream_task = _keeper_task = None
+    await writer.stop()
+    await broker.release_lease(STREAM_LEASE)
+    await broker.set_state(STATUS_KEY, None)
     logger.info("[STREAM] Stopped.")
-    await manager.broadcast({"type": "stream_stopped"})
+    await _publish({"type": "stream_stopped"})
     return {"status": "stopped"}
 
 
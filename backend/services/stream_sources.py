@@ -0,0 +1,350 @@
+"""
+stream_sources.py — Pluggable inputs for the real-time stream loop.
+
+A source is an async iterator of StreamItem objects. The loop in
+stream_service decides how fast to pull from it (fixed interval or a
+token-bucket target rate) unless the source is self-paced, i.e. it already
+releases items on its own schedule (timestamp-faithful replay, live feeds).
+
+Available sources:
+  pool    – the built-in simulated TWEET_POOL (default)
+  file    – CSV / NDJSON replay, at the loop's rate or timestamp-faithful
+  stdin   – newline-delimited feed on the process' standard input
+  socket  – newline-delimited feed on a Unix domain socket
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import stat
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REPLAY_DIR = os.getenv("STREAM_REPLAY_DIR", "./replay")
+SOCKET_PATH = os.getenv("STREAM_SOCKET_PATH", "/tmp/dde_stream.sock")
+FEED_QUEUE_SIZE = 10_000
+
+TEXT_FIELDS = ["content", "text", "tweet", "tweet_text", "body"]
+TIMESTAMP_FIELDS = ["timestamp", "created_at", "date", "time"]
+
+
+@dataclass
+class StreamItem:
+    text: str
+    timestamp: Optional[datetime] = None
+
+
+class StreamSource(ABC):
+    """Base class — subclasses implement items()."""
+
+    name = "base"
+    # False when the source releases items on its own schedule
+    paced = True
+
+    @abstractmethod
+    def items(self) -> AsyncIterator[StreamItem]:
+        """Async iterator over the source's items (usually an async generator)."""
+
+    def lag_seconds(self) -> Optional[float]:
+        """How far behind its own schedule a self-paced source is (None if not applicable)."""
+        return None
+
+    async def close(self):
+        pass
+
+    def describe(self) -> dict:
+        return {"source": self.name}
+
+
+# ── Built-in pool ─────────────────────────────────────────────────────────────
+
+class PoolSource(StreamSource):
+    """Endless shuffled cycle through an in-memory list of texts."""
+
+    name = "pool"
+
+    def __init__(self, pool: List[str]):
+        self.pool = list(pool)
+
+    async def items(self) -> AsyncIterator[StreamItem]:
+        pool = list(self.pool)
+        random.shuffle(pool)
+        idx = 0
+        while True:
+            yield StreamItem(pool[idx % len(pool)])
+            idx += 1
+            # Re-shuffle when we've gone through the whole pool
+            if idx % len(pool) == 0:
+                random.shuffle(pool)
+
+
+# ── File replay ───────────────────────────────────────────────────────────────
+
+class FileReplaySource(StreamSource):
+    """
+    Replay a CSV or NDJSON file row by row without loading it into memory.
+
+    With timestamp_faithful=True items are released following the gaps between
+    their original timestamps, divided by `speed` (2.0 = twice as fast).
+    Otherwise the loop's own rate control applies.
+    """
+
+    name = "file"
+
+    def __init__(
+        self,
+        path: str,
+        fmt: Optional[str] = None,
+        text_field: Optional[str] = None,
+        timestamp_field: Optional[str] = None,
+        timestamp_faithful: bool = False,
+        speed: float = 1.0,
+        loop: bool = False,
+    ):
+        self.path = resolve_replay_path(path)
+        self.fmt = fmt or ("ndjson" if self.path.lower().endswith((".ndjson", ".jsonl", ".json")) else "csv")
+        if self.fmt not in ("csv", "ndjson"):
+            raise ValueError("Replay format must be 'csv' or 'ndjson'.")
+        self.text_field = text_field
+        self.timestamp_field = timestamp_field
+        self.timestamp_faithful = timestamp_faithful
+        self.paced = not timestamp_faithful
+        self.speed = max(speed, 1e-6)
+        self.loop = loop
+        self._lag = 0.0
+
+    def _rows(self) -> Iterator[dict]:
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            if self.fmt == "csv":
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        obj = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(obj, dict):
+                        yield obj
+
+    def _pick(self, row: dict, explicit: Optional[str], candidates: List[str]) -> Optional[str]:
+        if explicit:
+            return explicit if explicit in row else None
+        for c in candidates:
+            if c in row:
+                return c
+        return None
+
+    async def items(self) -> AsyncIterator[StreamItem]:
+        while True:
+            t0_wall: Optional[float] = None
+            t0_event: Optional[datetime] = None
+            text_key = ts_key = None
+            for n, row in enumerate(self._rows()):
+                if text_key is None:
+                    text_key = self._pick(row, self.text_field, TEXT_FIELDS)
+                    ts_key = self._pick(row, self.timestamp_field, TIMESTAMP_FIELDS)
+                    if text_key is None:
+                        raise ValueError(f"No text field found in {self.path}.")
+                text = str(row.get(text_key) or "").strip()
+                if not text:
+                    continue
+                ts = _parse_timestamp(row.get(ts_key)) if ts_key else None
+
+                if self.timestamp_faithful and ts is not None:
+                    if t0_event is None:
+                        t0_wall, t0_event = time.monotonic(), ts
+                    due = t0_wall + (ts - t0_event).total_seconds() / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                        self._lag = 0.0
+                    else:
+                        self._lag = -delay
+                elif n % 256 == 0:
+                    # Unpaced replay still has to let the event loop breathe
+                    await asyncio.sleep(0)
+                yield StreamItem(text, ts)
+            if not self.loop:
+                logger.info(f"[STREAM] Replay of {self.path} finished.")
+                return
+
+    def lag_seconds(self) -> Optional[float]:
+        return round(self._lag, 3) if self.timestamp_faithful else None
+
+    def describe(self) -> dict:
+        return {
+            "source": self.name,
+            "path": self.path,
+            "format": self.fmt,
+            "timestamp_faithful": self.timestamp_faithful,
+            "speed": self.speed,
+            "loop": self.loop,
+        }
+
+
+# ── Live line feeds (stdin / Unix socket) ─────────────────────────────────────
+
+class _LineFeedSource(StreamSource):
+    """Shared logic for feeds that deliver one text (or JSON object) per line."""
+
+    paced = False
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+
+    async def _pump(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            item = _parse_feed_line(line.decode("utf-8", errors="replace"))
+            if item:
+                await self._queue.put(item)
+
+    def lag_seconds(self) -> Optional[float]:
+        # No schedule to lag behind; expose the backlog instead via describe()
+        return None
+
+    def describe(self) -> dict:
+        return {"source": self.name, "backlog": self._queue.qsize()}
+
+
+class StdinSource(_LineFeedSource):
+    name = "stdin"
+
+    async def items(self) -> AsyncIterator[StreamItem]:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=1 << 20)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        pump = asyncio.create_task(self._pump(reader))
+        try:
+            while not (pump.done() and self._queue.empty()):
+                try:
+                    yield await asyncio.wait_for(self._queue.get(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            pump.cancel()
+
+
+class UnixSocketSource(_LineFeedSource):
+    """Listens on a Unix socket; any number of producers may connect and write lines."""
+
+    name = "socket"
+
+    def __init__(self, path: str = SOCKET_PATH):
+        super().__init__()
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await self._pump(reader)
+        finally:
+            writer.close()
+
+    async def items(self) -> AsyncIterator[StreamItem]:
+        _unlink_socket(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=1 << 20)
+        logger.info(f"[STREAM] Listening for feed lines on unix:{self.path}")
+        try:
+            while True:
+                yield await self._queue.get()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+            _unlink_socket(self.path)
+
+    def describe(self) -> dict:
+        return {**super().describe(), "path": self.path}
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def resolve_replay_path(path: str) -> str:
+    """Resolve `path` inside REPLAY_DIR, refusing anything that escapes it."""
+    base = os.path.realpath(REPLAY_DIR)
+    full = os.path.realpath(os.path.join(base, path))
+    if os.path.commonpath([base, full]) != base:
+        raise ValueError("Replay files must live inside the replay directory.")
+    if not os.path.isfile(full):
+        raise ValueError(f"Replay file not found: {path}")
+    return full
+
+
+def _unlink_socket(path: str):
+    """Remove a stale socket file — never anything else that happens to live at `path`."""
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+
+
+def _parse_feed_line(line: str) -> Optional[StreamItem]:
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            return StreamItem(line)
+        for key in TEXT_FIELDS:
+            if obj.get(key):
+                ts = next((obj[k] for k in TIMESTAMP_FIELDS if obj.get(k)), None)
+                return StreamItem(str(obj[key]), _parse_timestamp(ts))
+        return None
+    return StreamItem(line)
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value / 1000 if value > 1e11 else value)
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    # Twitter API v1 style: "Wed Oct 10 20:19:24 +0000 2018"
+    try:
+        return datetime.strptime(value, "%a %b %d %H:%M:%S %z %Y").replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def build_source(kind: str, pool: List[str], **opts) -> StreamSource:
+    """Factory used by stream_service.start_stream."""
+    if kind == "pool":
+        return PoolSource(pool)
+    if kind == "file":
+        if not opts.get("path"):
+            raise ValueError("A 'path' is required for file replay.")
+        return FileReplaySource(
+            opts["path"],
+            fmt=opts.get("fmt"),
+            text_field=opts.get("text_field"),
+            timestamp_field=opts.get("timestamp_field"),
+            timestamp_faithful=bool(opts.get("timestamp_faithful")),
+            speed=opts.get("speed") or 1.0,
+            loop=bool(opts.get("loop")),
+        )
+    if kind == "stdin":
+        return StdinSource()
+    if kind == "socket":
+        return UnixSocketSource()
+    raise ValueError(f"Unknown stream source '{kind}'.")
@@ -0,0 +1,434 @@
+"""
+Upload service — chunked, resumable uploads for very large files.
+
+Protocol (see routes/upload.py):
+  1. create  – POST /api/upload/sessions → upload_id
+  2. chunks  – PUT  /api/upload/sessions/{id}?offset=N, raw bytes as the body,
+               optionally Content-Encoding: gzip | zstd and X-Chunk-SHA256
+               (hex digest of the body as sent)
+  3. status  – GET  /api/upload/sessions/{id} → bytes received so far; a
+               client that lost its connection resumes from there
+  4. complete – POST /api/upload/sessions/{id}/complete (optional whole-file sha256)
+
+Chunks are decoded and written into UPLOAD_DIR part by part as the request
+body arrives, fsync'ed, and only then counted as received, so `received`
+always describes bytes that are on disk and a chunk is never held in memory.
+A chunk must start at or before `received`; bytes already received are never
+rewritten, so re-sending a chunk is harmless.
+
+With analyze_early=True the ingest job starts immediately and reads the
+upload through open_upload(), which serves the received prefix and waits for
+more until the session is completed — transfer and analysis overlap.
+"""
+import hashlib
+import io
+import logging
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlmodel import Session, col, delete, func, select, update
+
+from database.db import engine
+from models.data_models import UploadSession
+from services.file_service import UNSUPPORTED_FORMAT, is_streamable, is_supported
+from services.job_service import UPLOAD_DIR, scheduler
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_CHUNK = int(os.getenv("UPLOAD_MAX_CHUNK", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+# An early-started ingest gives up if no chunk arrives for this long
+UPLOAD_STALL_TIMEOUT = int(os.getenv("UPLOAD_STALL_TIMEOUT", "3600"))
+CHUNK_SIZE_HINT = 8 * 1024 * 1024
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_DECODE_BLOCK = 1 << 20
+_DECODE_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class ChunkTooLarge(ValueError):
+    """A chunk, as sent or decoded, larger than UPLOAD_MAX_CHUNK."""
+
+
+class ChunkRejected(ValueError):
+    """A chunk that does not fit the session (bad offset, session closed, …)."""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+def upload_path(upload_id: str, filename: str) -> str:
+    return os.path.join(UPLOAD_DIR, upload_id + os.path.splitext(filename)[1].lower())
+
+
+def create_session(
+    filename: str,
+    size: Optional[int] = None,
+    dataset: str = "default",
+    mode: str = "replace",
+    priority: str = "normal",
+    analyze_early: bool = False,
+    sheet: Optional[str] = None,
+    text_column: Optional[str] = None,
+) -> dict:
+    if not is_supported(filename):
+        raise ValueError(UNSUPPORTED_FORMAT)
+    if analyze_early and not is_streamable(filename):
+        raise ValueError("Early analysis is only supported for CSV, TSV and NDJSON uploads (optionally gzip/bz2/zstd).")
+    if size is not None and size < 0:
+        raise ValueError("size must be >= 0.")
+    upload = UploadSession(
+        id=str(uuid.uuid4()), filename=filename, size=size,
+        dataset=dataset, mode=mode, priority=priority, analyze_early=analyze_early,
+        sheet=sheet, text_column=text_column,
+    )
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    open(upload_path(upload.id, filename), "wb").close()
+    out = _session_dict(upload)
+    with Session(engine) as session:
+        session.add(upload)
+        session.commit()
+    if analyze_early:
+        _submit_ingest(out)
+    logger.info(f"[UPLOAD] Session {out['upload_id']} opened for '{filename}' (early analysis: {analyze_early}).")
+    return out
+
+
+def get_session(upload_id: str) -> Optional[dict]:
+    with Session(engine) as session:
+        upload = session.get(UploadSession, upload_id)
+        return _session_dict(upload) if upload else None
+
+
+def open_chunk(
+    upload_id: str,
+    offset: int,
+    encoding: Optional[str] = None,
+    checksum: Optional[str] = None,
+) -> Optional["ChunkWriter"]:
+    """Start writing one chunk at `offset`. Returns None if the upload is unknown."""
+    upload = get_session(upload_id)
+    if upload is None:
+        return None
+    if upload["status"] != "open":
+        raise ChunkRejected(f"Upload is {upload['status']}.", upload["received"])
+    if offset > upload["received"]:
+        raise ChunkRejected("Chunk offset is past the received prefix; resume from 'received'.", upload["received"])
+    return ChunkWriter(upload, offset, encoding, checksum)
+
+
+class ChunkWriter:
+    """
+    One chunk on its way to disk: write() the body part by part as it arrives,
+    then finish() to verify it and count it as received. Decoded bytes go
+    straight to the session file at offset + written. Bytes that were already
+    received when the chunk started are never rewritten, so a corrupt or
+    re-sent chunk cannot damage the acknowledged prefix.
+    """
+
+    def __init__(self, upload: dict, offset: int, encoding: Optional[str], checksum: Optional[str]):
+        self.upload_id = upload["upload_id"]
+        self.offset = offset
+        self.written = 0
+        self._size = upload["size"]
+        self._floor = upload["received"]
+        self._sent = 0
+        self._checksum = checksum.lower() if checksum else None
+        self._digest = hashlib.sha256()
+        self._decoder = _Decoder(encoding, self._put)
+        self._file = open(upload_path(self.upload_id, upload["filename"]), "r+b")
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, part: bytes):
+        self._sent += len(part)
+        if self._sent > UPLOAD_MAX_CHUNK:
+            raise ChunkTooLarge(f"Chunks may not exceed {UPLOAD_MAX_CHUNK} bytes.")
+        self._digest.update(part)
+        self._decoder.write(part)
+        self._file.flush()
+
+    def finish(self) -> dict:
+        """Verify and fsync the chunk, then advance `received`. Returns the updated session."""
+        self._decoder.finish()
+        if self._checksum and self._digest.hexdigest() != self._checksum:
+            raise ValueError("Chunk checksum mismatch.")
+        # Bytes hit the disk before they are counted as received
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        end = self.offset + self.written
+        with Session(engine) as session:
+            accepted = session.exec(
+                update(UploadSession)
+                .where(
+                    UploadSession.id == self.upload_id,
+                    UploadSession.status == "open",
+                    col(UploadSession.received) >= self.offset,
+                )
+                .values(received=func.max(UploadSession.received, end), updated_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+        upload = get_session(self.upload_id)
+        if not accepted:
+            raise ChunkRejected("Chunk was not accepted; resume from 'received'.", upload["received"])
+        return upload
+
+    def close(self):
+        self._file.close()
+
+    def _put(self, data: bytes):
+        if not data:
+            return
+        start = self.offset + self.written
+        self.written += len(data)
+        if self.written > UPLOAD_MAX_CHUNK:
+            raise ChunkTooLarge(f"Chunks may not exceed {UPLOAD_MAX_CHUNK} bytes.")
+        if self._size is not None and start + len(data) > self._size:
+            raise ValueError("Chunk extends past the declared upload size.")
+        skip = max(self._floor - start, 0)
+        if skip < len(data):
+            self._file.seek(start + skip)
+            self._file.write(memoryview(data)[skip:])
+
+
+def complete_session(upload_id: str, sha256: Optional[str] = None) -> Optional[dict]:
+    """Seal the upload and (unless analysis already started) queue its ingest job."""
+    upload = get_session(upload_id)
+    if upload is None:
+        return None
+    if upload["status"] != "open":
+        raise ChunkRejected(f"Upload is {upload['status']}.", upload["received"])
+    if upload["size"] is not None and upload["received"] != upload["size"]:
+        raise ChunkRejected(
+            f"Only {upload['received']} of {upload['size']} bytes received.", upload["received"]
+        )
+
+    path = upload_path(upload_id, upload["filename"])
+    with open(path, "r+b") as f:
+        # Drop bytes past the prefix left by a chunk that was written but never acknowledged
+        f.truncate(upload["received"])
+    if sha256 and sha256_file(path) != sha256.lower():
+        raise ValueError("File checksum mismatch; re-send the affected chunks and complete again.")
+
+    with Session(engine) as session:
+        session.exec(
+            update(UploadSession)
+            .where(UploadSession.id == upload_id)
+            .values(status="complete", size=upload["received"], updated_at=datetime.utcnow())
+        )
+        session.commit()
+    upload = get_session(upload_id)
+    if not upload["analyze_early"]:
+        _submit_ingest(upload)
+    logger.info(f"[UPLOAD] Session {upload_id} complete ({upload['received']} bytes).")
+    return upload
+
+
+def abort_session(upload_id: str) -> bool:
+    upload = get_session(upload_id)
+    if upload is None:
+        return False
+    with Session(engine) as session:
+        session.exec(
+            update(UploadSession)
+            .where(UploadSession.id == upload_id)
+            .values(status="aborted", updated_at=datetime.utcnow())
+        )
+        session.commit()
+    if upload["analyze_early"] or upload["status"] == "complete":
+        scheduler.cancel(upload_id)
+    path = upload_path(upload_id, upload["filename"])
+    if upload["status"] != "complete" and os.path.exists(path):
+        os.remove(path)
+    return True
+
+
+def expire_sessions() -> int:
+    """Abort uploads idle for UPLOAD_SESSION_TTL and forget old closed sessions."""
+    cutoff = datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_TTL)
+    with Session(engine) as session:
+        idle = session.exec(
+            select(UploadSession.id).where(UploadSession.status == "open", col(UploadSession.updated_at) < cutoff)
+        ).all()
+    for upload_id in idle:
+        abort_session(upload_id)
+    with Session(engine) as session:
+        session.exec(
+            delete(UploadSession).where(UploadSession.status != "open", col(UploadSession.updated_at) < cutoff)
+        )
+        session.commit()
+    if idle:
+        logger.info(f"[UPLOAD] Aborted {len(idle)} idle upload sessions.")
+    return len(idle)
+
+
+class GrowingUpload(io.RawIOBase):
+    """
+    Raw, read-only stream over an upload that may still be receiving chunks.
+    Reads never go past `received`; at the end of the prefix they wait for
+    more data until the session is completed (then EOF) or aborted (error).
+    Use open_upload() for a buffered reader.
+    """
+
+    def __init__(
+        self,
+        upload_id: str,
+        check_cancelled: Optional[Callable[[], None]] = None,
+        poll_interval: float = 0.25,
+    ):
+        super().__init__()
+        upload = get_session(upload_id)
+        if upload is None:
+            raise ValueError(f"Unknown upload {upload_id}.")
+        self.upload_id = upload_id
+        self.size = upload["size"]
+        self._file = open(upload_path(upload_id, upload["filename"]), "rb")
+        self._check_cancelled = check_cancelled
+        self._poll = poll_interval
+        self._pos = 0
+        self._available = upload["received"]
+        self._complete = upload["status"] == "complete"
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        waiting_since = time.monotonic()
+        while self._pos >= self._available and not self._complete:
+            if self._check_cancelled:
+                self._check_cancelled()
+            if time.monotonic() - waiting_since > UPLOAD_STALL_TIMEOUT:
+                raise ValueError("Upload stalled; no chunk arrived in time.")
+            time.sleep(self._poll)
+            self._refresh()
+        n = min(len(buffer), self._available - self._pos)
+        self._file.seek(self._pos)
+        n = self._file.readinto(memoryview(buffer)[:n])
+        self._pos += n
+        return n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+    def _refresh(self):
+        upload = get_session(self.upload_id)
+        if upload is None or upload["status"] == "aborted":
+            raise ValueError("Upload was aborted.")
+        self._available = upload["received"]
+        self._complete = upload["status"] == "complete"
+        self.size = upload["size"] or self.size
+
+
+def open_upload(upload_id: str, check_cancelled: Optional[Callable[[], None]] = None) -> io.BufferedReader:
+    """Buffered reader over a (possibly still growing) upload."""
+    return io.BufferedReader(GrowingUpload(upload_id, check_cancelled), buffer_size=1 << 20)
+
+
+def _submit_ingest(upload: dict):
+    params = {
+        "path": upload_path(upload["upload_id"], upload["filename"]),
+        "filename": upload["filename"],
+        "dataset": upload["dataset"],
+        "mode": upload["mode"],
+        "sheet": upload["sheet"],
+        "text_column": upload["text_column"],
+    }
+    if upload["analyze_early"]:
+        params["upload_id"] = upload["upload_id"]
+    scheduler.submit("ingest", params, priority=upload["priority"], job_id=upload["upload_id"])
+
+
+class _Decoder:
+    """Incremental Content-Encoding decoder; hands decoded data to `sink` in blocks of at most _DECODE_BLOCK."""
+
+    def __init__(self, encoding: Optional[str], sink: Callable[[bytes], None]):
+        self.encoding = (encoding or "identity").lower()
+        self._sink = sink
+        if self.encoding == "gzip":
+            self._inflater = zlib.decompressobj(wbits=31)
+        elif self.encoding == "zstd":
+            if zstandard is None:
+                raise ValueError("zstd chunks need the 'zstandard' package on the server.")
+            self._inflater = zstandard.ZstdDecompressor().stream_writer(
+                _Sink(sink), write_size=_DECODE_BLOCK, closefd=False
+            )
+        elif self.encoding != "identity":
+            raise ValueError("Content-Encoding must be gzip, zstd or identity.")
+
+    def write(self, part: bytes):
+        try:
+            if self.encoding == "gzip":
+                while part:
+                    self._sink(self._inflater.decompress(part, _DECODE_BLOCK))
+                    part = self._inflater.unconsumed_tail
+            elif self.encoding == "zstd":
+                self._inflater.write(part)
+            else:
+                self._sink(part)
+        except _DECODE_ERRORS as e:
+            raise ValueError(f"Chunk is not valid {self.encoding}: {e}")
+
+    def finish(self):
+        if self.encoding == "gzip":
+            self._sink(self._inflater.flush())
+            if not self._inflater.eof:
+                raise ValueError("Chunk is truncated.")
+        elif self.encoding == "zstd":
+            self._inflater.close()
+
+
+class _Sink:
+    """File-like adapter for the zstd stream writer."""
+
+    def __init__(self, sink: Callable[[bytes], None]):
+        self._sink = sink
+
+    def write(self, data: bytes) -> int:
+        self._sink(data)
+        return len(data)
+
+
+def sha256_file(path: str) -> str:
+    """Hex sha256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _session_dict(upload: UploadSession) -> dict:
+    return {
+        "upload_id": upload.id,
+        "filename": upload.filename,
+        "size": upload.size,
+        "received": upload.received,
+        "status": upload.status,
+        "dataset": upload.dataset,
+        "mode": upload.mode,
+        "priority": upload.priority,
+        "analyze_early": upload.analyze_early,
+        "sheet": upload.sheet,
+        "text_column": upload.text_column,
+        "job_id": upload.id if upload.analyze_early or upload.status == "complete" else None,
+        "chunk_size_hint": CHUNK_SIZE_HINT,
+        "updated_at": upload.updated_at,
+    }
@@ -2,20 +2,53 @@
 Visualization service — aggregates DB data for frontend charts.
 No ML here, pure data aggregation.
 """
-from collections import Counter
-from datetime import timezone
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
 
-from sqlmodel import Session, select
+from sqlmodel import Session, col, func, select
 
 from models.data_models import Record
+from services.analytics_cache import analytics_cache
+from services.columnar_service import load_snapshot
+from services.dataset_service import data_version, record_conditions, record_filter
+from services.keyword_service import compare_groups
+from services.report_service import EXPORT_COLUMNS
 
+BROWSE_MAX_LIMIT = 1000
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "256"))
 
-def get_visualization_data(session: Session) -> dict:
+# (dataset, filters) -> (data version, row count)
+_counts: "OrderedDict[tuple, tuple[int, int]]" = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def get_visualization_data(session: Session, dataset: Optional[str] = None, deduplicated: bool = False) -> dict:
     """
     Return aggregated chart data for the Visualizations page.
-    Matches frontend Recharts expectations.
+    Matches frontend Recharts expectations. Label counts come from the
+    in-memory analytics cache when it is ready; otherwise (and for the top
+    words) from the memory-mapped Arrow snapshot when pyarrow is available,
+    from the records otherwise.
+    candidate_comparison has one entry per keyword group (keyword_service).
+    deduplicated counts each near-duplicate cluster once (dedup_service).
     """
-    records = session.exec(select(Record)).all()
+    data = _visualization_data(session, dataset, deduplicated)
+    data["candidate_comparison"] = compare_groups(session, dataset)["groups"]
+    return data
+
+
+def _visualization_data(session: Session, dataset: Optional[str], deduplicated: bool) -> dict:
+    cached = analytics_cache.visualization(dataset, deduplicated)
+    if cached is not None and cached["total"]:
+        total = cached.pop("total")
+        return {**cached, "top_words": _top_words(session, dataset, deduplicated), "total": total}
+    snapshot = None if cached is not None else _snapshot(dataset, deduplicated)
+    if snapshot is not None and snapshot.num_rows:
+        return _visualization_from_snapshot(snapshot)
+    records = [] if cached is not None or snapshot is not None else _records(session, dataset, deduplicated)
 
     if not records:
         return {
@@ -44,27 +77,45 @@ def get_visualization_data(session: Session) -> dict:
 
     time_series_list = [{"date": k, **v} for k, v in time_series.items()]
 
-    # Top words from clean_text
-    word_counter: Counter = Counter()
-    for r in records:
-        if r.clean_text:
-            word_counter.update(r.clean_text.split())
-    top_words = [{"word": w, "count": c} for w, c in word_counter.most_common(20)]
-
     return {
         "sentiment_distribution": sentiment_counts,
         "emotion_distribution": emotion_counts,
         "sentiment_over_time": time_series_list,
-        "top_words": top_words,
+        "top_words": _count_words(r.clean_text for r in records),
         "total": len(records),
     }
 
 
-def get_dashboard_summary(session: Session) -> dict:
+def _top_words(session: Session, dataset: Optional[str], deduplicated: bool) -> list:
+    """The 20 most frequent clean_text words, from the snapshot if there is one."""
+    snapshot = _snapshot(dataset, deduplicated)
+    if snapshot is not None:
+        return _top_words_from_snapshot(snapshot)
+    return _count_words(session.exec(
+        select(Record.clean_text).where(*record_conditions(session, dataset, deduplicated=deduplicated))
+    ))
+
+
+def _count_words(texts) -> list:
+    word_counter: Counter = Counter()
+    for text in texts:
+        if text:
+            word_counter.update(text.split())
+    return [{"word": w, "count": c} for w, c in word_counter.most_common(20)]
+
+
+def get_dashboard_summary(session: Session, dataset: Optional[str] = None, deduplicated: bool = False) -> dict:
     """
-    Return a quick summary for the Dashboard Overview page.
+    Return a quick summary for the Dashboard Overview page, from the
+    analytics cache when it is ready.
     """
-    records = session.exec(select(Record)).all()
+    cached = analytics_cache.summary(dataset, deduplicated)
+    if cached is not None:
+        return cached
+    snapshot = _snapshot(dataset, deduplicated)
+    if snapshot is not None and snapshot.num_rows:
+        return _summary_from_snapshot(snapshot)
+    records = [] if snapshot is not None else _records(session, dataset, deduplicated)
 
     if not records:
         return {
@@ -86,15 +137,169 @@ def get_dashboard_summary(session: Session) -> dict:
     }
 
 
-def get_dataset_preview(session: Session, limit: int = 50) -> dict:
+def _snapshot(dataset: Optional[str], deduplicated: bool):
+    """load_snapshot, keeping only cluster representatives if deduplicated."""
+    snapshot = load_snapshot(dataset)
+    if snapshot is None or not deduplicated:
+        return snapshot
+    import pyarrow.compute as pc
+    return snapshot.filter(pc.is_null(snapshot["duplicate_of"]))
+
+
+def _records(session: Session, dataset: Optional[str], deduplicated: bool) -> list:
+    return session.exec(select(Record).where(*record_conditions(session, dataset, deduplicated=deduplicated))).all()
+
+
+def get_dataset_preview(session: Session, limit: int = 50, dataset: Optional[str] = None) -> dict:
     """
     Return a list of records for previewing.
+    Rows are read as plain tuples and zipped with the column names, without
+    building a model instance per record.
+    """
+    visible = record_filter(session, dataset)
+    columns = list(Record.__table__.columns)
+    rows = session.exec(select(*columns).where(visible).order_by(Record.id.desc()).limit(limit)).all()
+
+    names = [c.name for c in columns]
+    return {
+        "preview": [dict(zip(names, row)) for row in rows],
+        "total": _count(session, dataset, [visible], ()),
+    }
+
+
+def browse_records(
+    session: Session,
+    dataset: Optional[str] = None,
+    columns: Optional[list[str]] = None,
+    cursor: Optional[int] = None,
+    limit: int = 50,
+    order: str = "desc",
+    with_total: bool = False,
+    sentiment: Optional[str] = None,
+    emotion: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    deduplicated: bool = False,
+) -> dict:
+    """
+    One page of records, newest first (order="desc") or oldest first.
+
+    Pages are keyset-paginated on the id: pass the returned `next_cursor` to
+    get the next page, which is read as WHERE id < cursor (> for "asc")
+    ORDER BY id LIMIT n. That is an index range scan whatever the depth,
+    where OFFSET would walk past every skipped row. `columns` limits the
+    fields returned; "id" is always included. The total matching count is
+    only computed on request and is cached until the data version changes.
     """
-    from sqlmodel import func
-    records = session.exec(select(Record).order_by(Record.id.desc()).limit(limit)).all()
-    total = session.exec(select(func.count(Record.id))).one()
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    columns = [c for c in (columns or EXPORT_COLUMNS) if c != "id"]
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}; choose from {list(EXPORT_COLUMNS)}.")
+    limit = max(1, min(limit, BROWSE_MAX_LIMIT))
 
+    filters = {
+        "sentiment": sentiment, "emotion": emotion, "min_confidence": min_confidence,
+        "max_confidence": max_confidence, "since": since, "until": until, "deduplicated": deduplicated or None,
+    }
+    conditions = record_conditions(session, dataset, **filters)
+    page_conditions = list(conditions)
+    if cursor is not None:
+        page_conditions.append(col(Record.id) < cursor if order == "desc" else col(Record.id) > cursor)
+    rows = session.exec(
+        select(Record.id, *[getattr(Record, c) for c in columns])
+        .where(*page_conditions)
+        .order_by(col(Record.id).desc() if order == "desc" else col(Record.id))
+        .limit(limit)
+    ).all()
+    if not columns:
+        rows = [(row,) for row in rows]  # a single selected column comes back as scalars
+
+    names = ["id", *columns]
+    return {
+        "rows": [dict(zip(names, row)) for row in rows],
+        "next_cursor": rows[-1][0] if len(rows) == limit else None,
+        "total": _count(session, dataset, conditions, tuple((k, v) for k, v in filters.items() if v is not None))
+        if with_total else None,
+    }
+
+
+def _count(session: Session, dataset: Optional[str], conditions: list, filters: tuple) -> int:
+    """
+    COUNT(*) of the rows matching `conditions` (`filters` are the
+    record_conditions arguments they were built from): counted on the
+    analytics cache when it is ready, else cached per data version of `dataset`.
+    """
+    cached = analytics_cache.count(dataset, **dict(filters))
+    if cached is not None:
+        return cached
+    key = (dataset, filters)
+    version = data_version(dataset)
+    with _counts_lock:
+        cached = _counts.get(key)
+        if cached and cached[0] == version:
+            _counts.move_to_end(key)
+            return cached[1]
+    total = session.exec(select(func.count()).select_from(Record).where(*conditions)).one()
+    with _counts_lock:
+        _counts[key] = (version, total)
+        _counts.move_to_end(key)
+        while len(_counts) > COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return total
+
+
+def _visualization_from_snapshot(table) -> dict:
+    """get_visualization_data over an Arrow table (see columnar_service.load_snapshot)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = table.unify_dictionaries()
+    analyzed = table.filter(pc.is_valid(table["sentiment"]))
+    # Single-threaded grouping keeps days in order of first appearance, like the loop above
+    by_day = pa.table({
+        "date": pc.strftime(analyzed["created_at"], format="%b %d"),
+        "sentiment": analyzed["sentiment"].cast(pa.string()),
+    }).group_by(["date", "sentiment"], use_threads=False).aggregate([([], "count_all")])
+    time_series: dict[str, dict[str, int]] = {}
+    for row in by_day.to_pylist():
+        day = time_series.setdefault(row["date"], {"Positive": 0, "Neutral": 0, "Negative": 0})
+        day[row["sentiment"]] = row["count_all"]
+
+    return {
+        "sentiment_distribution": _label_counts(table["sentiment"]),
+        "emotion_distribution": _label_counts(table["emotion"]),
+        "sentiment_over_time": [{"date": k, **v} for k, v in time_series.items()],
+        "top_words": _top_words_from_snapshot(table),
+        "total": table.num_rows,
+    }
+
+
+def _top_words_from_snapshot(table) -> list:
+    import pyarrow.compute as pc
+    words = pc.value_counts(pc.list_flatten(pc.utf8_split_whitespace(table["clean_text"])))
+    top = words.take(pc.array_sort_indices(words.field("counts"), order="descending")[:20])
+    return [{"word": w["values"], "count": w["counts"]} for w in top.to_pylist()]
+
+
+def _summary_from_snapshot(table) -> dict:
+    table = table.unify_dictionaries()
+    sentiment_counts = _label_counts(table["sentiment"])
+    emotion_counts = _label_counts(table["emotion"])
     return {
-        "preview": [r.model_dump() if hasattr(r, "model_dump") else r.dict() for r in records],
-        "total": total,
+        "total_records": table.num_rows,
+        "positive": sentiment_counts.get("Positive", 0),
+        "neutral": sentiment_counts.get("Neutral", 0),
+        "negative": sentiment_counts.get("Negative", 0),
+        "dominant_emotion": max(emotion_counts, key=emotion_counts.get) if emotion_counts else "N/A",
     }
+
+
+def _label_counts(column) -> dict[str, int]:
+    """Counts per non-empty label of a dictionary-encoded column (dictionaries unified)."""
+    import pyarrow.compute as pc
+    counts = pc.value_counts(column)
+    return {c["values"]: c["counts"] for c in counts.to_pylist() if c["values"]}
@@ -0,0 +1,194 @@
+"""
+window_analytics.py — In-memory sliding/tumbling window analytics for the stream.
+
+Every streamed record lands in a fixed-width time bucket. Buckets live in a
+ring sized to cover WINDOW_HORIZON_SECONDS, so memory is bounded by the window
+length, not by how long the stream has been running. Each bucket keeps
+sentiment/emotion counts, the sum of signed sentiment scores and a coarse
+confidence histogram, which is enough to answer any window query in
+O(buckets) without touching the database.
+"""
+import math
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+BUCKET_SECONDS = int(os.getenv("WINDOW_BUCKET_SECONDS", "10"))
+WINDOW_HORIZON_SECONDS = int(os.getenv("WINDOW_HORIZON_SECONDS", "3600"))
+EWMA_HALF_LIFE_SECONDS = float(os.getenv("WINDOW_EWMA_HALF_LIFE", "60"))
+
+# Confidence histogram resolution (0.0 – 1.0 split into equal bins)
+CONF_BINS = 20
+PERCENTILES = (50, 90, 99)
+
+
+class _Bucket:
+    __slots__ = ("number", "count", "sentiment", "emotion", "score_sum", "conf_hist")
+
+    def __init__(self, number: int):
+        self.number = number
+        self.count = 0
+        self.sentiment: dict[str, int] = {}
+        self.emotion: dict[str, int] = {}
+        self.score_sum = 0.0
+        self.conf_hist = [0] * CONF_BINS
+
+
+def signed_score(sentiment: str, confidence: float) -> float:
+    """Map a label + confidence onto [-1, 1]: Positive → +conf, Negative → -conf, Neutral → 0."""
+    if sentiment == "Positive":
+        return confidence
+    if sentiment == "Negative":
+        return -confidence
+    return 0.0
+
+
+class WindowedAnalytics:
+    """Ring buffer of time buckets plus a time-decayed EWMA of the sentiment score."""
+
+    def __init__(
+        self,
+        bucket_seconds: int = BUCKET_SECONDS,
+        horizon_seconds: int = WINDOW_HORIZON_SECONDS,
+        half_life_seconds: float = EWMA_HALF_LIFE_SECONDS,
+    ):
+        self.bucket_seconds = max(1, bucket_seconds)
+        self.size = max(1, math.ceil(horizon_seconds / self.bucket_seconds))
+        self.half_life = half_life_seconds
+        self.reset()
+
+    def reset(self):
+        self._ring: list[Optional[_Bucket]] = [None] * self.size
+        self.ewma_score: Optional[float] = None
+        self._ewma_at: Optional[float] = None
+
+    @property
+    def horizon_seconds(self) -> int:
+        return self.size * self.bucket_seconds
+
+    # ── Ingest ────────────────────────────────────────────────────────────────
+
+    def add(self, sentiment: str, emotion: str, confidence: float, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        number = int(ts // self.bucket_seconds)
+        slot = number % self.size
+        bucket = self._ring[slot]
+        if bucket is None or bucket.number != number:
+            if bucket is not None and bucket.number > number:
+                return  # older than the horizon — drop it
+            bucket = self._ring[slot] = _Bucket(number)
+        bucket.count += 1
+        bucket.sentiment[sentiment] = bucket.sentiment.get(sentiment, 0) + 1
+        bucket.emotion[emotion] = bucket.emotion.get(emotion, 0) + 1
+        score = signed_score(sentiment, confidence)
+        bucket.score_sum += score
+        bucket.conf_hist[min(CONF_BINS - 1, max(0, int(confidence * CONF_BINS)))] += 1
+
+        if self.ewma_score is None:
+            self.ewma_score = score
+        else:
+            dt = max(0.0, ts - self._ewma_at)
+            alpha = 1 - 0.5 ** (dt / self.half_life) if self.half_life > 0 else 1.0
+            self.ewma_score += alpha * (score - self.ewma_score)
+        self._ewma_at = ts
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def _buckets_between(self, first: int, last: int):
+        """Live buckets numbered first..last inclusive (never more than the ring size)."""
+        first = max(first, last - self.size + 1)
+        for number in range(first, last + 1):
+            bucket = self._ring[number % self.size]
+            if bucket is not None and bucket.number == number:
+                yield bucket
+
+    def _summarize(self, buckets, start: float, end: float) -> dict:
+        count = 0
+        score_sum = 0.0
+        sentiment: dict[str, int] = {"Positive": 0, "Negative": 0, "Neutral": 0}
+        emotion: dict[str, int] = {}
+        hist = [0] * CONF_BINS
+        for b in buckets:
+            count += b.count
+            score_sum += b.score_sum
+            for k, v in b.sentiment.items():
+                sentiment[k] = sentiment.get(k, 0) + v
+            for k, v in b.emotion.items():
+                emotion[k] = emotion.get(k, 0) + v
+            for i, v in enumerate(b.conf_hist):
+                hist[i] += v
+        return {
+            "start": _iso(start),
+            "end": _iso(end),
+            "count": count,
+            "rate_per_sec": round(count / max(end - start, 1e-9), 3),
+            "sentiment": sentiment,
+            "emotion": emotion,
+            "avg_score": round(score_sum / count, 4) if count else None,
+            "confidence_percentiles": _percentiles(hist, count),
+        }
+
+    def sliding(self, window_seconds: int, now: Optional[float] = None) -> dict:
+        """Aggregate over the last `window_seconds` (rounded up to whole buckets)."""
+        now = time.time() if now is None else now
+        window_seconds = min(window_seconds, self.horizon_seconds)
+        last = int(now // self.bucket_seconds)
+        n = max(1, math.ceil(window_seconds / self.bucket_seconds))
+        first = last - n + 1
+        summary = self._summarize(
+            self._buckets_between(first, last), first * self.bucket_seconds, now
+        )
+        summary["window_seconds"] = window_seconds
+        return summary
+
+    def tumbling(self, size_seconds: int, count: int, now: Optional[float] = None) -> list[dict]:
+        """
+        `count` consecutive, non-overlapping windows of `size_seconds` each,
+        aligned to multiples of the window size, oldest first. The last one is
+        the (still open) current window.
+        """
+        now = time.time() if now is None else now
+        per_window = max(1, math.ceil(size_seconds / self.bucket_seconds))
+        size_seconds = per_window * self.bucket_seconds
+        count = max(1, min(count, self.size // per_window or 1))
+        current = int(now // size_seconds)
+        windows = []
+        for w in range(current - count + 1, current + 1):
+            first = w * per_window
+            start = first * self.bucket_seconds
+            windows.append(self._summarize(
+                self._buckets_between(first, first + per_window - 1),
+                start,
+                min(start + size_seconds, now),
+            ))
+        return windows
+
+    def snapshot(self, windows=(60, 300), now: Optional[float] = None) -> dict:
+        """Compact view pushed to WebSocket clients."""
+        now = time.time() if now is None else now
+        return {
+            "ewma_score": round(self.ewma_score, 4) if self.ewma_score is not None else None,
+            "sliding": {str(w): self.sliding(w, now) for w in windows},
+        }
+
+
+def _percentiles(hist: list[int], total: int) -> dict:
+    if not total:
+        return {f"p{p}": None for p in PERCENTILES}
+    out = {}
+    width = 1 / CONF_BINS
+    for p in PERCENTILES:
+        target = total * p / 100
+        seen = 0
+        for i, n in enumerate(hist):
+            if n and seen + n >= target:
+                # Linear interpolation inside the bin
+                out[f"p{p}"] = round((i + (target - seen) / n) * width, 3)
+                break
+            seen += n
+    return out
+
+
+def _iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat()
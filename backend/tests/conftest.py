@@ -0,0 +1,33 @@
+"""
+Shared fixtures. The app opens ./database/db.sqlite (made absolute when the
+engine is created) and writes uploads and snapshots under the working
+directory, so the tests run in a temporary directory, and every test gets a
+new, empty database there.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before anything imports database.db
+_WORKDIR = tempfile.mkdtemp(prefix="sentiment-tests-")
+os.makedirs(os.path.join(_WORKDIR, "database"))
+os.chdir(_WORKDIR)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """Recreate the database (label table seeded); yields the engine."""
+    import models.data_models  # noqa: F401  (registers the tables)
+    from database.db import create_db_and_tables, engine
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        path = os.path.join(_WORKDIR, "database", "db.sqlite" + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    create_db_and_tables()
+    yield engine
+    engine.dispose()
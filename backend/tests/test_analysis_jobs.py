@@ -0,0 +1,71 @@
+import pytest
+from sqlmodel import Session, func, select
+
+from database.db import engine
+from models.data_models import Record
+from services import emotion_service, preprocess_service, sentiment_service
+from services.dataset_service import (
+    REWRITTEN, activate_partition, create_partition, data_version, insert_records,
+)
+from services.job_service import JobCancelled
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """1200 records in dataset "d", with a stand-in model and snapshot invalidation counted."""
+    monkeypatch.setattr(sentiment_service, "sentiment_classifier", lambda text: ("Positive", 0.75))
+    monkeypatch.setattr(emotion_service, "emotion_detector", lambda text: "Happy")
+    monkeypatch.setattr(preprocess_service, "clean_text", lambda text, **_: text.lower())
+    invalidated = []
+    for module in (sentiment_service, emotion_service, preprocess_service):
+        monkeypatch.setattr(module, "invalidate_snapshots", lambda: invalidated.append(True))
+    with Session(engine) as session:
+        partition_id = create_partition(session, "d")
+        insert_records(session, [{"text": f"Record {i}", "dataset_id": partition_id} for i in range(1200)])
+        session.commit()
+        activate_partition(session, partition_id, "append", 1200)
+    return invalidated
+
+
+def _cancel_after(chunks: int):
+    calls = []
+
+    def check_cancelled():
+        calls.append(True)
+        if len(calls) == chunks:
+            raise JobCancelled()
+    return check_cancelled
+
+
+@pytest.mark.parametrize("run, rewritten", [
+    (lambda s, cc: sentiment_service.run_sentiment_analysis(s, check_cancelled=cc, dataset="d"), True),
+    (lambda s, cc: emotion_service.run_emotion_analysis(s, check_cancelled=cc, dataset="d"), True),
+    (lambda s, cc: preprocess_service.run_preprocessing(s, check_cancelled=cc, dataset="d"), False),
+], ids=["sentiment", "emotion", "preprocess"])
+def test_cancelled_run_still_bumps_versions(records, run, rewritten):
+    before = {name: data_version(name) for name in ("d", None, REWRITTEN)}
+    with Session(engine) as session, pytest.raises(JobCancelled):
+        run(session, _cancel_after(1))
+
+    # The first 500-row chunk was committed, and so was its version bump
+    assert data_version("d") > before["d"]
+    assert data_version() > before[None]
+    assert (data_version(REWRITTEN) > before[REWRITTEN]) == rewritten
+    assert records == [True]
+
+
+def test_cancelled_sentiment_run_keeps_its_committed_chunk(records):
+    with Session(engine) as session, pytest.raises(JobCancelled):
+        sentiment_service.run_sentiment_analysis(session, check_cancelled=_cancel_after(2), dataset="d")
+    with Session(engine) as session:
+        labeled = session.exec(select(func.count()).select_from(Record).where(Record.sentiment == "Positive")).one()
+    assert labeled == 1000
+
+
+def test_completed_run_bumps_per_chunk_and_invalidates(records):
+    with Session(engine) as session:
+        result = sentiment_service.run_sentiment_analysis(session, dataset="d")
+    assert result["counts"] == {"Positive": 1200}
+    # Two full chunks plus the final commit
+    assert data_version(REWRITTEN) == 3
+    assert records == [True]
@@ -0,0 +1,82 @@
+import time
+
+from sqlmodel import Session
+
+from database.db import engine
+from services.analytics_cache import AnalyticsCache
+from services.dataset_service import activate_partition, create_partition, drop_dataset, insert_records, purge_deleted
+
+
+def _load(name: str, n: int, sentiment: str = "Positive"):
+    with Session(engine) as session:
+        partition_id = create_partition(session, name)
+        insert_records(session, [
+            {"text": f"{name} record {i}", "sentiment": sentiment, "emotion": "Happy",
+             "confidence": 0.9, "dataset_id": partition_id}
+            for i in range(n)
+        ])
+        session.commit()
+        activate_partition(session, partition_id, "append", n)
+
+
+def _ask(cache: AnalyticsCache, query: str, *args):
+    """A query's answer once the background (re)build it may have started is done."""
+    for _ in range(500):
+        answer = getattr(cache, query)(*args)
+        if answer is not None:
+            return answer
+        time.sleep(0.01)
+    raise AssertionError(f"{query} kept falling back")
+
+
+def test_dropped_and_purged_dataset_leaves_the_cache():
+    cache = AnalyticsCache()
+    _load("base", 10)
+    _load("a", 10, "Negative")
+    assert _ask(cache, "summary")["total_records"] == 20
+
+    with Session(engine) as session:
+        drop_dataset(session, "a")
+    purge_deleted()
+
+    summary = _ask(cache, "summary")
+    assert summary["total_records"] == 10
+    assert summary["negative"] == 0
+    assert _ask(cache, "count") == 10
+    assert _ask(cache, "summary", "a")["total_records"] == 0
+
+
+def test_ids_reused_after_a_purge_are_read():
+    cache = AnalyticsCache()
+    _load("base", 10)
+    _load("a", 10)
+    assert _ask(cache, "summary")["total_records"] == 20
+    with Session(engine) as session:
+        drop_dataset(session, "a")
+    purge_deleted()
+
+    # SQLite hands out a's ids (11–20) again
+    _load("b", 10, "Negative")
+    assert _ask(cache, "summary", "b")["total_records"] == 10
+    assert _ask(cache, "visualization", "b")["total"] == 10
+    assert _ask(cache, "summary")["total_records"] == 20
+    assert _ask(cache, "count", None, "Negative") == 10
+
+
+def test_unknown_partitions_are_hidden():
+    cache = AnalyticsCache()
+    _load("base", 5)
+    with Session(engine) as session:
+        insert_records(session, [{"text": "orphan", "sentiment": "Neutral", "dataset_id": "unregistered"}])
+        session.commit()
+    assert _ask(cache, "summary")["total_records"] == 5
+    assert _ask(cache, "count") == 5
+
+
+def test_rows_deleted_outside_a_drop_rebuild_the_cache():
+    cache = AnalyticsCache()
+    _load("base", 10)
+    assert _ask(cache, "summary")["total_records"] == 10
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM record WHERE id > 6")
+    assert _ask(cache, "summary")["total_records"] == 6
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+from sqlmodel import Session, update
+
+from database.db import engine
+from models.data_models import Record
+from services import columnar_service
+from services.dataset_service import activate_partition, create_partition, insert_records
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture(autouse=True)
+def datasets(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_service, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(columnar_service, "_open_snapshots", {})
+    with Session(engine) as session:
+        for name in ("a", "b"):
+            partition_id = create_partition(session, name)
+            insert_records(session, [
+                {"text": f"{name}{i}", "dataset_id": partition_id, "sentiment": "Positive"} for i in range(3)
+            ])
+            session.commit()
+            activate_partition(session, partition_id, "append", 3)
+
+
+def _block_first_write(monkeypatch) -> tuple[threading.Event, threading.Event]:
+    """Make the next snapshot write wait for `release`; `writing` is set once it has started."""
+    writing, release = threading.Event(), threading.Event()
+    real_batches = columnar_service._batches
+
+    def batches(builder, conditions, after_id=0, check_cancelled=None):
+        if after_id == 0 and not writing.is_set():
+            writing.set()
+            release.wait(10)
+        return real_batches(builder, conditions, after_id, check_cancelled)
+    monkeypatch.setattr(columnar_service, "_batches", batches)
+    return writing, release
+
+
+def test_a_snapshot_write_blocks_neither_other_datasets_nor_invalidation(monkeypatch):
+    writing, release = _block_first_write(monkeypatch)
+    slow = threading.Thread(target=columnar_service.load_snapshot, args=("a",))
+    slow.start()
+    assert writing.wait(5)
+    started = time.monotonic()
+    other = columnar_service.load_snapshot("b")
+    columnar_service.invalidate_snapshots()
+    elapsed = time.monotonic() - started
+    release.set()
+    slow.join(5)
+    assert other.num_rows == 3 and elapsed < 2
+
+
+def test_snapshot_written_across_an_invalidation_is_not_kept(monkeypatch):
+    writing, release = _block_first_write(monkeypatch)
+    result = {}
+    slow = threading.Thread(target=lambda: result.update(table=columnar_service.load_snapshot("a")))
+    slow.start()
+    assert writing.wait(5)
+    # Re-analysis rewrites the labels in place while the snapshot is being written
+    with Session(engine) as session:
+        session.exec(update(Record).values(sentiment="Negative"))
+        session.commit()
+    columnar_service.invalidate_snapshots()
+    release.set()
+    slow.join(5)
+    assert set(result["table"].column("sentiment").to_pylist()) == {"Negative"}
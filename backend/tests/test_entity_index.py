@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlmodel import Session, func, select
+
+from database.db import create_db_and_tables, engine
+from models.data_models import EntityCount, Job, Record, RecordEntity
+from services import entity_service
+from services.dataset_service import activate_partition, create_partition, data_version, insert_records
+from services.entity_service import ensure_entity_index, rebuild_entity_index
+from services.job_service import JobCancelled
+
+_ENTITY_TABLES = ("entity", "record_entity", "entity_count")
+
+
+def _entity_jobs() -> list[Job]:
+    with Session(engine) as session:
+        return session.exec(select(Job).where(Job.kind == "entity_reindex")).all()
+
+
+def _upgrade_with_records(*texts: str):
+    """A database from before the entity index: records, but no entity tables."""
+    with Session(engine) as session:
+        session.add_all(Record(text=t) for t in texts)
+        session.commit()
+    with engine.begin() as conn:
+        for table in _ENTITY_TABLES:
+            conn.execute(text(f"DROP TABLE {table}"))
+    create_db_and_tables()
+
+
+def test_new_entity_tables_over_existing_records_queue_a_reindex():
+    _upgrade_with_records("#launch went well", "see www.example.com")
+    ensure_entity_index()
+    assert len(_entity_jobs()) == 1
+
+
+def test_no_reindex_on_a_fresh_database_or_a_later_start():
+    ensure_entity_index()           # fresh database: the tables are new, but there are no records
+    with Session(engine) as session:
+        session.add(Record(text="#later"))
+        session.commit()
+    create_db_and_tables()          # later start: the tables already exist
+    ensure_entity_index()
+    assert _entity_jobs() == []
+
+
+def _add_records(partition_id: str, *texts: str):
+    with Session(engine) as session:
+        insert_records(session, [{"text": t, "dataset_id": partition_id} for t in texts])
+        session.commit()
+
+
+def _index() -> tuple[int, dict]:
+    """Number of record ↔ entity links and the summed count per entity kind."""
+    with Session(engine) as session:
+        links = session.exec(select(func.count()).select_from(RecordEntity)).one()
+        counts = dict(session.exec(select(EntityCount.kind, func.sum(EntityCount.count)).group_by(EntityCount.kind)).all())
+    return links, counts
+
+
+@pytest.fixture
+def partition(monkeypatch):
+    monkeypatch.setattr(entity_service, "REINDEX_PAGE_SIZE", 2)
+    with Session(engine) as session:
+        partition_id = create_partition(session, "d")
+        activate_partition(session, partition_id, "append", 0)
+    _add_records(partition_id, "#one", "#two @ann", "see www.example.com", "#one again", "nothing here")
+    return partition_id
+
+
+def test_cancelled_rebuild_leaves_the_index_intact(partition):
+    before = _index()
+
+    def cancel():
+        raise JobCancelled()
+    with pytest.raises(JobCancelled):
+        rebuild_entity_index(check_cancelled=cancel)
+    assert _index() == before == (5, {"hashtag": 3, "mention": 1, "domain": 1})
+    assert not inspect(engine).has_table("record_entity_rebuild")
+
+
+def test_records_inserted_during_a_rebuild_are_counted_once(partition):
+    version = data_version("d")
+    added = []
+
+    def insert_meanwhile(pct):
+        if not added:
+            added.append(True)
+            _add_records(partition, "#late", "#one more")
+    assert rebuild_entity_index(progress_cb=insert_meanwhile) == 7
+    assert _index() == (7, {"hashtag": 5, "mention": 1, "domain": 1})
+    assert data_version("d") == version + 1
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, func, select
+
+from database.db import engine
+from models.data_models import Dataset, IngestCheckpoint, Job, Record
+from services import file_service
+from services.dataset_service import data_version
+from services.job_service import JobContext, JobInterrupted, JobScheduler, _HANDLERS
+
+_CSV = b"text\n" + b"".join(f"tweet number {i}\n".encode() for i in range(30))
+
+
+@pytest.fixture(autouse=True)
+def model(monkeypatch):
+    monkeypatch.setattr(file_service, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(file_service, "sentiment_classifier", lambda text: ("Positive", 0.75))
+    monkeypatch.setattr(file_service, "emotion_detector", lambda text, tokens=None: "Happy")
+
+
+def _record_count() -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Record)).one()
+
+
+def test_interrupted_ingest_resumes_after_its_last_committed_batch(monkeypatch):
+    monkeypatch.setattr(file_service, "INGEST_BATCH_SIZE", 8)
+    checks = []
+
+    def interrupt_after_two_batches():
+        checks.append(True)
+        if len(checks) == 2:
+            raise JobInterrupted()
+
+    with Session(engine) as session:
+        with pytest.raises(JobInterrupted):
+            file_service.ingest_file(
+                _CSV, "t.csv", session, check_cancelled=interrupt_after_two_batches,
+                job_id="job-0", dataset="d", mode="append",
+            )
+    with Session(engine) as session:
+        checkpoint = session.get(IngestCheckpoint, "job-0")
+        assert (checkpoint.rows_done, checkpoint.batches) == (16, 2)
+        assert session.get(Dataset, checkpoint.partition_id).status == "loading"
+    version = data_version("d")
+
+    with Session(engine) as session:
+        result = file_service.ingest_file(_CSV, "t.csv", session, job_id="job-0", dataset="d", mode="append")
+        texts = session.exec(select(Record.text).order_by(Record.id)).all()
+        partitions = session.exec(select(Dataset).where(Dataset.name == "d")).all()
+    assert texts == [f"tweet number {i}" for i in range(30)]
+    assert result["total_rows"] == 30 and result["sentiment_distribution"]["Positive"] == 30
+    assert [(p.id, p.status, p.row_count) for p in partitions] == [(checkpoint.partition_id, "active", 30)]
+    assert data_version("d") == version + 1
+
+
+def test_rerun_after_activation_returns_the_result_without_loading_again():
+    with Session(engine) as session:
+        first = file_service.ingest_file(_CSV, "t.csv", session, job_id="job-1", mode="append")
+    # The process died before the job was marked done; the re-run must not append the file twice
+    with Session(engine) as session:
+        again = file_service.ingest_file(_CSV, "t.csv", session, job_id="job-1", mode="append")
+    assert again == first
+    assert _record_count() == 30
+
+
+def test_ingest_job_finishes_even_if_its_upload_was_already_removed(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_bytes(_CSV)
+    params = {"path": str(path), "filename": "t.csv", "mode": "append"}
+    with Session(engine) as session:
+        session.add(Job(id="job-2", kind="ingest"))
+        session.commit()
+    first = _HANDLERS["ingest"](JobContext(JobScheduler(), "job-2", params))
+    assert not path.exists()
+    assert _HANDLERS["ingest"](JobContext(JobScheduler(), "job-2", params)) == first
+    assert _record_count() == 30
+
+
+def test_evicting_the_job_drops_its_checkpoint(monkeypatch):
+    from services import job_service
+    with Session(engine) as session:
+        file_service.ingest_file(_CSV, "t.csv", session, job_id="job-3", mode="append")
+        session.add(Job(id="job-3", kind="ingest", status="done", finished_at=datetime.utcnow()))
+        session.commit()
+    monkeypatch.setattr(job_service, "JOB_RESULT_TTL", -1)
+    assert JobScheduler().evict_expired() == 1
+    with Session(engine) as session:
+        assert session.get(IngestCheckpoint, "job-3") is None
@@ -0,0 +1,105 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session
+
+from database.db import engine
+from models.data_models import Job
+from services import job_service
+from services.job_service import JobScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(workers=1)
+    scheduler.start()
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _wait_for(job_id: str, *statuses: str, timeout: float = 10) -> Job:
+    """The job row once its stored status is one of `statuses`."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job stayed {job.status}")
+
+
+def test_cancel_reaches_a_job_running_in_another_process(scheduler, monkeypatch):
+    monkeypatch.setattr(job_service, "_CANCEL_POLL_SECONDS", 0.05)
+
+    def spin(ctx):
+        while True:
+            ctx.check_cancelled()
+            time.sleep(0.01)
+    monkeypatch.setitem(job_service._HANDLERS, "spin", spin)
+    job_id = scheduler.submit("spin")
+    _wait_for(job_id, "processing")
+
+    # A second scheduler stands in for another worker process: it only shares the database
+    assert JobScheduler().cancel(job_id) == "cancelling"
+    assert _wait_for(job_id, "cancelled", "done", "error").status == "cancelled"
+
+
+def test_cancel_of_a_queued_job_is_immediate(monkeypatch):
+    monkeypatch.setitem(job_service._HANDLERS, "noop", lambda ctx: None)
+    idle = JobScheduler()  # not started, so the job stays queued
+    job_id = idle.submit("noop")
+    assert JobScheduler().cancel(job_id) == "cancelled"
+    assert idle.get(job_id)["status"] == "cancelled"
+
+
+def test_running_job_heartbeats_without_progress(scheduler, monkeypatch):
+    monkeypatch.setattr(job_service, "_HEARTBEAT_INTERVAL", 0.05)
+    release = threading.Event()
+    monkeypatch.setitem(job_service._HANDLERS, "block", lambda ctx: release.wait(10))
+    # The heartbeat thread started with the fixture waits on the old interval; restart it
+    scheduler.shutdown()
+    scheduler.start()
+    job_id = scheduler.submit("block")
+    first = _wait_for(job_id, "processing").updated_at
+    time.sleep(0.3)
+    later = _wait_for(job_id, "processing").updated_at
+    release.set()
+    assert later > first
+    _wait_for(job_id, "done")
+
+
+def test_job_orphaned_shortly_before_start_is_picked_up(monkeypatch):
+    # Its process died just now: the heartbeat is still fresh when this scheduler starts
+    monkeypatch.setattr(job_service, "_STALE_AFTER", 0.5)
+    monkeypatch.setattr(job_service, "_HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setitem(job_service._HANDLERS, "noop", lambda ctx: None)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.add(Job(id="orphan", kind="noop", status="processing", started_at=now, updated_at=now))
+        session.commit()
+    scheduler = JobScheduler(workers=1)
+    scheduler.start()
+    try:
+        assert _wait_for("orphan", "done", "error", "cancelled").status == "done"
+    finally:
+        scheduler.shutdown()
+
+
+def test_waiting_upload_ingests_do_not_starve_other_jobs(monkeypatch):
+    arrived = threading.Event()
+    monkeypatch.setitem(job_service._HANDLERS, "ingest", lambda ctx: arrived.wait(10))
+    monkeypatch.setitem(job_service._HANDLERS, "noop", lambda ctx: None)
+    scheduler = JobScheduler(workers=1, upload_workers=1)
+    scheduler.start()
+    try:
+        # Both uploads wait for their client; only one of them may hold a worker
+        waiting = [scheduler.submit("ingest", {"upload_id": str(i)}) for i in range(2)]
+        _wait_for(waiting[0], "processing")
+        assert _wait_for(scheduler.submit("noop"), "done").status == "done"
+        assert _wait_for(waiting[1], "queued").status == "queued"
+    finally:
+        arrived.set()
+        scheduler.shutdown()
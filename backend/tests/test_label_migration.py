@@ -0,0 +1,77 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+
+from database.db import create_db_and_tables, engine
+from database.labels import DEFAULT_LABELS, label_code
+from models.data_models import Label, Record
+
+# The record table as the original schema created it
+_LEGACY_RECORD = """
+    CREATE TABLE record (
+        id INTEGER NOT NULL PRIMARY KEY,
+        text VARCHAR NOT NULL,
+        clean_text VARCHAR,
+        sentiment VARCHAR,
+        emotion VARCHAR,
+        confidence FLOAT,
+        created_at DATETIME NOT NULL
+    )
+"""
+_ROWS = [
+    (3, "great day", "Positive", "Happy", 0.91234),
+    (7, "awful service", "Negative", "Angry", 0.8),
+    (8, "what a twist", "Neutral", "Surprise", 0.55555),
+    (12, "not analyzed yet", None, None, None),
+]
+
+
+def _legacy_database():
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE record"))
+        conn.execute(text(_LEGACY_RECORD))
+        for row in _ROWS:
+            conn.execute(text(
+                "INSERT INTO record (id, text, sentiment, emotion, confidence, created_at) "
+                "VALUES (:id, :text, :sentiment, :emotion, :confidence, '2024-05-01 10:00:00')"
+            ), dict(zip(("id", "text", "sentiment", "emotion", "confidence"), row)))
+
+
+def test_text_labels_are_migrated_to_codes():
+    _legacy_database()
+    create_db_and_tables()
+
+    columns = {c["name"]: c["type"].__class__.__name__ for c in inspect(engine).get_columns("record")}
+    assert columns["sentiment"] == columns["emotion"] == "SMALLINT"
+    assert columns["confidence"] == "INTEGER"
+    assert {"dataset_id", "duplicate_of"} <= set(columns)
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT id, sentiment, emotion, confidence FROM record ORDER BY id")).all()
+    assert stored == [(3, 1, 1, 9123), (7, 2, 2, 8000), (8, 0, label_code("emotion", "Surprise"), 5556),
+                      (12, None, None, None)]
+
+    with Session(engine) as session:
+        records = session.exec(select(Record).order_by(Record.id)).all()
+        assert [(r.id, r.sentiment, r.emotion, r.confidence, r.dataset_id) for r in records] == [
+            (3, "Positive", "Happy", 0.9123, "default"),
+            (7, "Negative", "Angry", 0.8, "default"),
+            (8, "Neutral", "Surprise", 0.5556, "default"),
+            (12, None, None, None, "default"),
+        ]
+        assert session.exec(select(Record.id).where(Record.emotion == "Surprise")).all() == [8]
+        # Labels outside the defaults get the next free code
+        assert label_code("emotion", "Surprise") == len(DEFAULT_LABELS["emotion"])
+        assert len(session.exec(select(Label)).all()) == sum(map(len, DEFAULT_LABELS.values())) + 1
+    assert {i["name"] for i in inspect(engine).get_indexes("record")} >= {
+        "ix_record_dataset_id", "ix_record_duplicate_of",
+    }
+
+
+def test_migration_runs_once():
+    _legacy_database()
+    create_db_and_tables()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE record SET sentiment = 2 WHERE id = 3"))
+    create_db_and_tables()
+    with Session(engine) as session:
+        assert session.get(Record, 3).sentiment == "Negative"
+        assert len(session.exec(select(Record)).all()) == len(_ROWS)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import pubsub
+
+
+def test_sqlite_broker_batches_publishes_and_delivers_in_order(tmp_path, monkeypatch):
+    broker = pubsub.SQLiteBroker(str(tmp_path / "pubsub.sqlite"), poll_ms=5)
+    batches = []
+    real_insert = broker._insert
+
+    def insert(bodies):
+        batches.append(len(bodies))
+        real_insert(bodies)
+    monkeypatch.setattr(broker, "_insert", insert)
+    received = []
+
+    async def on_event(seq, payload):
+        received.append((seq, json.loads(payload)["n"]))
+    broker.subscribe(on_event)
+
+    async def run():
+        await broker.start()
+        for n in range(300):
+            await broker.publish({"n": n})
+        for _ in range(200):
+            if len(received) == 300:
+                break
+            await asyncio.sleep(0.01)
+        await broker.close()
+
+    asyncio.run(run())
+    assert [n for _, n in received] == list(range(300))
+    assert [seq for seq, _ in received] == list(range(1, 301))
+    assert sum(batches) == 300 and len(batches) < 300
+
+
+def test_slow_sqlite_writes_do_not_block_the_event_loop(tmp_path, monkeypatch):
+    broker = pubsub.SQLiteBroker(str(tmp_path / "pubsub.sqlite"))
+    real_insert = broker._insert
+
+    def locked_insert(bodies):
+        time.sleep(0.3)  # another process holds the write lock
+        real_insert(bodies)
+    monkeypatch.setattr(broker, "_insert", locked_insert)
+
+    async def run():
+        await broker.start()
+        started = time.monotonic()
+        await broker.publish({"n": 1})
+        await asyncio.sleep(0)
+        await broker.publish({"n": 2})
+        elapsed = time.monotonic() - started
+        await broker.close()  # flushes what is still queued
+        return elapsed
+
+    assert asyncio.run(run()) < 0.1
+    check = pubsub.SQLiteBroker(str(tmp_path / "pubsub.sqlite"))
+    assert check._max_seq() == 2
+    asyncio.run(check.close())
+
+
+def test_leases_and_state_wait_for_the_write_lock_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "pubsub.sqlite")
+    broker = pubsub.SQLiteBroker(path)
+
+    async def run():
+        await broker.set_state("k", {"v": 1})   # creates the schema
+        other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")         # another process holds the write lock
+        threading.Timer(0.3, lambda: other.execute("COMMIT")).start()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        task = asyncio.create_task(ticker())
+        acquired = await broker.acquire_lease("producer", 5)
+        task.cancel()
+        state = await broker.get_state("k")
+        holder = await broker.lease_holder("producer")
+        await broker.close()
+        other.close()
+        return acquired, ticks, state, holder
+
+    acquired, ticks, state, holder = asyncio.run(run())
+    assert acquired and holder == pubsub.WORKER_ID and state == {"v": 1}
+    assert ticks >= 10
+
+
+def test_broker_missing_lease_methods_fails_at_construction():
+    class PublishOnly(pubsub.Broker):
+        async def publish(self, event):
+            return None
+
+    with pytest.raises(TypeError, match="acquire_lease"):
+        PublishOnly()
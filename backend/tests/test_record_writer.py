@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+from database.db import engine
+from models.data_models import Record
+from services import record_writer
+from services.dataset_service import insert_records
+from services.dedup_service import NearDuplicateIndex, signature
+from services.record_writer import RecordWriter
+
+
+def _row(text: str, **extra) -> dict:
+    return {"text": text, "sentiment": "Neutral", "emotion": "Neutral", "confidence": 0.5,
+            "dataset_id": "stream", **extra}
+
+
+def _texts_by_id() -> dict[int, str]:
+    with Session(engine) as session:
+        return dict(session.exec(select(Record.id, Record.text)).all())
+
+
+def _collecting_writer():
+    events = []
+
+    async def on_written(batch):
+        events.extend(batch)
+    return RecordWriter(on_written=on_written), events
+
+
+def test_ids_come_from_the_database_despite_other_writers():
+    writer, events = _collecting_writer()
+
+    async def run():
+        for i in range(5):
+            writer.submit(_row(f"stream {i}"), {"type": "new_record", "text": f"stream {i}"})
+        # An upload commits first and takes the ids the stream would have guessed
+        with Session(engine) as session:
+            insert_records(session, [_row(f"upload {i}", dataset_id="default") for i in range(3)])
+            session.commit()
+        assert events == []  # nothing is announced before it is written
+        await writer.flush()
+
+    asyncio.run(run())
+    stored = _texts_by_id()
+    assert len(stored) == 8
+    assert [e["text"] for e in events] == [f"stream {i}" for i in range(5)]
+    for event in events:
+        assert stored[event["id"]] == event["text"]
+
+
+def test_failed_flush_keeps_the_rows_and_retries_them(monkeypatch):
+    writer, events = _collecting_writer()
+    real_insert = record_writer.insert_records
+    failures = [RuntimeError("database is locked")]
+
+    def flaky_insert(conn, rows):
+        ids = real_insert(conn, rows)
+        if failures:
+            raise failures.pop()
+        return ids
+    monkeypatch.setattr(record_writer, "insert_records", flaky_insert)
+
+    async def run():
+        for i in range(3):
+            writer.submit(_row(f"first {i}"), {"type": "new_record", "text": f"first {i}"})
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        assert writer.pending == 3 and events == [] and _texts_by_id() == {}
+        writer.submit(_row("later"), {"type": "new_record", "text": "later"})
+        assert await writer.flush() == 4
+
+    asyncio.run(run())
+    assert [e["text"] for e in events] == ["first 0", "first 1", "first 2", "later"]
+    stored = _texts_by_id()
+    assert sorted(stored.values()) == sorted(e["text"] for e in events)
+    assert all(stored[e["id"]] == e["text"] for e in events)
+
+
+def test_cluster_founded_in_a_failed_batch_is_linked_on_retry(monkeypatch):
+    writer, _ = _collecting_writer()
+    index = NearDuplicateIndex()
+    text = "the new phone update is smooth and fast, really love it"
+    sig = signature(text)
+    founder = _row(text)
+    founder["cluster"] = index.add(sig, "Positive", "Happy", 0.9, founder=founder)
+    member = _row(text + "!")
+    member["cluster"] = index.match(signature(text + "!"))
+    assert member["cluster"] is founder["cluster"]
+
+    real_bump = record_writer.bump_data_version
+    failures = [RuntimeError("disk I/O error")]
+
+    def flaky_bump(conn, datasets):
+        if failures:
+            raise failures.pop()
+        real_bump(conn, datasets)
+    monkeypatch.setattr(record_writer, "bump_data_version", flaky_bump)
+
+    async def run():
+        writer.submit(founder)
+        writer.submit(member)
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        await writer.flush()
+
+    asyncio.run(run())
+    with Session(engine) as session:
+        rows = session.exec(select(Record.id, Record.duplicate_of).order_by(Record.id)).all()
+    assert len(rows) == 2
+    (founder_id, founder_dup), (_, member_dup) = rows
+    assert founder_dup is None and member_dup == founder_id
+    assert founder["cluster"].id == founder_id
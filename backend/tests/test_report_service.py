@@ -0,0 +1,29 @@
+from sqlmodel import Session
+
+from database import labels
+from database.db import engine
+from services.dataset_service import activate_partition, create_partition, insert_records
+from services.report_service import report_stats
+
+
+def test_report_stats_counts_labels_without_reloading_them(monkeypatch):
+    with Session(engine) as session:
+        partition_id = create_partition(session, "d")
+        insert_records(session, [
+            {"text": "a", "dataset_id": partition_id, "sentiment": "Positive", "emotion": "Happy", "confidence": 0.9},
+            {"text": "b", "dataset_id": partition_id, "sentiment": "Positive", "emotion": "Sad", "confidence": 0.7},
+            {"text": "c", "dataset_id": partition_id, "sentiment": "Negative", "emotion": "Sad", "confidence": 0.5},
+            {"text": "d", "dataset_id": partition_id, "sentiment": None, "emotion": None, "confidence": None},
+        ])
+        session.commit()
+        activate_partition(session, partition_id, "append", 4)
+    reloads = []
+    monkeypatch.setattr(labels, "load_labels", lambda kind: reloads.append(kind))
+
+    with Session(engine) as session:
+        stats = report_stats(session, "d")
+    assert (stats["total"], stats["analyzed"]) == (4, 3)
+    assert stats["sentiment"] == {"Positive": 2, "Negative": 1}
+    assert stats["emotion"] == {"Sad": 2, "Happy": 1}
+    assert round(stats["avg_confidence"], 4) == 0.7
+    assert reloads == []
@@ -0,0 +1,62 @@
+import asyncio
+import json
+from collections import deque
+
+import pytest
+
+import pubsub
+from services import stream_service
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """A fresh in-memory broker feeding the stream's replay buffer."""
+    broker = pubsub.MemoryBroker()
+    broker.subscribe(stream_service._on_event)
+    monkeypatch.setattr(stream_service, "broker", broker)
+    monkeypatch.setattr(stream_service, "_replay", deque(maxlen=100))
+    monkeypatch.setattr(stream_service, "_seq", 0)
+    return broker
+
+
+def _publish(broker, n: int):
+    async def run():
+        for _ in range(n):
+            await broker.publish({"type": "stream_stopped"})
+    asyncio.run(run())
+
+
+def test_events_carry_seq_and_epoch(stream):
+    _publish(stream, 3)
+    events, truncated, reset = stream_service.replay_since(1, stream.epoch)
+    assert [json.loads(e) for e in events] == [
+        {"seq": 2, "epoch": stream.epoch, "type": "stream_stopped"},
+        {"seq": 3, "epoch": stream.epoch, "type": "stream_stopped"},
+    ]
+    assert not truncated and not reset
+
+
+def test_since_from_another_epoch_is_a_fresh_connect(stream):
+    _publish(stream, 3)
+    # A client that saw seq 250 before the server restarted
+    events, truncated, reset = stream_service.replay_since(2, "0ldepoch")
+    assert reset and not truncated
+    assert [json.loads(e)["seq"] for e in events] == [1, 2, 3]
+
+
+def test_since_ahead_of_the_stream_is_a_reset_without_an_epoch(stream):
+    _publish(stream, 3)
+    events, _, reset = stream_service.replay_since(250)
+    assert reset and len(events) == 3
+    assert stream_service.replay_since(3) == ([], False, False)
+
+
+def test_sqlite_epoch_lasts_as_long_as_the_file(tmp_path):
+    first = pubsub.SQLiteBroker(str(tmp_path / "a.sqlite"))
+    again = pubsub.SQLiteBroker(str(tmp_path / "a.sqlite"))
+    other = pubsub.SQLiteBroker(str(tmp_path / "b.sqlite"))
+    for broker in (first, again, other):
+        broker._connect()
+    assert first.epoch == again.epoch != other.epoch
+    for broker in (first, again, other):
+        asyncio.run(broker.close())
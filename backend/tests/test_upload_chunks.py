@@ -0,0 +1,57 @@
+import gzip
+import hashlib
+
+import pytest
+
+from services import upload_service
+from services.upload_service import ChunkTooLarge, create_session, get_session, open_chunk, upload_path
+
+
+def _on_disk(upload: dict) -> bytes:
+    with open(upload_path(upload["upload_id"], upload["filename"]), "rb") as f:
+        return f.read()
+
+
+def test_chunk_parts_are_on_disk_before_the_chunk_is_counted():
+    upload = create_session("big.csv", size=12)
+    with open_chunk(upload["upload_id"], 0) as writer:
+        writer.write(b"text\n")
+        writer.write(b"ab\n")
+        assert _on_disk(upload) == b"text\nab\n"
+        assert get_session(upload["upload_id"])["received"] == 0
+        writer.write(b"cd\n")
+        assert writer.finish()["received"] == 11
+    assert _on_disk(upload) == b"text\nab\ncd\n"
+
+
+def test_gzip_chunk_is_inflated_as_it_streams_in():
+    upload = create_session("big.csv")
+    body = gzip.compress(b"text\n" + b"x\n" * 5000)
+    with open_chunk(upload["upload_id"], 0, "gzip", hashlib.sha256(body).hexdigest()) as writer:
+        for i in range(0, len(body), 7):
+            writer.write(body[i:i + 7])
+        assert writer.finish()["received"] == 10005
+    assert _on_disk(upload) == b"text\n" + b"x\n" * 5000
+
+
+def test_bad_resend_leaves_the_received_prefix_alone():
+    upload = create_session("big.csv")
+    with open_chunk(upload["upload_id"], 0) as writer:
+        writer.write(b"text\nab\n")
+        writer.finish()
+
+    with open_chunk(upload["upload_id"], 5, checksum=hashlib.sha256(b"ab\ncd\n").hexdigest()) as writer:
+        writer.write(b"XX\nYY\n")
+        with pytest.raises(ValueError, match="checksum"):
+            writer.finish()
+    assert get_session(upload["upload_id"])["received"] == 8
+    assert _on_disk(upload)[:8] == b"text\nab\n"
+
+
+def test_oversized_chunk_is_refused_while_it_streams(monkeypatch):
+    monkeypatch.setattr(upload_service, "UPLOAD_MAX_CHUNK", 8)
+    upload = create_session("big.csv")
+    with open_chunk(upload["upload_id"], 0, "gzip") as writer:
+        with pytest.raises(ChunkTooLarge):
+            writer.write(gzip.compress(b"x" * 64))
+    assert get_session(upload["upload_id"])["received"] == 0
@@ -30,7 +30,12 @@ class ConnectionManager:
 
     async def broadcast(self, data: dict):
         """Send a JSON payload to every connected client."""
-        payload = json.dumps(data)
+        if not self.active_connections:
+            return
+        await self.broadcast_text(json.dumps(data))
+
+    async def broadcast_text(self, payload: str):
+        """Send an already-serialized payload to every connected client."""
         dead = []
         for ws in self.active_connections:
             try:
@@ -22,10 +22,11 @@ export default function VisualizationsPage() {
   const { streamRunning, stats, records, latestRecord } = useWebSocket();
   const [timeData, setTimeData] = useState<TimePoint[]>([]);
   const [dbViz, setDbViz] = useState<any>(null);
+  const [deduplicated, setDeduplicated] = useState(false);
 
   useEffect(() => {
-    getDashboardData().then(setDbViz).catch(() => null);
-  }, []);
+    getDashboardData({ deduplicated }).then(setDbViz).catch(() => null);
+  }, [deduplicated]);
 
   // Build rolling time series from stats updates
   useEffect(() => {
@@ -92,6 +93,10 @@ export default function VisualizationsPage() {
             {streamRunning ? "LIVE — Charts morphing every ~2 seconds" : "Stream paused"}
           </span>
           <span className="text-xs text-gray-500">{total.toLocaleString()} total records</span>
+          <label className="ml-auto flex items-center gap-1.5 text-xs text-gray-600" title="Count each near-duplicate cluster once">
+            <input type="checkbox" checked={deduplicated} onChange={(e) => setDeduplicated(e.target.checked)} />
+            Deduplicated
+          </label>
         </div>
 
         <div className="grid gap-6 lg:grid-cols-2">
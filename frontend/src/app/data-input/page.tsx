@@ -3,10 +3,12 @@
 import { useEffect, useRef, useState } from "react";
 import Header from "@/components/Header";
 import { useWebSocket } from "@/lib/useWebSocket";
-import { startStream, stopStream, resetStream } from "@/lib/api";
+import { startStream, stopStream, resetStream, uploadInChunks } from "@/lib/api";
 import axios from "axios";
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";
+// Files above this size use the chunked, resumable upload protocol
+const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
 
 const SPEED_OPTIONS = [
   { label: "⚡ Fast (1s)", value: 1.0 },
@@ -26,6 +28,20 @@ const SENTIMENT_BG: Record<string, string> = {
   Neutral: "bg-gray-50 border-gray-200",
 };
 
+type JobProgress = {
+  status: string;
+  progress: number;
+  stage?: string | null;
+  detail?: {
+    rows_done: number | null;
+    rows_total: number | null;
+    rows_per_sec: number | null;
+    eta_seconds: number | null;
+  } | null;
+  result?: unknown;
+  error?: string | null;
+};
+
 type UploadResult = {
   status: string;
   filename: string;
@@ -83,7 +99,9 @@ export default function DataInputPage() {
   const [uploadStatus, setUploadStatus] = useState<"idle" | "uploading" | "analyzing" | "done" | "error">("idle");
   const [uploadResult, setUploadResult] = useState<UploadResult | null>(null);
   const [uploadError, setUploadError] = useState<string | null>(null);
+  const [uploadDetail, setUploadDetail] = useState<JobProgress | null>(null);
   const pollRef = useRef<ReturnType<typeof setInterval> | null>(null);
+  const eventsRef = useRef<EventSource | null>(null);
 
   // ── Text analyzer state
   const [singleText, setSingleText] = useState("");
@@ -96,10 +114,73 @@ export default function DataInputPage() {
       clearInterval(pollRef.current);
       pollRef.current = null;
     }
+    if (eventsRef.current) {
+      eventsRef.current.close();
+      eventsRef.current = null;
+    }
   };
 
   useEffect(() => () => stopPoll(), []);
 
+  // Apply one progress snapshot (pushed or polled); returns true once the job is finished
+  const applyJob = (job: JobProgress): boolean => {
+    setUploadProgress(job.progress ?? 0);
+    setUploadDetail(job);
+    if (job.status === "done") {
+      stopPoll();
+      setUploadStatus("done");
+      setUploadProgress(100);
+      setUploadResult(job.result as UploadResult);
+      return true;
+    }
+    if (job.status === "error" || job.status === "cancelled") {
+      stopPoll();
+      setUploadStatus("error");
+      setUploadError(job.error || (job.status === "cancelled" ? "Analysis was cancelled." : "Analysis failed."));
+      return true;
+    }
+    return false;
+  };
+
+  // Fallback when the browser or a proxy can't hold an event stream open
+  const pollJob = (jobId: string) => {
+    pollRef.current = setInterval(async () => {
+      try {
+        const { data: job } = await axios.get<JobProgress>(
+          `${API_BASE}/api/upload/status/${jobId}`
+        );
+        applyJob(job);
+      } catch {
+        // Backend may briefly be unreachable; keep polling
+      }
+    }, 1500);
+  };
+
+  const followJob = (jobId: string) => {
+    if (typeof EventSource === "undefined") {
+      pollJob(jobId);
+      return;
+    }
+    const source = new EventSource(`${API_BASE}/api/upload/events/${jobId}`);
+    eventsRef.current = source;
+    let received = false;
+    const onSnapshot = (e: MessageEvent) => {
+      received = true;
+      applyJob(JSON.parse(e.data) as JobProgress);
+    };
+    source.addEventListener("progress", onSnapshot as EventListener);
+    source.addEventListener("end", onSnapshot as EventListener);
+    source.onerror = () => {
+      // Never connected: push isn't available, switch to polling for good.
+      // Otherwise EventSource reconnects on its own and resends the current state.
+      if (!received) {
+        source.close();
+        eventsRef.current = null;
+        pollJob(jobId);
+      }
+    };
+  };
+
   // ── Upload handlers ─────────────────────────────────────────────────────────
   const handleFileUpload = async () => {
     if (!file) return;
@@ -107,45 +188,32 @@ export default function DataInputPage() {
     setUploadProgress(0);
     setUploadError(null);
     setUploadResult(null);
-
-    const form = new FormData();
-    form.append("file", file);
+    setUploadDetail(null);
 
     try {
-      // POST the file — get job_id back immediately
-      const { data } = await axios.post<{ job_id: string; status: string }>(
-        `${API_BASE}/api/upload`,
-        form,
-        { headers: { "Content-Type": "multipart/form-data" } }
-      );
+      let jobId: string;
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        // Large files go up in resumable chunks; analysis starts before the transfer ends
+        jobId = await uploadInChunks(file, (sent) =>
+          setUploadProgress(Math.floor((sent / file.size) * 100))
+        );
+      } else {
+        const form = new FormData();
+        form.append("file", file);
+        // POST the file — get job_id back immediately
+        const { data } = await axios.post<{ job_id: string; status: string }>(
+          `${API_BASE}/api/upload`,
+          form,
+          { headers: { "Content-Type": "multipart/form-data" } }
+        );
+        jobId = data.job_id;
+      }
 
-      const jobId = data.job_id;
       setUploadStatus("analyzing");
       setUploadProgress(5);
 
-      // Poll for progress every 1.5 seconds
-      pollRef.current = setInterval(async () => {
-        try {
-          const { data: job } = await axios.get(
-            `${API_BASE}/api/upload/status/${jobId}`
-          );
-
-          setUploadProgress(job.progress ?? 0);
-
-          if (job.status === "done") {
-            stopPoll();
-            setUploadStatus("done");
-            setUploadProgress(100);
-            setUploadResult(job.result as UploadResult);
-          } else if (job.status === "error") {
-            stopPoll();
-            setUploadStatus("error");
-            setUploadError(job.error || "Analysis failed.");
-          }
-        } catch {
-          // Backend may briefly be unreachable; keep polling
-        }
-      }, 1500);
+      // Progress is pushed over Server-Sent Events (polling as a fallback)
+      followJob(jobId);
     } catch (err: any) {
       setUploadStatus("error");
       setUploadError(
@@ -335,7 +403,7 @@ export default function DataInputPage() {
             >
               <div className="mx-auto mb-4 flex h-16 w-16 items-center justify-center rounded-full bg-blue-100 text-3xl">☁️</div>
               <h3 className="text-lg font-semibold text-gray-900">
-                {file ? file.name : "Drop or select a CSV / XLSX file"}
+                {file ? file.name : "Drop or select a CSV / NDJSON / XLSX file (.gz, .bz2, .zst, .zip ok)"}
               </h3>
               <p className="mt-1 text-sm text-gray-500">
                 {file ? `${(file.size / 1024).toFixed(1)} KB — click to change` : "Up to 50MB. Text column auto-detected."}
@@ -343,7 +411,7 @@ export default function DataInputPage() {
               <input
                 ref={fileInputRef}
                 type="file"
-                accept=".csv,.xlsx,.xls"
+                accept=".csv,.tsv,.ndjson,.jsonl,.json,.xlsx,.xls,.gz,.bz2,.zst,.zip"
                 className="hidden"
                 onChange={(e) => {
                   const f = e.target.files?.[0] ?? null;
@@ -380,7 +448,14 @@ export default function DataInputPage() {
                     style={{ width: `${uploadProgress}%` }}
                   />
                 </div>
-                <p className="text-xs text-center text-gray-500">{uploadProgress}% complete</p>
+                <p className="text-xs text-center text-gray-500">
+                  {uploadProgress}% complete
+                  {uploadDetail?.stage && ` · ${uploadDetail.stage}`}
+                  {uploadDetail?.detail?.rows_done != null && uploadDetail.detail.rows_total != null &&
+                    ` · ${uploadDetail.detail.rows_done.toLocaleString()} / ${uploadDetail.detail.rows_total.toLocaleString()} rows`}
+                  {uploadDetail?.detail?.rows_per_sec != null && ` · ${Math.round(uploadDetail.detail.rows_per_sec)} rows/s`}
+                  {uploadDetail?.detail?.eta_seconds != null && ` · ~${Math.ceil(uploadDetail.detail.eta_seconds)}s left`}
+                </p>
               </div>
             )}
 
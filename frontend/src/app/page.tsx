@@ -43,12 +43,14 @@ export default function Dashboard() {
   const [actionLoading, setActionLoading] = useState(false);
   const [dbStats, setDbStats] = useState<DbStats | null>(null);
   const [dbViz, setDbViz] = useState<VizData | null>(null);
+  const [deduplicated, setDeduplicated] = useState(false);
 
   const fetchDbData = async () => {
     try {
+      const params = { deduplicated };
       const [summaryRes, vizRes] = await Promise.all([
-        axios.get<DbStats>(`${API_BASE}/api/dashboard/summary`),
-        axios.get<VizData>(`${API_BASE}/api/dashboard`),
+        axios.get<DbStats>(`${API_BASE}/api/dashboard/summary`, { params }),
+        axios.get<VizData>(`${API_BASE}/api/visualizations/data`, { params }),
       ]);
       setDbStats(summaryRes.data);
       setDbViz(vizRes.data);
@@ -58,7 +60,7 @@ export default function Dashboard() {
   useEffect(() => {
     if (localStorage.getItem("isLoggedIn") !== "true") router.push("/login");
     else { setIsAuth(true); fetchDbData(); }
-  }, [router]);
+  }, [router, deduplicated]);
 
   // Build rolling 60-second time series from incoming records
   useEffect(() => {
@@ -152,6 +154,10 @@ export default function Dashboard() {
                 📁 Dataset loaded
               </span>
             )}
+            <label className="flex items-center gap-1.5 text-xs text-gray-600" title="Count each near-duplicate cluster once">
+              <input type="checkbox" checked={deduplicated} onChange={(e) => setDeduplicated(e.target.checked)} />
+              Deduplicated
+            </label>
           </div>
           <div className="flex gap-2">
             <button onClick={handleReset} disabled={actionLoading || streamRunning}
@@ -22,6 +22,51 @@ export async function uploadCsv(file: File): Promise<UploadResponse> {
   return data;
 }
 
+// ── Chunked / resumable upload (large files) ────────────────────────
+type UploadSession = { upload_id: string; received: number; job_id: string | null };
+const STREAMABLE_UPLOAD = /\.(csv|tsv|ndjson|jsonl|json)(\.(gz|gzip|bz2|zst|zstd))?$/i;
+
+/**
+ * Send a file in chunks through /api/upload/sessions. Failed chunks are retried
+ * from the server's `received` offset, so a dropped connection only costs the
+ * chunk in flight. Line formats (CSV/TSV/NDJSON, optionally gzip/bz2/zstd) start
+ * analyzing while later chunks are still uploading.
+ * Resolves with the ingest job id.
+ */
+export async function uploadInChunks(
+  file: File,
+  onProgress?: (sentBytes: number) => void,
+  chunkSize = 8 * 1024 * 1024,
+): Promise<string> {
+  const { data: session } = await client.post<UploadSession>("/api/upload/sessions", {
+    filename: file.name,
+    size: file.size,
+    analyze_early: STREAMABLE_UPLOAD.test(file.name),
+  });
+  const url = `/api/upload/sessions/${session.upload_id}`;
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const { data } = await client.put<UploadSession>(url, file.slice(offset, offset + chunkSize), {
+        params: { offset },
+        headers: { "Content-Type": "application/octet-stream" },
+      });
+      offset = data.received;
+      failures = 0;
+      onProgress?.(offset);
+    } catch (err: any) {
+      if (++failures > 5) throw err;
+      // 409 carries the offset to resume from; otherwise ask for it
+      const received = err?.response?.data?.received;
+      offset = typeof received === "number" ? received : (await client.get<UploadSession>(url)).data.received;
+      await new Promise((r) => setTimeout(r, 500 * failures));
+    }
+  }
+  const { data: done } = await client.post<UploadSession>(`${url}/complete`);
+  return done.job_id ?? session.upload_id;
+}
+
 // ── Preprocessing ───────────────────────────────────────────────────
 export async function preprocess(): Promise<{
   message: string;
@@ -59,8 +104,9 @@ export async function analyzeSingleTweet(tweet: string): Promise<SentimentRespon
 // ── Visualizations / Dashboard ──────────────────────────────────────
 export async function getDashboardData(params?: {
   sentiment_filter?: string;
+  deduplicated?: boolean;
 }): Promise<DashboardData> {
-  const { data } = await client.get<DashboardData>("/api/dashboard", { params });
+  const { data } = await client.get<DashboardData>("/api/visualizations/data", { params });
   return data;
 }
 
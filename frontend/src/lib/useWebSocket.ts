@@ -4,6 +4,7 @@ import { useCallback, useEffect, useRef, useState } from "react";
 import { WS_BASE } from "@/lib/api";
 
 export type LiveRecord = {
+    seq?: number;
     id: number;
     text: string;
     clean_text: string;
@@ -19,11 +20,23 @@ export type StreamStats = {
     emotion: Record<string, number>;
 };
 
+type SequencedEvent =
+    | { type: "stream_started"; seq: number; epoch: string; interval: number }
+    | { type: "stream_stopped"; seq: number; epoch: string }
+    | ({ type: "new_record"; seq: number; epoch: string } & LiveRecord & { stats: StreamStats });
+
 export type WsMessage =
-    | { type: "connected"; running: boolean; stats: StreamStats; clients: number }
-    | { type: "stream_started"; interval: number }
-    | { type: "stream_stopped" }
-    | ({ type: "new_record" } & LiveRecord & { stats: StreamStats });
+    | { type: "connected"; running: boolean; stats: StreamStats; clients: number; seq: number; epoch: string }
+    | {
+          type: "replay";
+          since: number | null;
+          truncated: boolean;
+          reset: boolean;
+          epoch: string;
+          events: SequencedEvent[];
+      }
+    | { type: "window_update" }
+    | SequencedEvent;
 
 type UseWebSocketReturn = {
     connected: boolean;
@@ -49,6 +62,10 @@ const MAX_RECORDS = 200; // Keep last 200 records in memory
 export function useWebSocket(): UseWebSocketReturn {
     const wsRef = useRef<WebSocket | null>(null);
     const pingRef = useRef<ReturnType<typeof setInterval> | null>(null);
+    // Last event seq seen — sent on reconnect so the server replays only what we missed
+    const lastSeqRef = useRef<number | null>(null);
+    // Seq numbering lastSeqRef belongs to; the server starts a new one when it restarts
+    const epochRef = useRef<string | null>(null);
     const [connected, setConnected] = useState(false);
     const [streamRunning, setStreamRunning] = useState(false);
     const [stats, setStats] = useState<StreamStats>(INITIAL_STATS);
@@ -58,7 +75,9 @@ export function useWebSocket(): UseWebSocketReturn {
 
     const connect = useCallback(() => {
         if (wsRef.current?.readyState === WebSocket.OPEN) return;
-        const ws = new WebSocket(`${WS_BASE}/api/ws/live`);
+        const since = lastSeqRef.current;
+        const resume = since !== null ? `?since=${since}&epoch=${encodeURIComponent(epochRef.current ?? "")}` : "";
+        const ws = new WebSocket(`${WS_BASE}/api/ws/live${resume}`);
         wsRef.current = ws;
 
         ws.onopen = () => {
@@ -80,36 +99,89 @@ export function useWebSocket(): UseWebSocketReturn {
             ws.close();
         };
 
+        const toRecord = (msg: LiveRecord): LiveRecord => ({
+            seq: msg.seq,
+            id: msg.id,
+            text: msg.text,
+            clean_text: msg.clean_text,
+            sentiment: msg.sentiment,
+            confidence: msg.confidence,
+            emotion: msg.emotion,
+            timestamp: msg.timestamp,
+        });
+
+        // A new epoch means seq started over: forget the last seq and the feed's old seqs
+        const adoptEpoch = (epoch: string) => {
+            if (epoch === epochRef.current) return;
+            epochRef.current = epoch;
+            lastSeqRef.current = null;
+            setRecords((prev) => prev.map((r) => ({ ...r, seq: undefined })));
+        };
+
+        // Returns false for events already applied (replay and live frames may overlap)
+        const accept = (seq: number, epoch: string): boolean => {
+            adoptEpoch(epoch);
+            if (lastSeqRef.current !== null && seq <= lastSeqRef.current) return false;
+            lastSeqRef.current = seq;
+            return true;
+        };
+
+        const applyEvent = (msg: SequencedEvent) => {
+            if (!accept(msg.seq, msg.epoch)) return;
+            switch (msg.type) {
+                case "stream_started":
+                    setStreamRunning(true);
+                    break;
+                case "stream_stopped":
+                    setStreamRunning(false);
+                    break;
+                case "new_record": {
+                    const rec = toRecord(msg);
+                    setLatestRecord(rec);
+                    setRecords((prev) => [rec, ...prev].slice(0, MAX_RECORDS));
+                    if (msg.stats) setStats(msg.stats);
+                    break;
+                }
+            }
+        };
+
         ws.onmessage = (event) => {
             try {
                 const msg: WsMessage = JSON.parse(event.data);
                 switch (msg.type) {
                     case "connected":
+                        adoptEpoch(msg.epoch);
                         setStreamRunning(msg.running);
                         setStats(msg.stats ?? INITIAL_STATS);
                         setClientCount(msg.clients ?? 0);
                         break;
-                    case "stream_started":
-                        setStreamRunning(true);
-                        break;
-                    case "stream_stopped":
-                        setStreamRunning(false);
-                        break;
-                    case "new_record": {
-                        const rec: LiveRecord = {
-                            id: msg.id,
-                            text: msg.text,
-                            clean_text: msg.clean_text,
-                            sentiment: msg.sentiment,
-                            confidence: msg.confidence,
-                            emotion: msg.emotion,
-                            timestamp: msg.timestamp,
-                        };
-                        setLatestRecord(rec);
-                        setRecords((prev) => [rec, ...prev].slice(0, MAX_RECORDS));
-                        if (msg.stats) setStats(msg.stats);
+                    case "replay": {
+                        // Replay frames hold events older than any live frame that overtook them.
+                        // A fresh connect, a gap the server can no longer fill or a server restart drops the old feed.
+                        adoptEpoch(msg.epoch);
+                        const reset = msg.since === null || msg.truncated || msg.reset;
+                        const replayed = msg.events.filter(
+                            (e): e is Extract<SequencedEvent, { type: "new_record" }> => e.type === "new_record"
+                        );
+                        const newest = msg.events.length ? msg.events[msg.events.length - 1].seq : -1;
+                        const live = lastSeqRef.current !== null && lastSeqRef.current > newest;
+                        setRecords((prev) => [
+                            ...prev.filter((r) => (r.seq ?? -1) > newest),
+                            ...replayed.map(toRecord).reverse(),
+                            ...(reset ? [] : prev.filter((r) => (r.seq ?? -1) <= (msg.since ?? -1))),
+                        ].slice(0, MAX_RECORDS));
+                        if (!live && replayed.length) {
+                            const last = replayed[replayed.length - 1];
+                            setLatestRecord(toRecord(last));
+                            if (last.stats) setStats(last.stats);
+                        }
+                        lastSeqRef.current = Math.max(lastSeqRef.current ?? -1, newest);
                         break;
                     }
+                    case "window_update":
+                        break;
+                    default:
+                        applyEvent(msg);
                 }
             } catch {
                 /* ignore malformed frames */